@@ -0,0 +1,40 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, text
+
+from app.db import get_database_url
+
+APP_SCHEMA = "pharmasight"
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=get_database_url(),
+        literal_binds=True,
+        version_table_schema=APP_SCHEMA,
+    )
+    with context.begin_transaction():
+        context.execute(f"CREATE SCHEMA IF NOT EXISTS {APP_SCHEMA}")
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    engine = create_engine(get_database_url(), pool_pre_ping=True)
+    with engine.connect() as connection:
+        # The version table lives in our schema, so it has to exist first
+        connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {APP_SCHEMA}"))
+        connection.commit()
+        context.configure(connection=connection, version_table_schema=APP_SCHEMA)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,47 @@
+"""debtor reports table
+
+Revision ID: 0001_debtor_reports
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001_debtor_reports"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def amount(name: str) -> sa.Column:
+    return sa.Column(name, sa.Numeric(14, 2), nullable=False, server_default="0")
+
+
+def upgrade() -> None:
+    op.execute("CREATE SCHEMA IF NOT EXISTS pharmasight")
+    op.create_table(
+        "debtor_reports",
+        sa.Column("pharmacy_id", sa.Integer, nullable=False),
+        sa.Column("report_date", sa.Date, nullable=False),
+        sa.Column("acc_no", sa.Text, nullable=False),
+        sa.Column("name", sa.Text),
+        amount("current"),
+        amount("d30"),
+        amount("d60"),
+        amount("d90"),
+        amount("d120"),
+        amount("d150"),
+        amount("d180"),
+        amount("balance"),
+        sa.Column("email", sa.Text),
+        sa.Column("phone", sa.Text),
+        sa.Column("is_medical_aid_control", sa.Boolean, nullable=False, server_default=sa.false()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("pharmacy_id", "acc_no", "report_date"),
+        schema="pharmasight",
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("debtor_reports", schema="pharmasight")
@@ -0,0 +1,56 @@
+"""reminder queue tables
+
+Revision ID: 0002_reminder_queue
+Revises: 0001_debtor_reports
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002_reminder_queue"
+down_revision = "0001_debtor_reports"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "reminder_jobs",
+        sa.Column("job_id", sa.String(32), primary_key=True),
+        sa.Column("pharmacy_id", sa.Integer, nullable=False),
+        sa.Column("channel", sa.String(8), nullable=False),
+        sa.Column("created_by", sa.String(100)),
+        sa.Column("total", sa.Integer, nullable=False),
+        sa.Column("skipped", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("cancelled", sa.Boolean, nullable=False, server_default=sa.false()),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        schema="pharmasight",
+    )
+    op.create_index("ix_reminder_jobs_pharmacy", "reminder_jobs", ["pharmacy_id", "created_at"], schema="pharmasight")
+    op.create_table(
+        "reminder_messages",
+        sa.Column("message_id", sa.String(32), primary_key=True),
+        sa.Column("job_id", sa.String(32), nullable=False),
+        sa.Column("channel", sa.String(8), nullable=False),
+        sa.Column("acc_no", sa.String(64)),
+        sa.Column("recipient", sa.String(255), nullable=False),
+        sa.Column("subject", sa.Text),
+        sa.Column("body", sa.Text, nullable=False),
+        sa.Column("status", sa.String(10), nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime, nullable=False),
+        sa.Column("last_error", sa.Text),
+        sa.Column("sent_at", sa.DateTime),
+        sa.Column("lease_until", sa.DateTime),
+        schema="pharmasight",
+    )
+    op.create_index(
+        "ix_reminder_messages_due", "reminder_messages", ["channel", "status", "next_attempt_at"], schema="pharmasight"
+    )
+    op.create_index("ix_reminder_messages_job", "reminder_messages", ["job_id", "status"], schema="pharmasight")
+
+
+def downgrade() -> None:
+    op.drop_table("reminder_messages", schema="pharmasight")
+    op.drop_table("reminder_jobs", schema="pharmasight")
@@ -0,0 +1,29 @@
+"""debtor report trend summaries
+
+Revision ID: 0003_debtor_report_summaries
+Revises: 0002_reminder_queue
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003_debtor_report_summaries"
+down_revision = "0002_reminder_queue"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "debtor_report_summaries",
+        sa.Column("pharmacy_id", sa.Integer, nullable=False),
+        sa.Column("report_date", sa.Date, nullable=False),
+        sa.Column("summary", sa.Text, nullable=False),
+        sa.PrimaryKeyConstraint("pharmacy_id", "report_date"),
+        schema="pharmasight",
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("debtor_report_summaries", schema="pharmasight")
@@ -0,0 +1,163 @@
+"""
+Fingerprinted, precompressed webApp2 assets.
+
+At startup every JS/CSS/image file under the web app root is read once,
+content-hashed (``js/app.js`` -> ``/assets/js/app.3f2a9c1d.js``) and, for
+text types, compressed with gzip and (if the optional ``brotli`` package is
+installed) brotli. The HTML pages are rewritten to point at the hashed URLs,
+so assets can be cached as immutable and a deploy changes their URLs.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .http_cache import not_modified
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+
+CONTENT_TYPES = {
+    ".js": "application/javascript",
+    ".css": "text/css",
+    ".html": "text/html; charset=utf-8",
+    ".svg": "image/svg+xml",
+    ".json": "application/json",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".ico": "image/x-icon",
+    ".webp": "image/webp",
+}
+COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".json"}
+MIN_COMPRESS_BYTES = 512
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_REFERENCE = re.compile(r'(\b(?:src|href)=")([^"]+)(")')
+
+
+def negotiate_encoding(accept_encoding: str, available: Iterable[str]) -> Optional[str]:
+    """Best of ``available`` ("br", "gzip") the client accepts, by q-value then server preference"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if level is None else level)
+    return gzip.compress(body, compresslevel=9 if level is None else level, mtime=0)
+
+
+class Asset:
+    """One file: raw body plus any smaller precompressed variants"""
+
+    __slots__ = ("body", "content_type", "digest", "variants")
+
+    def __init__(self, body: bytes, content_type: str, compressible: bool) -> None:
+        self.body = body
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.variants: Dict[str, bytes] = {}
+        if compressible and len(body) >= MIN_COMPRESS_BYTES:
+            for encoding in (("br", "gzip") if brotli is not None else ("gzip",)):
+                compressed = compress(body, encoding)
+                if len(compressed) < len(body):
+                    self.variants[encoding] = compressed
+
+    def etag(self, encoding: Optional[str]) -> str:
+        return f'"{self.digest[:32]}-{encoding}"' if encoding else f'"{self.digest[:32]}"'
+
+
+class AssetBundle:
+    """Hashed assets and rewritten pages for one web app directory"""
+
+    def __init__(self, root: str, pages: Iterable[str], prefix: str = "/assets/") -> None:
+        self.root = root
+        self.page_names = tuple(pages)
+        self.prefix = prefix
+        self.assets: Dict[str, Asset] = {}
+        self.pages: Dict[str, Asset] = {}
+        self.urls: Dict[str, str] = {}
+
+    def build(self) -> "AssetBundle":
+        assets, urls = {}, {}
+        for directory, _, files in os.walk(self.root):
+            for name in sorted(files):
+                path = os.path.join(directory, name)
+                rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+                stem, ext = os.path.splitext(rel)
+                if ext.lower() not in CONTENT_TYPES or rel in self.page_names:
+                    continue
+                with open(path, "rb") as f:
+                    asset = Asset(f.read(), CONTENT_TYPES[ext.lower()], ext.lower() in COMPRESSIBLE)
+                hashed = f"{stem}.{asset.digest[:10]}{ext}"
+                assets[hashed] = asset
+                urls[rel] = self.prefix + hashed
+
+        pages = {}
+        for name in self.page_names:
+            with open(os.path.join(self.root, name), encoding="utf-8") as f:
+                html = f.read()
+            pages[name] = Asset(self._rewrite(html, urls).encode("utf-8"), CONTENT_TYPES[".html"], True)
+
+        self.assets, self.urls, self.pages = assets, urls, pages
+        return self
+
+    @staticmethod
+    def _rewrite(html: str, urls: Dict[str, str]) -> str:
+        def replace(match):
+            reference = match.group(2)
+            path = reference.split("?", 1)[0].split("#", 1)[0]
+            if path.startswith("./"):
+                path = path[2:]
+            elif path.startswith("/"):
+                path = path[1:]
+            url = urls.get(path)
+            return f"{match.group(1)}{url}{match.group(3)}" if url else match.group(0)
+
+        return _REFERENCE.sub(replace, html)
+
+    @property
+    def stats(self) -> dict:
+        assets = list(self.assets.values()) + list(self.pages.values())
+        return {
+            "files": len(self.assets),
+            "pages": len(self.pages),
+            "raw_bytes": sum(len(a.body) for a in assets),
+            "gzip_bytes": sum(len(a.variants.get("gzip", a.body)) for a in assets),
+            "br_bytes": sum(len(a.variants.get("br", a.body)) for a in assets) if brotli is not None else None,
+        }
+
+
+def asset_response(request: Request, asset: Asset, cache_control: str) -> Response:
+    """The best encoding the client accepts, with ETag/304 and Vary: Accept-Encoding"""
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), asset.variants)
+    headers = {"Cache-Control": cache_control, "ETag": asset.etag(encoding), "Vary": "Accept-Encoding"}
+    if not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(asset.variants[encoding] if encoding else asset.body, media_type=asset.content_type, headers=headers)
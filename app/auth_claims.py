@@ -0,0 +1,122 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Optional
+
+from .cache import TTLCache
+
+
+ADMIN_USER_IDS = (2, 9)
+ADMIN_USERNAMES = ("charl", "admin", "amin")
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def is_admin_identity(user_id, username) -> bool:
+    """Admins are Charl (user_id 2) and Amin (user_id 9), or the charl/admin/amin usernames"""
+    return user_id in ADMIN_USER_IDS or bool(username and str(username).lower() in ADMIN_USERNAMES)
+
+
+def token_key(token: str) -> str:
+    """Cache key for a bearer token, so raw tokens are never kept in memory as keys"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def decode_jwt(token: str, secret: Optional[str] = None, now: Optional[float] = None) -> dict:
+    """
+    Decode a JWT payload, checking ``exp`` and, when a secret is given, the HS256 signature.
+
+    Without a secret the signature is not checked (the upstream API checks it
+    on every call it receives); with one, only HS256 tokens are accepted.
+
+    Raises:
+        InvalidToken: The token is malformed, badly signed or expired
+    """
+    try:
+        header_segment, payload_segment, signature_segment = token.split(".")
+        header = json.loads(_b64decode(header_segment))
+        payload = json.loads(_b64decode(payload_segment))
+    except (ValueError, TypeError) as e:
+        raise InvalidToken(f"Malformed token: {e}")
+    if not isinstance(payload, dict):
+        raise InvalidToken("Token payload is not an object")
+
+    if secret:
+        if header.get("alg") != "HS256":
+            raise InvalidToken(f"Unsupported token algorithm: {header.get('alg')}")
+        expected = hmac.new(secret.encode(), f"{header_segment}.{payload_segment}".encode(), hashlib.sha256).digest()
+        try:
+            signature = _b64decode(signature_segment)
+        except ValueError:
+            raise InvalidToken("Malformed token signature")
+        if not hmac.compare_digest(expected, signature):
+            raise InvalidToken("Invalid token signature")
+
+    exp = payload.get("exp")
+    if exp is not None and float(exp) <= (time.time() if now is None else now):
+        raise InvalidToken("Token has expired")
+    return payload
+
+
+class JWTClaimsCache:
+    """Resolved claims per bearer token, keyed by the token's SHA-256.
+
+    Each token is decoded and its role resolved once; the entry expires with
+    the token's ``exp`` (or after ``max_ttl`` for tokens without one). Tokens
+    that fail to decode are remembered briefly so they are not re-decoded on
+    every request either.
+    """
+
+    def __init__(self, secret: Optional[str] = None, maxsize: int = 4096, max_ttl: float = 3600, invalid_ttl: float = 60) -> None:
+        self.secret = secret
+        self.max_ttl = max_ttl
+        self.invalid_ttl = invalid_ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=max_ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        """Claims ``{"user_id", "username", "is_admin", "exp"}`` for a token, or None if it is invalid"""
+        key = token_key(token)
+        claims = self._cache.get(key, False)
+        if claims is not False:
+            self.hits += 1
+            return claims
+
+        self.misses += 1
+        try:
+            payload = decode_jwt(token, self.secret)
+        except InvalidToken as e:
+            print(f"[DEBUG] Bearer token rejected: {e}")
+            self._cache.set(key, None, ttl=self.invalid_ttl)
+            return None
+
+        user_id = payload.get("user_id") or payload.get("sub")
+        if isinstance(user_id, str) and user_id.isdigit():
+            user_id = int(user_id)
+        username = payload.get("username") or ""
+        exp = payload.get("exp")
+        claims = {
+            "user_id": user_id,
+            "username": username,
+            "is_admin": is_admin_identity(user_id, username),
+            "exp": exp,
+        }
+        ttl = self.max_ttl if exp is None else min(self.max_ttl, float(exp) - time.time())
+        self._cache.set(key, claims, ttl=ttl)
+        return claims
+
+    def invalidate(self, token: str) -> None:
+        self._cache.pop(token_key(token))
+
+    @property
+    def stats(self) -> dict:
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
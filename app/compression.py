@@ -0,0 +1,184 @@
+"""
+Response compression for the JSON API.
+
+Brotli (when the optional ``brotli`` package is installed) or gzip,
+negotiated from Accept-Encoding. A complete response below ``min_size`` is
+sent as-is. Streamed responses (NDJSON/SSE) are compressed chunk by chunk
+with a flush after each chunk, so every step still reaches the client as
+soon as it is produced.
+
+Configuration (environment):
+    API_COMPRESS_MIN_BYTES: smallest body worth compressing (default 1024)
+    API_GZIP_LEVEL: gzip level 1-9 (default 6)
+    API_BROTLI_QUALITY: brotli quality 0-11 (default 4; higher is smaller but much slower)
+"""
+
+import os
+import time
+import zlib
+from typing import Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .assets import brotli, negotiate_encoding
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class CompressionStats:
+    def __init__(self) -> None:
+        self.compressed = {"br": 0, "gzip": 0}
+        self.streamed = 0
+        self.skipped_small = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def record(self, bytes_in: int, bytes_out: int, seconds: float) -> None:
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.seconds += seconds
+
+    def snapshot(self) -> dict:
+        count = sum(self.compressed.values())
+        return {
+            "compressed": dict(self.compressed),
+            "streamed": self.streamed,
+            "skipped_small": self.skipped_small,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            "avg_ms_per_response": round(1000 * self.seconds / count, 3) if count else None,
+        }
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress and flush, so the bytes so far can be decoded by the client"""
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+    def whole(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH)
+
+
+class APICompressionMiddleware:
+    """ASGI middleware compressing responses under the given path prefixes"""
+
+    def __init__(
+        self,
+        app,
+        prefixes: Sequence[str] = ("/api/",),
+        min_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        stats: CompressionStats = None,
+    ) -> None:
+        self.app = app
+        self.prefixes = tuple(prefixes)
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = stats or CompressionStats()
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    @classmethod
+    def options_from_env(cls) -> dict:
+        return {
+            "min_size": int(os.getenv("API_COMPRESS_MIN_BYTES", "1024")),
+            "gzip_level": int(os.getenv("API_GZIP_LEVEL", "6")),
+            "brotli_quality": int(os.getenv("API_BROTLI_QUALITY", "4")),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes) or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    message["status"] < 200 or message["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held until the first body chunk shows whether the response streams
+                    start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.min_size:
+                    self.stats.skipped_small += 1
+                    passthrough = True
+                    await send(start_message)
+                    start_message = None
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = encoding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # Same content, different bytes: only a weak validator still holds
+                    # (If-None-Match uses weak comparison, so revalidation keeps working)
+                    headers["ETag"] = f"W/{etag}"
+                self.stats.compressed[encoding] += 1
+                started = time.perf_counter()
+                if not more_body:
+                    out = compressor.whole(body)
+                    self.stats.record(len(body), len(out), time.perf_counter() - started)
+                    headers["Content-Length"] = str(len(out))
+                    await send(start_message)
+                    start_message = None
+                    await send({"type": "http.response.body", "body": out})
+                    return
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                self.stats.streamed += 1
+                await send(start_message)
+                start_message = None
+
+            started = time.perf_counter()
+            out = compressor.chunk(body) if body else b""
+            if not more_body:
+                out += compressor.finish()
+            self.stats.record(len(body), len(out), time.perf_counter() - started)
+            await send({"type": "http.response.body", "body": out, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
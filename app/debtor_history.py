@@ -0,0 +1,291 @@
+import json
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .debtor_store import DEBTORS_TABLE, is_missing_table_error
+
+
+# One trend row (JSON) per saved report, created by the Alembic migration in alembic/versions
+SUMMARIES_TABLE = "pharmasight.debtor_report_summaries"
+HISTORY_BUCKETS = ("current", "d30", "d60", "d90", "d120", "d150", "d180")
+# Amounts below this are treated as zero (rounding in the source reports)
+_CENT = 0.005
+_COLUMNS = ("report_date", "acc_no", "name") + HISTORY_BUCKETS + ("balance", "is_medical_aid_control")
+
+
+class DebtorSnapshot:
+    """One uploaded debtor report stored column-wise.
+
+    ``acc_no`` is sorted and unique, so two snapshots are joined with
+    np.intersect1d instead of a dict rescan. ``amounts`` has one column per
+    ageing bucket followed by the balance.
+    """
+
+    __slots__ = ("acc_no", "names", "amounts")
+
+    def __init__(self, acc_no: np.ndarray, names: np.ndarray, amounts: np.ndarray) -> None:
+        self.acc_no = acc_no
+        self.names = names
+        self.amounts = amounts
+
+    @classmethod
+    def from_records(cls, debtors: Iterable[dict]) -> "DebtorSnapshot":
+        rows = {}
+        for debtor in debtors:
+            acc_no = str(debtor.get("acc_no") or "").strip()
+            if acc_no and not debtor.get("is_medical_aid_control"):
+                rows[acc_no] = debtor
+        acc_no = np.array(sorted(rows), dtype=np.str_)
+        names = np.array([str(rows[a].get("name") or "") for a in acc_no], dtype=np.str_)
+        amounts = np.array(
+            [[float(rows[a].get(col) or 0) for col in HISTORY_BUCKETS + ("balance",)] for a in acc_no],
+            dtype=np.float64,
+        ).reshape(len(acc_no), len(HISTORY_BUCKETS) + 1)
+        return cls(acc_no, names, amounts)
+
+    @property
+    def balance(self) -> np.ndarray:
+        return self.amounts[:, -1]
+
+    def oldest_bucket(self) -> np.ndarray:
+        """Index of the oldest ageing bucket with money in it, -1 when nothing is owed"""
+        owing = self.amounts[:, : len(HISTORY_BUCKETS)] > _CENT
+        last = len(HISTORY_BUCKETS) - 1 - np.argmax(owing[:, ::-1], axis=1)
+        return np.where(owing.any(axis=1), last, -1)
+
+    def summary(self) -> dict:
+        return {
+            "accounts": int(np.count_nonzero(self.balance > _CENT)),
+            "total_outstanding": round(float(self.balance.sum()), 2),
+            **{col: round(float(self.amounts[:, i].sum()), 2) for i, col in enumerate(HISTORY_BUCKETS)},
+        }
+
+    def __len__(self) -> int:
+        return len(self.acc_no)
+
+
+def _account(snapshot: DebtorSnapshot, row: int, **extra) -> dict:
+    return {
+        "acc_no": str(snapshot.acc_no[row]),
+        "name": str(snapshot.names[row]),
+        "balance": round(float(snapshot.balance[row]), 2),
+        **extra,
+    }
+
+
+def diff_debtor_snapshots(old: DebtorSnapshot, new: DebtorSnapshot, limit: Optional[int] = None) -> dict:
+    """Movements between two uploads, joined on acc_no.
+
+    - paid_down: balance went down (amount paid is the drop)
+    - aged_worse: the oldest bucket with money in it moved to an older bucket
+    - new: accounts owing now that were not owing before
+    - closed: accounts owing before that are missing or settled now
+    Lists are sorted by amount, largest first, and cut to ``limit`` if given.
+    """
+    old_owing = old.balance > _CENT
+    new_owing = new.balance > _CENT
+    _, old_idx, new_idx = np.intersect1d(old.acc_no, new.acc_no, assume_unique=True, return_indices=True)
+
+    # Unmatched rows count as a zero balance on the other side
+    new_matched = np.zeros(len(new), dtype=bool)
+    new_matched[new_idx] = True
+    old_matched = np.zeros(len(old), dtype=bool)
+    old_matched[old_idx] = True
+
+    new_rows = np.flatnonzero(new_owing & ~new_matched)
+    new_rows = np.concatenate([new_rows, new_idx[~old_owing[old_idx] & new_owing[new_idx]]])
+    closed_rows = np.flatnonzero(old_owing & ~old_matched)
+    closed_rows = np.concatenate([closed_rows, old_idx[old_owing[old_idx] & ~new_owing[new_idx]]])
+
+    both = old_owing[old_idx] & new_owing[new_idx]
+    change = new.balance[new_idx] - old.balance[old_idx]
+    paid = both & (change < -_CENT)
+    aged = both & (new.oldest_bucket()[new_idx] > old.oldest_bucket()[old_idx])
+
+    def ranked(rows: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        order = np.argsort(-amounts, kind="stable")
+        return rows[order][:limit] if limit is not None else rows[order]
+
+    paid_old, paid_new = old_idx[paid], new_idx[paid]
+    paid_amount = -change[paid]
+    paid_order = np.argsort(-paid_amount, kind="stable")
+    aged_old, aged_new = old_idx[aged], new_idx[aged]
+    aged_order = np.argsort(-new.balance[aged_new], kind="stable")
+    if limit is not None:
+        paid_order, aged_order = paid_order[:limit], aged_order[:limit]
+
+    old_oldest, new_oldest = old.oldest_bucket(), new.oldest_bucket()
+    return {
+        "summary": {
+            "paid_down": int(paid.sum()),
+            "paid_down_amount": round(float(paid_amount.sum()), 2),
+            "aged_worse": int(aged.sum()),
+            "aged_worse_amount": round(float(new.balance[aged_new].sum()), 2),
+            "new": int(len(new_rows)),
+            "new_amount": round(float(new.balance[new_rows].sum()), 2),
+            "closed": int(len(closed_rows)),
+            "closed_amount": round(float(old.balance[closed_rows].sum()), 2),
+        },
+        "paid_down": [
+            _account(new, n, previous_balance=round(float(old.balance[o]), 2), paid=round(float(a), 2))
+            for o, n, a in zip(paid_old[paid_order], paid_new[paid_order], paid_amount[paid_order])
+        ],
+        "aged_worse": [
+            _account(new, n, from_bucket=HISTORY_BUCKETS[old_oldest[o]], to_bucket=HISTORY_BUCKETS[new_oldest[n]])
+            for o, n in zip(aged_old[aged_order], aged_new[aged_order])
+        ],
+        "new": [_account(new, n) for n in ranked(new_rows, new.balance[new_rows])],
+        "closed": [_account(old, o) for o in ranked(closed_rows, old.balance[closed_rows])],
+    }
+
+
+def _iso(value) -> str:
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+class DebtorHistoryStore:
+    """Per-pharmacy debtor history read from the saved debtor reports table.
+
+    Every saved report is one report_date in the table, so the history
+    survives redeploys and always matches what was saved. Trend rows are
+    stored in ``summaries_table`` (one small row per report), which every
+    worker reads and record() keeps current, so nothing is memoised per
+    process.
+    """
+
+    def __init__(self, engine: Engine, table: str = DEBTORS_TABLE, summaries_table: str = SUMMARIES_TABLE) -> None:
+        self.engine = engine
+        self.table = table
+        self.summaries_table = summaries_table
+
+    def _rows(self, where: str, params: dict) -> list:
+        columns = ", ".join(f'"{col}"' for col in _COLUMNS)
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text(f"SELECT {columns} FROM {self.table} WHERE {where} ORDER BY report_date, acc_no"),
+                params,
+            ).mappings().all()
+
+    def dates(self, pharmacy_id: int) -> List[str]:
+        with self.engine.connect() as conn:
+            dates = conn.execute(
+                text(f"SELECT DISTINCT report_date FROM {self.table} WHERE pharmacy_id = :pharmacy_id ORDER BY report_date"),
+                {"pharmacy_id": pharmacy_id},
+            ).scalars().all()
+        return [_iso(d) for d in dates]
+
+    def load(self, pharmacy_id: int, report_date: str) -> Optional[DebtorSnapshot]:
+        rows = self._rows("pharmacy_id = :pharmacy_id AND report_date = :report_date",
+                          {"pharmacy_id": pharmacy_id, "report_date": report_date})
+        return DebtorSnapshot.from_records(rows) if rows else None
+
+    def _stored_trend(self, pharmacy_id: int) -> Dict[str, dict]:
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(
+                    text(f"SELECT report_date, summary FROM {self.summaries_table} WHERE pharmacy_id = :pharmacy_id"),
+                    {"pharmacy_id": pharmacy_id},
+                ).all()
+        except Exception as e:
+            if not is_missing_table_error(e):
+                raise
+            print(f"[WARNING] {self.summaries_table} does not exist yet, debtor trend rows are not stored")
+            return {}
+        return {_iso(report_date): json.loads(summary) for report_date, summary in rows}
+
+    def _store_trend_row(self, pharmacy_id: int, row: dict) -> None:
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(
+                    text(
+                        f"INSERT INTO {self.summaries_table} (pharmacy_id, report_date, summary) "
+                        "VALUES (:pharmacy_id, :report_date, :summary) "
+                        "ON CONFLICT (pharmacy_id, report_date) DO UPDATE SET summary = EXCLUDED.summary"
+                    ),
+                    {"pharmacy_id": pharmacy_id, "report_date": row["report_date"], "summary": json.dumps(row)},
+                )
+        except Exception as e:
+            if not is_missing_table_error(e):
+                raise
+
+    def trend(self, pharmacy_id: int) -> List[dict]:
+        """One summary row per saved report, oldest first
+
+        Stored rows are used as they are. A report without one, or whose row
+        was built against a different previous report, is summarised from the
+        debtor table (two reports at most) and its row stored.
+        """
+        stored = self._stored_trend(pharmacy_id)
+        rows, previous_date, previous_snapshot = [], None, None
+        for report_date in self.dates(pharmacy_id):
+            row = stored.get(report_date)
+            if row is not None and row["previous_date"] == previous_date:
+                previous_snapshot = None
+            else:
+                snapshot = self.load(pharmacy_id, report_date)
+                if previous_date is not None and previous_snapshot is None:
+                    previous_snapshot = self.load(pharmacy_id, previous_date)
+                previous = (previous_date, previous_snapshot) if previous_date is not None else None
+                row = self._trend_row(report_date, snapshot, previous)
+                self._store_trend_row(pharmacy_id, row)
+                previous_snapshot = snapshot
+            rows.append(row)
+            previous_date = report_date
+        return rows
+
+    def _trend_row(self, report_date: str, snapshot: DebtorSnapshot, previous: Optional[tuple]) -> dict:
+        row = {"report_date": report_date, **snapshot.summary(), "previous_date": None}
+        if previous is not None:
+            previous_date, previous_snapshot = previous
+            row["previous_date"] = previous_date
+            row.update(diff_debtor_snapshots(previous_snapshot, snapshot, limit=0)["summary"])
+        return row
+
+    def record(self, pharmacy_id: int, report_date: str, debtors: Iterable[dict]) -> dict:
+        """Merge a report that has just been saved to the table against the previous one.
+
+        Returns the movements since the previous report (None if this is the
+        first). The report's trend row is stored, and the row of the report
+        after it (if any) is dropped so trend() rebuilds it against this one.
+        """
+        snapshot = DebtorSnapshot.from_records(debtors)
+        dates = self.dates(pharmacy_id)
+        earlier = [d for d in dates if d < report_date]
+        later = [d for d in dates if d > report_date]
+        previous = (earlier[-1], self.load(pharmacy_id, earlier[-1])) if earlier else None
+
+        self._store_trend_row(pharmacy_id, self._trend_row(report_date, snapshot, previous))
+        if later:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(
+                        text(f"DELETE FROM {self.summaries_table} WHERE pharmacy_id = :pharmacy_id AND report_date = :report_date"),
+                        {"pharmacy_id": pharmacy_id, "report_date": later[0]},
+                    )
+            except Exception as e:
+                if not is_missing_table_error(e):
+                    raise
+        return {
+            "report_date": report_date,
+            "previous_date": previous[0] if previous else None,
+            "movements": diff_debtor_snapshots(previous[1], snapshot) if previous else None,
+        }
+
+    def account_history(self, pharmacy_id: int, acc_no: str) -> List[dict]:
+        """Balances of one account in every saved report"""
+        rows = self._rows(
+            "pharmacy_id = :pharmacy_id AND acc_no = :acc_no AND NOT is_medical_aid_control",
+            {"pharmacy_id": pharmacy_id, "acc_no": acc_no},
+        )
+        return [
+            {
+                "report_date": _iso(row["report_date"]),
+                "name": str(row["name"] or ""),
+                **{col: round(float(row[col] or 0), 2) for col in HISTORY_BUCKETS},
+                "balance": round(float(row["balance"] or 0), 2),
+            }
+            for row in rows
+        ]
@@ -0,0 +1,186 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+AGEING_BUCKETS = ("current", "d30", "d60", "d90", "d120", "d150", "d180")
+AMOUNT_COLUMNS = AGEING_BUCKETS + ("balance",)
+DEBTOR_SORT_COLUMNS = ("acc_no", "name") + AMOUNT_COLUMNS + ("email", "phone")
+
+# Sorts after any character a search prefix can contain
+_PREFIX_END = "\U0010ffff"
+
+
+def _prefix_range(keys: np.ndarray, prefix: str) -> slice:
+    lo = int(np.searchsorted(keys, prefix, side="left"))
+    hi = int(np.searchsorted(keys, prefix + _PREFIX_END, side="left"))
+    return slice(lo, hi)
+
+
+class DebtorIndex:
+    """One pharmacy's debtor book, indexed for statistics and search.
+
+    - Per ageing bucket (and balance): the values sorted ascending, the row
+      order that sorts them and suffix sums, so "accounts / outstanding with
+      at least R x" is a binary search.
+    - A sorted prefix index over the account number, the full name and each
+      word of the name, so search is a binary search per query word.
+    """
+
+    def __init__(self, debtors: Sequence[dict], source: str = "upload", built_at: Optional[str] = None) -> None:
+        self.debtors = list(debtors)
+        self.source = source
+        self.built_at = built_at or datetime.now().isoformat(timespec="seconds")
+        n = len(self.debtors)
+
+        self.acc_no = np.array([str(d.get("acc_no") or "") for d in self.debtors], dtype=object)
+        self.names = np.array([str(d.get("name") or "") for d in self.debtors], dtype=object)
+        self.amounts: Dict[str, np.ndarray] = {
+            col: np.array([float(d.get(col) or 0) for d in self.debtors], dtype=np.float64)
+            for col in AMOUNT_COLUMNS
+        }
+        self.has_email = np.array([bool(d.get("email")) for d in self.debtors], dtype=bool)
+        self.has_phone = np.array([bool(d.get("phone")) for d in self.debtors], dtype=bool)
+        self.medical_aid = np.array([bool(d.get("is_medical_aid_control")) for d in self.debtors], dtype=bool)
+
+        self._order: Dict[str, np.ndarray] = {}
+        self._sorted: Dict[str, np.ndarray] = {}
+        self._suffix: Dict[str, np.ndarray] = {}
+        for col, values in self.amounts.items():
+            order = np.argsort(values, kind="stable")
+            self._order[col] = order
+            self._sorted[col] = values[order]
+            # _suffix[i] = sum of sorted values from i onwards; one extra 0 at the end
+            self._suffix[col] = np.concatenate([np.cumsum(values[order][::-1])[::-1], [0.0]]) if n else np.zeros(1)
+
+        keys: List[str] = []
+        rows: List[int] = []
+        for row, (acc_no, name) in enumerate(zip(self.acc_no, self.names)):
+            name = name.lower()
+            for key in {acc_no.lower(), name, *name.split()}:
+                if key:
+                    keys.append(key)
+                    rows.append(row)
+        key_array = np.array(keys, dtype=np.str_)
+        order = np.argsort(key_array, kind="stable")
+        self._prefix_keys = key_array[order]
+        self._prefix_rows = np.array(rows, dtype=np.int64)[order]
+
+    def __len__(self) -> int:
+        return len(self.debtors)
+
+    def at_least(self, column: str, threshold: float) -> tuple:
+        """(accounts, outstanding) with column >= threshold"""
+        start = int(np.searchsorted(self._sorted[column], threshold, side="left"))
+        return len(self) - start, float(self._suffix[column][start])
+
+    def match(self, query: str) -> np.ndarray:
+        """Row mask of debtors where every query word prefixes the account number, name or a name word"""
+        mask = np.ones(len(self), dtype=bool)
+        for word in query.lower().split():
+            rows = self._prefix_rows[_prefix_range(self._prefix_keys, word)]
+            word_mask = np.zeros(len(self), dtype=bool)
+            word_mask[rows] = True
+            mask &= word_mask
+        return mask
+
+    def statistics(self, thresholds: Iterable[float] = (), exclude_medical_aid: bool = False) -> dict:
+        """Ageing totals and account counts, plus accounts/outstanding at or above each balance threshold"""
+        index = self._without_medical_aid() if exclude_medical_aid else self
+        stats = {
+            "total_accounts": len(index),
+            "total_outstanding": round(float(index.amounts["balance"].sum()), 2),
+        }
+        for col in AGEING_BUCKETS:
+            stats[col] = round(float(index.amounts[col].sum()), 2)
+        stats["accounts_by_bucket"] = {
+            col: int(np.count_nonzero(index.amounts[col] > 0)) for col in AGEING_BUCKETS
+        }
+        stats["balance_thresholds"] = []
+        for threshold in thresholds:
+            accounts, outstanding = index.at_least("balance", threshold)
+            stats["balance_thresholds"].append({
+                "min_balance": threshold,
+                "accounts": accounts,
+                "outstanding": round(outstanding, 2),
+            })
+        stats["source"] = self.source
+        stats["indexed_at"] = self.built_at
+        return stats
+
+    def _without_medical_aid(self) -> "DebtorIndex":
+        if not self.medical_aid.any():
+            return self
+        cached = getattr(self, "_no_medical_aid", None)
+        if cached is None:
+            cached = DebtorIndex(
+                [d for d, flag in zip(self.debtors, self.medical_aid) if not flag],
+                source=self.source,
+                built_at=self.built_at,
+            )
+            self._no_medical_aid = cached
+        return cached
+
+    def search(
+        self,
+        query: str = "",
+        min_balance: float = 0,
+        buckets: Optional[Sequence[str]] = None,
+        has_email: bool = False,
+        has_phone: bool = False,
+        exclude_medical_aid: bool = True,
+        sort: str = "balance",
+        descending: bool = True,
+        page: int = 1,
+        page_size: int = 100,
+    ) -> dict:
+        """Filter, sort and page the debtor book.
+
+        ``buckets`` keeps debtors with a positive amount in at least one of
+        the given ageing buckets; ``None`` or all buckets applies no filter
+        and an empty list matches nothing (as the debtor screen does).
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if min_balance > 0:
+            start = int(np.searchsorted(self._sorted["balance"], min_balance, side="left"))
+            mask[:] = False
+            mask[self._order["balance"][start:]] = True
+        if query and query.strip():
+            mask &= self.match(query)
+        if buckets is not None and set(buckets) != set(AGEING_BUCKETS):
+            in_bucket = np.zeros(len(self), dtype=bool)
+            for col in buckets:
+                in_bucket |= self.amounts[col] > 0
+            mask &= in_bucket
+        if has_email:
+            mask &= self.has_email
+        if has_phone:
+            mask &= self.has_phone
+        if exclude_medical_aid:
+            mask &= ~self.medical_aid
+
+        rows = np.flatnonzero(mask)
+        if sort in self.amounts:
+            keys = self.amounts[sort][rows]
+        elif sort == "name":
+            keys = np.array([n.lower() for n in self.names[rows]], dtype=np.str_)
+        elif sort == "acc_no":
+            keys = self.acc_no[rows].astype(np.str_)
+        else:
+            keys = np.array([str(self.debtors[r].get(sort) or "") for r in rows], dtype=np.str_)
+        order = np.argsort(keys, kind="stable")
+        if descending:
+            order = order[::-1]
+        rows = rows[order]
+
+        start = (page - 1) * page_size
+        return {
+            "total": int(len(rows)),
+            "total_outstanding": round(float(self.amounts["balance"][rows].sum()), 2),
+            "page": page,
+            "page_size": page_size,
+            "indexed_at": self.built_at,
+            "source": self.source,
+            "debtors": [self.debtors[r] for r in rows[start:start + page_size]],
+        }
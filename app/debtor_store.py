@@ -0,0 +1,128 @@
+import csv
+import io
+from typing import Iterable, List, Optional
+
+from sqlalchemy.engine import Engine
+
+
+# Owned by this app and created by the Alembic migration in alembic/versions,
+# so it never collides with the pharmacy API's own tables on the shared database
+DEBTORS_TABLE = "pharmasight.debtor_reports"
+
+DEBTOR_COLUMNS = [
+    "pharmacy_id",
+    "report_date",
+    "acc_no",
+    "name",
+    "current",
+    "d30",
+    "d60",
+    "d90",
+    "d120",
+    "d150",
+    "d180",
+    "balance",
+    "email",
+    "phone",
+    "is_medical_aid_control",
+]
+
+# COPY marker for NULL; anything else (including "") is a value
+_COPY_NULL = "\\N"
+
+# Postgres undefined_table / invalid_schema_name
+_MISSING_TABLE_CODES = ("42P01", "3F000")
+
+
+class DebtorStoreNotReady(Exception):
+    """The debtor table does not exist yet: the Alembic migration has not been run"""
+
+
+def is_missing_table_error(error: BaseException) -> bool:
+    """Whether a driver or SQLAlchemy error means the table (or its schema) is missing"""
+    code = getattr(error, "pgcode", None) or getattr(getattr(error, "orig", None), "pgcode", None)
+    return code in _MISSING_TABLE_CODES
+
+
+def debtors_to_copy_buffer(debtors: Iterable[dict], pharmacy_id: int, report_date: str) -> io.StringIO:
+    """Serialise debtor dicts as CSV for COPY, one row per distinct acc_no (last one wins)"""
+    rows = {}
+    for debtor in debtors:
+        acc_no = str(debtor.get("acc_no") or "").strip()
+        if not acc_no:
+            continue
+        rows[acc_no] = [
+            pharmacy_id,
+            report_date,
+            acc_no,
+            debtor.get("name"),
+            *(float(debtor.get(col) or 0) for col in DEBTOR_COLUMNS[4:12]),
+            debtor.get("email"),
+            debtor.get("phone"),
+            "t" if debtor.get("is_medical_aid_control") else "f",
+        ]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in rows.values():
+        writer.writerow(_COPY_NULL if value is None else value for value in row)
+    buffer.seek(0)
+    return buffer
+
+
+def upsert_debtors(
+    engine: Engine,
+    pharmacy_id: int,
+    report_date: str,
+    debtors: List[dict],
+    table: str = DEBTORS_TABLE,
+    buffer: Optional[io.StringIO] = None,
+) -> int:
+    """Bulk upsert a parsed debtor report in one transaction.
+
+    Rows are streamed with COPY into a temporary staging table and merged
+    with a single INSERT ... ON CONFLICT (pharmacy_id, acc_no, report_date),
+    so the whole report costs a handful of round trips instead of one per
+    debtor. Accounts left over from an earlier save for the same date are
+    deleted, so the table holds exactly the saved report. Returns the number
+    of rows written; raises DebtorStoreNotReady if the table is missing.
+    """
+    if buffer is None:
+        buffer = debtors_to_copy_buffer(debtors, pharmacy_id, report_date)
+    column_list = ", ".join(f'"{col}"' for col in DEBTOR_COLUMNS)
+    updates = ", ".join(f'"{col}" = EXCLUDED."{col}"' for col in DEBTOR_COLUMNS[3:])
+
+    with engine.begin() as conn:
+        driver_conn = conn.connection.driver_connection
+        with driver_conn.cursor() as cur:
+            try:
+                cur.execute(
+                    f"CREATE TEMP TABLE debtors_staging (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+            except Exception as e:
+                if is_missing_table_error(e):
+                    raise DebtorStoreNotReady(f"{table} does not exist; run alembic upgrade head") from e
+                raise
+            cur.copy_expert(
+                f"COPY debtors_staging ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '{_COPY_NULL}')",
+                buffer,
+            )
+            cur.execute(
+                f"""
+                INSERT INTO {table} ({column_list}, updated_at)
+                SELECT {column_list}, now() FROM debtors_staging
+                ON CONFLICT (pharmacy_id, acc_no, report_date)
+                DO UPDATE SET {updates}, updated_at = now()
+                """
+            )
+            written = cur.rowcount
+            # A report saved again for the same date replaces it: drop accounts it no longer has
+            cur.execute(
+                f"""
+                DELETE FROM {table} t
+                WHERE t.pharmacy_id = %s AND t.report_date = %s
+                  AND NOT EXISTS (SELECT 1 FROM debtors_staging s WHERE s.acc_no = t.acc_no)
+                """,
+                (pharmacy_id, report_date),
+            )
+            return written
@@ -0,0 +1,88 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+
+def json_etag(payload: Any) -> str:
+    """Strong ETag for a JSON-serialisable payload (key order independent)"""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+
+
+def body_etag(body: bytes) -> str:
+    """Strong ETag for an already encoded body"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def derived_etag(etag: str, *parts: Any) -> str:
+    """ETag for a view (page, filter, fields) of a payload whose ETag is already known"""
+    digest = hashlib.sha256("|".join([etag] + [str(p) for p in parts]).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def not_modified(request: Request, etag: Optional[str] = None, last_modified: Optional[datetime] = None) -> bool:
+    """Whether the client's cached copy is current (If-None-Match, else If-Modified-Since)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _validator_headers(etag: str, last_modified: Optional[datetime], cache_control: str) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def conditional_json(
+    request: Request,
+    payload: Any,
+    etag: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+    cache_control: str = "private, no-cache",
+) -> Response:
+    """JSONResponse with validators, or an empty 304 when the client already has it
+
+    ``etag`` defaults to a hash of ``payload``; pass a precomputed one to skip
+    hashing. ``last_modified`` must be timezone-aware.
+    """
+    etag = etag or json_etag(payload)
+    headers = _validator_headers(etag, last_modified, cache_control)
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+
+def conditional_body(
+    request: Request,
+    body: bytes,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    cache_control: str = "private, no-cache",
+    media_type: str = "application/json",
+) -> Response:
+    """Like conditional_json for an already encoded body, so it is never re-serialised"""
+    headers = _validator_headers(etag, last_modified, cache_control)
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
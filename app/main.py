@@ -1,17 +1,22 @@
-from fastapi import FastAPI, Request, Form, HTTPException, Query
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse
+from fastapi import FastAPI, Depends, Request, Form, HTTPException, Query, UploadFile, File
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import text
 import httpx
+import asyncio
 import os
+import time
+from typing import Optional
 from dotenv import load_dotenv
 from urllib.parse import quote
 from datetime import date, datetime, timedelta
 from calendar import monthrange
 import csv
+import fcntl
 import io
 import pytz
 import hashlib
@@ -19,6 +24,23 @@ import json
 import re
 from openai import OpenAI
 from .db import engine
+from .debtor_index import AGEING_BUCKETS, DEBTOR_SORT_COLUMNS, DebtorIndex
+from .debtor_history import DebtorHistoryStore, diff_debtor_snapshots
+from .debtor_store import DebtorStoreNotReady, upsert_debtors
+from debtor_parse_pool import DebtorParsePool, ParseQueueFull, ParseTimeout
+from debtor_pdf_pages import PARSER_VERSION
+from .assets import IMMUTABLE, AssetBundle, asset_response
+from .auth_claims import JWTClaimsCache, is_admin_identity, token_key
+from .cache import TTLCache
+from .compression import APICompressionMiddleware, CompressionStats
+from .http_cache import body_etag, conditional_body, conditional_json, derived_etag, json_etag
+from .parse_cache import ParseResultCache, parse_cache_key
+from .permissions import PermissionMatrix
+from .reminders import CHANNELS as REMINDER_CHANNELS, REQUIRED_TEMPLATE_VARIABLES, ReminderQueue, ReminderWorker, render_reminders
+from .reorder import REORDER_SORT_COLUMNS, build_reorder_base, compute_reorder_frame, page_reorder_frame
+from .sales_cache import ProductSalesCache
+from .sessions import ServerSessionMiddleware, SessionStore
+from .snapshots import AlertSnapshot, AlertSnapshotStore, diff_snapshots
 
 # Load environment variables
 load_dotenv()
@@ -65,17 +87,145 @@ DAILY_CUTOFF_HOUR = 18  # 18:00 SA time
 # In-memory cache for insights (in production, use Redis or database)
 insights_cache = {}
 
+# Daily product sales points for closed days, keyed by (pharmacy_id, product_code)
+product_sales_cache = ProductSalesCache(max_products=int(os.getenv("PRODUCT_SALES_CACHE_SIZE", "2000")))
+
+# 180-day product usage, keyed by (pharmacy_id, product_code)
+product_usage_cache = TTLCache(maxsize=20000, ttl=int(os.getenv("PRODUCT_USAGE_CACHE_TTL", "3600")))
+USAGE_BATCH_CONCURRENCY = int(os.getenv("USAGE_BATCH_CONCURRENCY", "8"))
+USAGE_BATCH_MAX_CODES = 500
+
+# Stock on hand, keyed by (pharmacy_id, date, product_code). Dates at least
+# STOCK_FINALITY_LAG_DAYS before today are final (yesterday may still be syncing)
+# and kept for PRODUCT_STOCK_CLOSED_TTL; anything more recent expires quickly.
+product_stock_cache = TTLCache(maxsize=50000, ttl=int(os.getenv("PRODUCT_STOCK_CACHE_TTL", "300")))
+PRODUCT_STOCK_CLOSED_TTL = int(os.getenv("PRODUCT_STOCK_CLOSED_TTL", "604800"))
+STOCK_FINALITY_LAG_DAYS = max(1, int(os.getenv("STOCK_FINALITY_LAG_DAYS", "1")))
+STOCK_BATCH_CONCURRENCY = int(os.getenv("STOCK_BATCH_CONCURRENCY", "8"))
+STOCK_BATCH_MAX_CODES = 500
+# Read on-hand straight from the reporting database instead of the API
+STOCK_DIRECT_DB = os.getenv("STOCK_DIRECT_DB", "false").lower() == "true"
+
+# Joined usage/on-hand frames per (pharmacy_id, date), precomputed nightly. Past
+# dates are kept until evicted; today's on-hand still moves, so it expires quickly.
+reorder_base_cache = TTLCache(maxsize=128, ttl=None)
+REORDER_OPEN_TTL = int(os.getenv("REORDER_OPEN_TTL", "300"))
+REORDER_USAGE_LIMIT = int(os.getenv("REORDER_USAGE_LIMIT", "2000"))
+REORDER_PRECOMPUTE_HOUR = int(os.getenv("REORDER_PRECOMPUTE_HOUR", "2"))  # SA time
+# Held by the one worker process that runs the nightly precompute
+REORDER_PRECOMPUTE_LOCK = os.getenv("REORDER_PRECOMPUTE_LOCK", "data/reorder_precompute.lock")
+
+# Decoded bearer-token claims by token hash, expiring with the token's exp.
+# Set JWT_SECRET (HS256) to also verify signatures locally; without it, admin
+# claims in a bearer token are confirmed with the backend (see _check_admin_access).
+jwt_claims = JWTClaimsCache(secret=os.getenv("JWT_SECRET") or None)
+
+# Pharmacy lists captured at login, per username and bound to the login token's hash
+user_pharmacies_cache = TTLCache(maxsize=2048, ttl=int(os.getenv("USER_PHARMACIES_TTL", "600")))
+
+# Upstream /admin/users list for the admin screens per admin token (by hash), so it is only
+# served to a token the backend accepted for it; dropped whenever an admin changes users or access
+admin_users_cache = TTLCache(maxsize=32, ttl=int(os.getenv("ADMIN_USERS_TTL", "300")))
+# Whether the upstream accepted a bearer token for /admin/users, by token hash. Used for
+# admin bearer tokens when JWT_SECRET is not set and their signature can't be checked here.
+admin_token_checks = TTLCache(maxsize=1024, ttl=int(os.getenv("ADMIN_TOKEN_CHECK_TTL", "300")))
+# Upstream status for a caller's own token on a pharmacy, by (token hash, pharmacy_id). Guards
+# data served from caches filled with the service key (see _require_pharmacy_read).
+pharmacy_read_checks = TTLCache(maxsize=4096, ttl=int(os.getenv("PHARMACY_READ_CHECK_TTL", "300")))
+
+# Upstream bodies for /api/days, /api/mtd and /api/targets with their ETag, keyed by
+# (endpoint, pharmacy_id, params). Windows whose figures are final (see _window_closed) are held much longer.
+proxy_fingerprints = TTLCache(maxsize=4096, ttl=int(os.getenv("PROXY_OPEN_WINDOW_TTL", "60")))
+PROXY_CLOSED_WINDOW_TTL = int(os.getenv("PROXY_CLOSED_WINDOW_TTL", "21600"))
+
+# Pharmacy access per user for local authorization; reloaded from /admin/users with the service key
+permission_matrix = PermissionMatrix(ttl=int(os.getenv("PERMISSION_MATRIX_TTL", "300")))
+PERMISSION_MATRIX_RETRY_SECONDS = 300
+_permission_matrix_lock = asyncio.Lock()
+_permission_matrix_retry_at = 0.0
+# Routes that change pharmacy data and so need write access: (method, route path)
+PHARMACY_WRITE_ROUTES = {
+    ("POST", "/api/targets"),
+    ("POST", "/api/pharmacies/{pharmacy_id}/debtors/reminders"),
+}
+
+# Bulk admin access changes: at most this many operations per call, sent upstream this many at a time
+ADMIN_BULK_MAX_OPERATIONS = 500
+ADMIN_BULK_CONCURRENCY = int(os.getenv("ADMIN_BULK_CONCURRENCY", "5"))
+
+# Daily negative-SOH / low-GP lists per pharmacy, for day-over-day diffs
+alert_snapshots = AlertSnapshotStore(os.getenv("SNAPSHOT_DIR", "data/snapshots"))
+
+# Debtor PDF parsing runs in worker processes so uploads don't block the event loop
+debtor_parse_pool = DebtorParsePool.from_env()
+# Per-pharmacy debtor books indexed for statistics and search (see app/debtor_index.py)
+debtor_indexes = TTLCache(maxsize=256, ttl=int(os.getenv("DEBTOR_INDEX_TTL", "3600")))
+DEBTOR_INDEX_PAGE_SIZE = 1000
+DEBTOR_INDEX_MAX_PAGES = 100
+# Outbound debtor reminders (email/SMS), drained by one background worker per channel; the
+# queue lives in the app database unless REMINDER_QUEUE_URL points elsewhere
+reminder_queue = ReminderQueue.from_env(engine)
+reminder_workers = {}
+REMINDER_MAX_ACCOUNTS = 10000
+# Movements between saved debtor reports and collection trends, read from the debtor table
+debtor_history = DebtorHistoryStore(engine)
+DEBTOR_MOVEMENT_LIMIT = 100
+# Parsed reports by content hash, so re-uploading the same PDF skips the parse
+debtor_parse_cache = ParseResultCache(
+    os.getenv("DEBTOR_PARSE_CACHE_DIR", "data/debtor_parse_cache"),
+    max_bytes=int(os.getenv("DEBTOR_PARSE_CACHE_MB", "256")) * 1024 * 1024,
+)
+
 # Session middleware
 # https_only should be True in production with custom domain for security
 # Set to False for local development or if Render doesn't handle HTTPS properly
 HTTPS_ONLY = os.getenv("HTTPS_ONLY", "true").lower() == "true"
-app.add_middleware(
-    SessionMiddleware, 
-    secret_key=SESSION_SECRET, 
-    max_age=60 * 60 * 12, 
-    https_only=HTTPS_ONLY,
-    same_site="lax"
-)
+SESSION_MAX_AGE = 60 * 60 * 12
+# "server" keeps only an opaque id in the cookie (see app/sessions.py); "cookie" is the signed-cookie SessionMiddleware.
+# Server-side sessions need a store shared by every worker and instance, so they are only the
+# default when SESSION_STORE_URL points at one; a local SQLite file is lost on every redeploy.
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "")
+SESSION_BACKEND = os.getenv(
+    "SESSION_BACKEND", "server" if SESSION_STORE_URL and not SESSION_STORE_URL.startswith("sqlite") else "cookie"
+).lower()
+session_store = None
+if SESSION_BACKEND == "cookie":
+    app.add_middleware(
+        SessionMiddleware, 
+        secret_key=SESSION_SECRET, 
+        max_age=SESSION_MAX_AGE, 
+        https_only=HTTPS_ONLY,
+        same_site="lax"
+    )
+else:
+    session_store = SessionStore.from_env(SESSION_MAX_AGE)
+    session_store.create_tables()
+    app.add_middleware(
+        ServerSessionMiddleware,
+        store=session_store,
+        https_only=HTTPS_ONLY,
+        same_site="lax",
+        skip_paths=("/static/", "/assets/", "/js/", "/img/", "/styles.css", "/auth.js", "/script.js", "/favicon"),
+    )
+
+
+# Compress /api/* responses (brotli/gzip, see app/compression.py); outermost, so it sees final bodies
+api_compression_stats = CompressionStats()
+app.add_middleware(APICompressionMiddleware, stats=api_compression_stats, **APICompressionMiddleware.options_from_env())
+
+
+@app.get("/api/compression/stats")
+async def api_compression_stats_endpoint() -> JSONResponse:
+    """Responses compressed per encoding, bytes in/out, overall ratio and average time per response"""
+    return JSONResponse(api_compression_stats.snapshot())
+
+
+@app.on_event("startup")
+async def purge_expired_sessions() -> None:
+    if session_store is not None:
+        purged = await run_in_threadpool(session_store.purge_expired)
+        if purged:
+            print(f"[DEBUG] Purged {purged} expired sessions")
 
 # Static files and templates
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -86,6 +236,41 @@ app.mount("/js", StaticFiles(directory="webApp2/js"), name="webapp2_js")
 app.mount("/img", StaticFiles(directory="webApp2/img"), name="webapp2_img")
 
 
+# Hashed, precompressed webApp2 assets (see app/assets.py); built at startup,
+# until then (or with WEBAPP_ASSET_BUNDLE=false) the files are served as-is
+WEBAPP_ASSET_BUNDLE = os.getenv("WEBAPP_ASSET_BUNDLE", "true").lower() == "true"
+webapp_assets = AssetBundle("webApp2", pages=("index.html", "login.html"))
+_webapp_assets_ready = False
+
+
+@app.on_event("startup")
+async def build_webapp_assets() -> None:
+    global _webapp_assets_ready
+    if not WEBAPP_ASSET_BUNDLE:
+        return
+    try:
+        await run_in_threadpool(webapp_assets.build)
+        _webapp_assets_ready = True
+        print(f"[DEBUG] Built webApp2 asset bundle: {webapp_assets.stats}")
+    except OSError as e:
+        print(f"[WARNING] Could not build webApp2 asset bundle, serving files directly: {e}")
+
+
+def _webapp_page(request: Request, name: str):
+    """A webApp2 page with hashed asset URLs, revalidated on every visit"""
+    if _webapp_assets_ready:
+        return asset_response(request, webapp_assets.pages[name], "no-cache")
+    return FileResponse(f"webApp2/{name}", media_type="text/html")
+
+
+@app.get("/assets/{path:path}")
+def webapp2_asset(request: Request, path: str):
+    asset = webapp_assets.assets.get(path) if _webapp_assets_ready else None
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return asset_response(request, asset, IMMUTABLE)
+
+
 # Serve webApp2 CSS and JS files directly
 @app.get("/styles.css")
 def webapp2_styles():
@@ -103,15 +288,15 @@ def webapp2_script():
 
 
 @app.get("/index.html", response_class=HTMLResponse)
-def webapp2_index():
+def webapp2_index(request: Request):
     # Serve webApp2 dashboard when accessed directly as index.html
-    return FileResponse("webApp2/index.html", media_type="text/html")
+    return _webapp_page(request, "index.html")
 
 
 @app.get("/login.html", response_class=HTMLResponse)
-def webapp2_login_html():
+def webapp2_login_html(request: Request):
     # Serve webApp2 login page when accessed directly as login.html
-    return FileResponse("webApp2/login.html", media_type="text/html")
+    return _webapp_page(request, "login.html")
 
 
 @app.get("/favicon.ico")
@@ -132,11 +317,203 @@ def _auth_headers(request: Request) -> dict:
     return {"Authorization": f"Bearer {bearer}"} if bearer else {}
 
 
+async def _get_upstream(client: httpx.AsyncClient, url: str, headers: dict) -> httpx.Response:
+    """GET an upstream URL, retrying with X-API-Key if the bearer is rejected"""
+    resp = await client.get(url, headers=headers)
+    if resp.status_code == 401 and API_KEY:
+        resp = await client.get(url, headers={"X-API-Key": API_KEY})
+    return resp
+
+
+def _sort_pharmacies(pharmacies: list) -> list:
+    # Sort pharmacies so "TLC GROUP" always appears last
+    pharmacies.sort(key=lambda p: (
+        p.get("pharmacy_name") or p.get("name") or ""
+    ).upper() == "TLC GROUP")
+    return pharmacies
+
+
+def _request_identity(request: Request) -> tuple:
+    """(user_id, username) of the caller from the session, else from the bearer token's claims"""
+    user_id = request.session.get("user_id")
+    if user_id is not None:
+        return user_id, request.session.get("username")
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.startswith("Bearer "):
+        claims = jwt_claims.get(auth_header[7:])
+        if claims and claims["user_id"] is not None:
+            return claims["user_id"], claims["username"]
+    return None, None
+
+
+async def ensure_permission_matrix() -> None:
+    """Reload the permission matrix from /admin/users once it is stale (needs PHARMA_API_KEY)"""
+    global _permission_matrix_retry_at
+    if not permission_matrix.stale or not API_KEY or time.monotonic() < _permission_matrix_retry_at:
+        return
+    async with _permission_matrix_lock:
+        if not permission_matrix.stale:
+            return
+        try:
+            # Service-key list: feeds only the matrix, never the admin_users_cache admins read from
+            _load_permission_matrix(await _fetch_admin_users(API_KEY))
+        except Exception as e:
+            print(f"[WARNING] Could not load pharmacy permissions, checks are skipped for now: {e}")
+            _permission_matrix_retry_at = time.monotonic() + PERMISSION_MATRIX_RETRY_SECONDS
+
+
+async def require_pharmacy_access(request: Request) -> None:
+    """Reject requests for a pharmacy the caller has no access to, before any upstream call
+
+    Applies to routes with a {pharmacy_id} path parameter or a pid query
+    parameter. Admins, anonymous callers and users missing from the
+    permission matrix are let through to the upstream checks.
+    """
+    raw_pid = request.path_params.get("pharmacy_id") or request.query_params.get("pid")
+    if raw_pid is None:
+        return
+    try:
+        pharmacy_id = int(raw_pid)
+    except ValueError:
+        return
+    user_id, username = _request_identity(request)
+    if user_id is None or is_admin_identity(user_id, username):
+        return
+
+    await ensure_permission_matrix()
+    route = request.scope.get("route")
+    write = (request.method, getattr(route, "path", None)) in PHARMACY_WRITE_ROUTES
+    if permission_matrix.allows(user_id, pharmacy_id, write=write) is False:
+        print(f"[DEBUG] Pharmacy {pharmacy_id} {'write' if write else 'read'} access denied for user {user_id}")
+        raise HTTPException(
+            status_code=403,
+            detail=f"You do not have {'write' if write else 'read'} access to pharmacy {pharmacy_id}",
+        )
+
+
+# Routes copy the router's dependencies when they are declared, so this covers every route below
+app.router.dependencies.append(Depends(require_pharmacy_access))
+
+
+async def _prefetch_user_pharmacies(username: str, token: str, user_id=None):
+    """Fetch the user's pharmacies with their login token and cache them for /api/mobile/pharmacies
+
+    Also records the user's access in the permission matrix. Returns the
+    user_id from the response (or None); login never fails because of this call.
+    """
+    try:
+        path_username = quote(username, safe="")
+        user_info_url = f"{API_BASE_URL}/users/{path_username}/pharmacies"
+        async with httpx.AsyncClient(timeout=15) as client:
+            user_resp = await client.get(user_info_url, headers={"Authorization": f"Bearer {token}"})
+        if user_resp.status_code != 200:
+            return None
+        user_data = user_resp.json() or {}
+    except Exception as e:
+        print(f"[WARNING] Failed to prefetch pharmacies after login: {e}")
+        return None
+
+    user_pharmacies_cache.set(username.lower(), {
+        "token": token_key(token),
+        "pharmacies": _sort_pharmacies(user_data.get("pharmacies", [])),
+    })
+    user_id = user_id or user_data.get("user_id") or user_data.get("id")
+    if user_id and isinstance(user_data.get("pharmacies"), list):
+        try:
+            permission_matrix.set_user(int(user_id), user_data["pharmacies"])
+        except (TypeError, ValueError):
+            pass
+    return user_data.get("user_id") or user_data.get("id")
+
+
+def _require_session(request: Request) -> tuple:
+    """(user_id, username, auth_token) of the signed-in user; 401 without a session"""
+    user_id = request.session.get("user_id")
+    token = request.session.get("auth_token")
+    if user_id is None or not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return user_id, request.session.get("username"), token
+
+
+async def _require_pharmacy_write(request: Request, pharmacy_id: int) -> None:
+    """Signed-in user with write access to the pharmacy, for actions no upstream call checks
+
+    Unlike require_pharmacy_access, a user missing from the permission matrix
+    is not let through: their pharmacies are fetched with their own token first.
+    """
+    user_id, username, token = _require_session(request)
+    if is_admin_identity(user_id, username):
+        return
+
+    await ensure_permission_matrix()
+    allowed = permission_matrix.allows(user_id, pharmacy_id, write=True)
+    if allowed is None and username:
+        await _prefetch_user_pharmacies(username, token, user_id)
+        allowed = permission_matrix.allows(user_id, pharmacy_id, write=True)
+    if not allowed:
+        print(f"[DEBUG] Pharmacy {pharmacy_id} write access denied for user {user_id}")
+        raise HTTPException(status_code=403, detail=f"You do not have write access to pharmacy {pharmacy_id}")
+
+
+async def _require_pharmacy_read(request: Request, pharmacy_id: int) -> None:
+    """Caller with read access to the pharmacy, for data served from caches filled with the service key
+
+    Needs a session or a bearer token (401 otherwise). Session users are
+    checked against the permission matrix, fetching their pharmacies with
+    their own token if they are missing from it. Anyone still undecided,
+    including bearer-only callers, is checked by asking the upstream API for
+    the pharmacy's debtors with their own token.
+    """
+    user_id = request.session.get("user_id")
+    username = request.session.get("username")
+    token = request.session.get("auth_token")
+    if user_id is not None and token:
+        if is_admin_identity(user_id, username):
+            return
+        await ensure_permission_matrix()
+        allowed = permission_matrix.allows(user_id, pharmacy_id)
+        if allowed is None and username:
+            await _prefetch_user_pharmacies(username, token, user_id)
+            allowed = permission_matrix.allows(user_id, pharmacy_id)
+        if allowed is not None:
+            if not allowed:
+                print(f"[DEBUG] Pharmacy {pharmacy_id} read access denied for user {user_id}")
+                raise HTTPException(status_code=403, detail=f"You do not have access to pharmacy {pharmacy_id}")
+            return
+    else:
+        auth_header = request.headers.get("Authorization", "")
+        if not auth_header.startswith("Bearer ") or not auth_header[7:].strip():
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        token = auth_header[7:].strip()
+
+    key = (token_key(token), pharmacy_id)
+    status = pharmacy_read_checks.get(key)
+    if status is None:
+        # Not _get_upstream: it would retry a rejected token with the service key
+        try:
+            async with httpx.AsyncClient(timeout=15) as client:
+                resp = await client.get(
+                    f"{API_BASE_URL}/pharmacies/{pharmacy_id}/debtors?per_page=1&page=1",
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+        except httpx.HTTPError as e:
+            print(f"[ERROR] Pharmacy {pharmacy_id} access check failed: {e}")
+            raise HTTPException(status_code=502, detail="Could not check pharmacy access")
+        status = resp.status_code
+        if status in (200, 401, 403, 404):
+            pharmacy_read_checks.set(key, status)
+    if status == 401:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if status != 200:
+        print(f"[DEBUG] Pharmacy {pharmacy_id} read access denied by the API ({status})")
+        raise HTTPException(status_code=403, detail=f"You do not have access to pharmacy {pharmacy_id}")
+
+
 @app.get("/", response_class=HTMLResponse)
 @app.get("/login", response_class=HTMLResponse)
 def login_page(request: Request):
     # Serve the new webApp2 login page
-    return FileResponse("webApp2/login.html", media_type="text/html")
+    return _webapp_page(request, "login.html")
 
 
 @app.post("/login")
@@ -177,20 +554,10 @@ async def do_login(request: Request, username: str = Form(...), password: str =
     # Store canonical username as-is
     request.session["username"] = str(canonical_username or username).strip()
     
-    # If user_id not in login response, try to fetch it from the users endpoint
-    if not user_id and token:
-        try:
-            path_username = quote(str(canonical_username or username).strip(), safe="")
-            user_info_url = f"{API_BASE_URL}/users/{path_username}/pharmacies"
-            auth_headers = {"Authorization": f"Bearer {token}"}
-            async with httpx.AsyncClient(timeout=15) as client:
-                user_resp = await client.get(user_info_url, headers=auth_headers)
-                if user_resp.status_code == 200:
-                    user_data = user_resp.json() or {}
-                    # Try to get user_id from user data
-                    user_id = user_data.get("user_id") or user_data.get("id")
-        except Exception as e:
-            print(f"[WARNING] Failed to fetch user_id after login: {e}")
+    # Prefetch the pharmacy list for the first screen; it also gives user_id if login didn't
+    if token:
+        prefetched_user_id = await _prefetch_user_pharmacies(str(canonical_username or username).strip(), token, user_id)
+        user_id = user_id or prefetched_user_id
     
     # Store user_id if available
     if user_id:
@@ -233,20 +600,10 @@ async def mobile_login(username: str = Form(...), password: str = Form(...)):
     canonical_username = data.get("username") or data.get("user", {}).get("username") or username
     user_id = data.get("user_id") or data.get("user", {}).get("user_id") or data.get("id")
     
-    # If user_id not in login response, try to fetch it from the users endpoint
-    if not user_id and token:
-        try:
-            path_username = quote(str(canonical_username or username).strip(), safe="")
-            user_info_url = f"{API_BASE_URL}/users/{path_username}/pharmacies"
-            auth_headers = {"Authorization": f"Bearer {token}"}
-            async with httpx.AsyncClient(timeout=15) as client:
-                user_resp = await client.get(user_info_url, headers=auth_headers)
-                if user_resp.status_code == 200:
-                    user_data = user_resp.json() or {}
-                    # Try to get user_id from user data
-                    user_id = user_data.get("user_id") or user_data.get("id")
-        except Exception as e:
-            print(f"[WARNING] Failed to fetch user_id after mobile login: {e}")
+    # Prefetch the pharmacy list for the first screen; it also gives user_id if login didn't
+    if token:
+        prefetched_user_id = await _prefetch_user_pharmacies(str(canonical_username or username).strip(), token, user_id)
+        user_id = user_id or prefetched_user_id
     
     # Return token for mobile app
     return JSONResponse({
@@ -265,6 +622,12 @@ async def mobile_get_pharmacies(request: Request, username: str = Query(...)) ->
     if auth_header.startswith("Bearer "):
         token = auth_header[7:]
     
+    # Served from the login prefetch when the caller presents the same token
+    cached = user_pharmacies_cache.get(str(username).strip().lower())
+    caller_token = token or request.session.get("auth_token")
+    if cached and caller_token and cached["token"] == token_key(caller_token):
+        return JSONResponse({"pharmacies": cached["pharmacies"]})
+
     # Use canonical username exactly as stored; URL-encode for safety
     path_username = quote(str(username).strip(), safe="")
     url = f"{API_BASE_URL}/users/{path_username}/pharmacies"
@@ -284,11 +647,9 @@ async def mobile_get_pharmacies(request: Request, username: str = Query(...)) ->
                 resp = await client.get(url, headers=headers)
                 if resp.status_code == 200:
                     payload = resp.json() or {}
-                    pharmacies = payload.get("pharmacies", [])
-                    # Sort pharmacies so "TLC GROUP" always appears last
-                    pharmacies.sort(key=lambda p: (
-                        p.get("pharmacy_name") or p.get("name") or ""
-                    ).upper() == "TLC GROUP")
+                    pharmacies = _sort_pharmacies(payload.get("pharmacies", []))
+                    if token and headers.get("Authorization") == f"Bearer {token}":
+                        user_pharmacies_cache.set(str(username).strip().lower(), {"token": token_key(token), "pharmacies": pharmacies})
                     break
             except httpx.TimeoutException:
                 error_message = "Request to pharmacy API timed out"
@@ -309,7 +670,38 @@ async def mobile_get_pharmacies(request: Request, username: str = Query(...)) ->
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
     # Serve the new webApp2 dashboard (handles auth client-side)
-    return FileResponse("webApp2/index.html", media_type="text/html")
+    return _webapp_page(request, "index.html")
+
+
+def _window_closed(last_day: date) -> bool:
+    """Whether a date window's figures are final: it ended before the last
+    STOCK_FINALITY_LAG_DAYS (SA time), so yesterday, which may still be syncing, is not"""
+    return last_day < datetime.now(SA_TIMEZONE).date() - timedelta(days=STOCK_FINALITY_LAG_DAYS)
+
+
+def _fingerprint(key: tuple, body: bytes, closed: bool) -> dict:
+    """Cache an upstream body under ``key`` with a strong ETag.
+
+    Last-Modified is when this exact body was first seen, so refetching
+    unchanged data keeps the clients' validators valid.
+    """
+    etag = body_etag(body)
+    previous = proxy_fingerprints.get(key)
+    if previous and previous["etag"] == etag:
+        last_modified = previous["last_modified"]
+    else:
+        last_modified = datetime.now(pytz.utc)
+    entry = {"body": body, "etag": etag, "last_modified": last_modified, "closed": closed}
+    proxy_fingerprints.set(key, entry, ttl=PROXY_CLOSED_WINDOW_TTL if closed else proxy_fingerprints.ttl)
+    return entry
+
+
+def _fingerprint_response(request: Request, entry: dict) -> Response:
+    """Cached body as-is (no JSON re-encoding), or 304 if the client's ETag matches"""
+    return conditional_body(
+        request, entry["body"], entry["etag"],
+        last_modified=entry["last_modified"] if entry["closed"] else None,
+    )
 
 
 @app.get("/api/days")
@@ -323,6 +715,11 @@ async def api_days(request: Request, pid: int, month: str) -> JSONResponse:
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid month format; expected YYYY-MM")
 
+    key = ("days", pid, from_date, to_date)
+    cached = proxy_fingerprints.get(key)
+    if cached:
+        return _fingerprint_response(request, cached)
+
     headers = _auth_headers(request)
     async with httpx.AsyncClient(timeout=20) as client:
         url = f"{API_BASE_URL}/pharmacies/{pid}/days?from={from_date}&to={to_date}"
@@ -334,7 +731,8 @@ async def api_days(request: Request, pid: int, month: str) -> JSONResponse:
     if resp.status_code != 200:
         raise HTTPException(status_code=resp.status_code, detail="Failed to fetch daily turnovers")
 
-    return JSONResponse(resp.json())
+    entry = _fingerprint(key, resp.content, _window_closed(date(year, mon, last_day)))
+    return _fingerprint_response(request, entry)
 
 
 # Targets storage removed - now using backend API
@@ -385,6 +783,7 @@ async def api_worst_gp(request: Request, pid: int, date: str = None, from_date:
     Default limit set to 100 to support threshold-based filtering while maintaining API performance.
     """
     headers = _auth_headers(request)
+    canonical = False
     async with httpx.AsyncClient(timeout=30) as client:
         # Use range endpoint if from_date and to_date are provided, otherwise use single date
         if from_date and to_date:
@@ -396,6 +795,8 @@ async def api_worst_gp(request: Request, pid: int, date: str = None, from_date:
             # Try primary endpoint first
             url = f"{API_BASE_URL}/pharmacies/{pid}/stock-activity/worst-gp?date={date}&limit={limit}"
             resp = await client.get(url, headers=headers)
+            # Only the canonical query may be stored as the day's snapshot (see fetch_alert_snapshot)
+            canonical = limit == ALERT_SNAPSHOT_LIMITS["low_gp"]
             
             # If primary endpoint fails, try alternative endpoint
             if resp.status_code != 200:
@@ -403,6 +804,7 @@ async def api_worst_gp(request: Request, pid: int, date: str = None, from_date:
                 if exclude_pdst:
                     url += "&exclude_pdst=true"
                 resp = await client.get(url, headers=headers)
+                canonical = canonical and threshold == LOW_GP_SNAPSHOT_THRESHOLD and not exclude_pdst
         else:
             raise HTTPException(status_code=400, detail="Either 'date' or both 'from_date' and 'to_date' must be provided")
             
@@ -450,6 +852,10 @@ async def api_worst_gp(request: Request, pid: int, date: str = None, from_date:
     # 2. Single date endpoint returns: [...] (array)
     # 3. Some endpoints return: {"worst_gp_products": [...]} or {"low_gp_products": [...]}
     
+    if canonical:
+        items = data if isinstance(data, list) else data.get("worst_gp_products") or data.get("low_gp_products") or data.get("items") or []
+        await _save_alert_snapshot("low_gp", pid, date, items[:limit])
+
     if isinstance(data, dict) and "items" in data:
         # Range endpoint format - transform to our standard format
         return JSONResponse({
@@ -478,6 +884,11 @@ async def api_mtd(request: Request, pid: int, month: str, through: str) -> JSONR
         month: Month in YYYY-MM format
         through: Date to aggregate through in YYYY-MM-DD format
     """
+    key = ("mtd", pid, month, through)
+    cached = proxy_fingerprints.get(key)
+    if cached:
+        return _fingerprint_response(request, cached)
+
     headers = _auth_headers(request)
     async with httpx.AsyncClient(timeout=20) as client:
         url = f"{API_BASE_URL}/pharmacies/{pid}/mtd?month={month}&through={through}"
@@ -489,7 +900,12 @@ async def api_mtd(request: Request, pid: int, month: str, through: str) -> JSONR
     if resp.status_code != 200:
         raise HTTPException(status_code=resp.status_code, detail="Failed to fetch MTD data")
     
-    return JSONResponse(resp.json())
+    try:
+        closed = _window_closed(date.fromisoformat(through))
+    except ValueError:
+        closed = False
+    entry = _fingerprint(key, resp.content, closed)
+    return _fingerprint_response(request, entry)
 
 
 @app.get("/api/pharmacies/{pharmacy_id}/days/{date}/gp-breakdown")
@@ -668,7 +1084,15 @@ async def api_get_targets(request: Request, pid: int, month: str) -> JSONRespons
         print(f"[DEBUG] Error detail: {error_detail}")
         raise HTTPException(status_code=resp.status_code, detail=error_detail)
     
-    return JSONResponse(resp.json())
+    # Always asked upstream (it still checks the caller's token); the fingerprint
+    # only saves re-encoding and, on a matching ETag, the response body
+    try:
+        year, mon = [int(x) for x in month.split("-")]
+        closed = _window_closed(date(year, mon, monthrange(year, mon)[1]))
+    except ValueError:
+        closed = False
+    entry = _fingerprint(("targets", pid, month), resp.content, closed)
+    return _fingerprint_response(request, entry)
 
 @app.post("/api/targets")
 async def api_save_targets(request: Request, pid: int, month: str) -> JSONResponse:
@@ -719,6 +1143,7 @@ async def api_save_targets(request: Request, pid: int, month: str) -> JSONRespon
             
             raise HTTPException(status_code=resp.status_code, detail=error_detail)
         
+        proxy_fingerprints.pop(("targets", pid, month))
         return JSONResponse(resp.json())
     except HTTPException:
         raise
@@ -750,9 +1175,75 @@ async def api_products_search(request: Request, query: str = "", page: int = 1,
             return JSONResponse({"error": str(e)}, status_code=500)
 
 
+def _sales_points_by_date(data):
+    """Split an upstream product sales payload into daily points keyed by date.
+
+    Returns (points, daily_key), where daily_key names the list in a dict
+    payload (None for a bare list), or None if the payload has no per-day
+    dates, in which case it cannot be cached per day and is passed through.
+    """
+    daily_key = None
+    if isinstance(data, list):
+        daily = data
+    elif isinstance(data, dict):
+        daily_key = "daily" if isinstance(data.get("daily"), list) else "items"
+        daily = data.get(daily_key)
+    else:
+        daily = None
+    if not isinstance(daily, list):
+        return None
+
+    points = {}
+    for point in daily:
+        raw_date = (point.get("date") or point.get("business_date")) if isinstance(point, dict) else None
+        try:
+            day = date.fromisoformat(str(raw_date)[:10])
+        except (TypeError, ValueError):
+            return None
+        points[day] = point
+    return points, daily_key
+
+
+def _summarize_sales_daily(daily: list) -> dict:
+    """Build the sales summary block from daily points"""
+    total_qty = sum(float(d.get("qty_sold", d.get("quantity", 0)) or 0) for d in daily)
+    total_sales = sum(float(d.get("sales_val", d.get("sales_value", 0)) or 0) for d in daily)
+    total_cost = sum(float(d.get("cost_of_sales", d.get("cost", 0)) or 0) for d in daily)
+    total_gp = sum(float(d.get("gp_value", d.get("gp", 0)) or 0) for d in daily)
+    return {
+        "total_qty_sold": total_qty,
+        "total_sales_value": total_sales,
+        "total_cost_of_sales": total_cost,
+        "total_gp_value": total_gp,
+        "avg_gp_percentage": round(total_gp / total_sales * 100, 2) if total_sales > 0 else 0,
+    }
+
+
+def _sales_meta(data, daily_key: str) -> dict:
+    """Fields of a dict payload that describe the product rather than the range.
+
+    Totals and the summary depend on the range fetched, so only text fields
+    (code, name, ...) are kept; reassembled windows get a summary computed
+    from their own daily rows.
+    """
+    return {
+        k: v for k, v in data.items()
+        if k not in (daily_key, "summary") and (v is None or isinstance(v, str))
+    }
+
+
 @app.get("/api/products/{product_code}/sales")
 async def api_product_sales(request: Request, product_code: str, from_date: str = None, to_date: str = None, pharmacy_id: int = None) -> JSONResponse:
-    """Get product sales details for a date range"""
+    """Get product sales details for a date range
+
+    Closed days (before today in SA time) are served from the per-product
+    interval cache; only the uncached sub-ranges and today are fetched upstream.
+    A single fetch covering the whole range is returned exactly as upstream
+    sent it. A window put together from cached days keeps the upstream shape
+    (bare list, or dict with ``daily``/``items``), and a dict gets its
+    ``summary`` recomputed from the assembled daily rows, so the response
+    looks the same whether or not it came from the cache.
+    """
     headers = _auth_headers(request)
     
     if not pharmacy_id:
@@ -760,24 +1251,115 @@ async def api_product_sales(request: Request, product_code: str, from_date: str
     
     if not from_date or not to_date:
         return JSONResponse({"error": "from_date and to_date are required"}, status_code=400)
-    
+
+    try:
+        start = date.fromisoformat(from_date)
+        end = date.fromisoformat(to_date)
+    except ValueError:
+        return JSONResponse({"error": "from_date and to_date must be YYYY-MM-DD"}, status_code=400)
+
+    def sales_url(range_from: date, range_to: date) -> str:
+        return f"{API_BASE_URL}/products/{quote(product_code)}/sales?from_date={range_from.isoformat()}&to_date={range_to.isoformat()}&pharmacy_id={pharmacy_id}"
+
+    last_closed_day = datetime.now(SA_TIMEZONE).date() - timedelta(days=1)
+    closed_end = min(end, last_closed_day)
+
     async with httpx.AsyncClient(timeout=20) as client:
         try:
-            url = f"{API_BASE_URL}/products/{quote(product_code)}/sales?from_date={from_date}&to_date={to_date}&pharmacy_id={pharmacy_id}"
-            resp = await client.get(url, headers=headers)
-            
-            if resp.status_code == 401 and API_KEY:
-                resp = await client.get(url, headers={"X-API-Key": API_KEY})
-            
-            if resp.status_code == 200:
-                data = resp.json()
-                return JSONResponse(data)
+            if product_sales_cache.is_passthrough(pharmacy_id, product_code):
+                gaps, fetches = [], [(start, end, True)]
             else:
-                return JSONResponse({"error": f"Failed to fetch product sales: {resp.status_code}"}, status_code=resp.status_code)
+                gaps = product_sales_cache.missing_ranges(pharmacy_id, product_code, start, closed_end) if start <= closed_end else []
+                if gaps:
+                    print(f"[DEBUG] Product sales cache miss for {product_code} @ {pharmacy_id}: {len(gaps)} gap(s)")
+                # Fetch every uncached closed sub-range plus the still-open days in parallel
+                fetches = [(gap_from, gap_to, False) for gap_from, gap_to in gaps]
+                if end > last_closed_day:
+                    fetches.append((max(start, last_closed_day + timedelta(days=1)), end, True))
+            responses = await asyncio.gather(*[
+                _get_upstream(client, sales_url(range_from, range_to), headers) for range_from, range_to, _ in fetches
+            ])
+
+            live_points, live_meta, live_key = {}, {}, None
+            for (range_from, range_to, is_live), resp in zip(fetches, responses):
+                if resp.status_code != 200:
+                    return JSONResponse({"error": f"Failed to fetch product sales: {resp.status_code}"}, status_code=resp.status_code)
+                data = resp.json()
+                if (range_from, range_to) == (start, end):
+                    # One upstream call answered the whole request: send it untouched
+                    split = _sales_points_by_date(data)
+                    if split is None:
+                        product_sales_cache.mark_passthrough(pharmacy_id, product_code)
+                    elif not is_live:
+                        points, daily_key = split
+                        meta = _sales_meta(data, daily_key) if daily_key else {}
+                        product_sales_cache.store(pharmacy_id, product_code, start, end, points, meta, daily_key)
+                    return JSONResponse(data)
+
+                split = _sales_points_by_date(data)
+                if split is None:
+                    # No per-day rows: remember that and fetch the whole range once
+                    product_sales_cache.mark_passthrough(pharmacy_id, product_code)
+                    resp = await _get_upstream(client, sales_url(start, end), headers)
+                    if resp.status_code != 200:
+                        return JSONResponse({"error": f"Failed to fetch product sales: {resp.status_code}"}, status_code=resp.status_code)
+                    return JSONResponse(resp.json())
+
+                points, daily_key = split
+                meta = _sales_meta(data, daily_key) if daily_key else {}
+                if is_live:
+                    live_points, live_meta, live_key = points, meta, daily_key
+                else:
+                    product_sales_cache.store(pharmacy_id, product_code, range_from, range_to, points, meta, daily_key)
         except Exception as e:
             print(f"[ERROR] Failed to fetch product sales: {e}")
             return JSONResponse({"error": str(e)}, status_code=500)
 
+    if start <= closed_end:
+        daily, meta, daily_key = product_sales_cache.assemble(pharmacy_id, product_code, start, closed_end)
+    else:
+        daily, meta, daily_key = [], live_meta, live_key
+    daily += [live_points[day] for day in sorted(live_points) if start <= day <= end]
+
+    if daily_key is None:
+        return JSONResponse(daily)
+    payload = {**meta, daily_key: daily, "summary": _summarize_sales_daily(daily)}
+    for k, v in (("from_date", from_date), ("to_date", to_date)):
+        if k in payload:
+            payload[k] = v
+    return JSONResponse(payload)
+
+
+def _stock_cache_ttl(stock_date: str):
+    """Final dates get the long closed TTL; yesterday, today and later use the default TTL"""
+    last_final_day = datetime.now(SA_TIMEZONE).date() - timedelta(days=STOCK_FINALITY_LAG_DAYS)
+    try:
+        is_final = date.fromisoformat(stock_date) < last_final_day
+    except ValueError:
+        is_final = False
+    return PRODUCT_STOCK_CLOSED_TTL if is_final else product_stock_cache.ttl
+
+
+def _query_stock_on_hand(pharmacy_id: int, stock_date: str, codes: list) -> dict:
+    """Latest on-hand on or before stock_date per product code, read directly from the DB"""
+    sql = text(
+        """
+        SELECT DISTINCT ON (pr.product_code) pr.product_code, f.on_hand
+        FROM pharma.fact_stock_activity f
+        JOIN pharma.products pr ON pr.product_id = f.product_id
+        WHERE f.pharmacy_id = :pharmacy_id
+          AND f.business_date <= :as_of
+          AND pr.product_code = ANY(:codes)
+        ORDER BY pr.product_code, f.business_date DESC
+        """
+    )
+    with engine.connect() as conn:
+        rows = conn.execute(sql, {"pharmacy_id": pharmacy_id, "as_of": stock_date, "codes": codes}).fetchall()
+    on_hand = {code: 0 for code in codes}
+    for row in rows:
+        on_hand[row.product_code] = float(row.on_hand or 0)
+    return on_hand
+
 
 @app.get("/api/products/{product_code}/stock")
 async def api_product_stock(
@@ -787,6 +1369,10 @@ async def api_product_stock(
     date: str = Query(..., description="Date in YYYY-MM-DD format")
 ) -> JSONResponse:
     """Get stock on hand for a specific product using the dedicated /products/{code}/stock endpoint"""
+    cached = product_stock_cache.get((pharmacy_id, date, product_code))
+    if cached is not None:
+        return JSONResponse({"on_hand": cached})
+
     headers = _auth_headers(request)
     
     async with httpx.AsyncClient(timeout=20) as client:
@@ -794,15 +1380,13 @@ async def api_product_stock(
             # Use the new dedicated endpoint that queries directly by product code
             url = f"{API_BASE_URL}/products/{quote(product_code)}/stock?date={date}&pharmacy_id={pharmacy_id}"
             print(f"[DEBUG] Calling product stock API: {url}")
-            resp = await client.get(url, headers=headers)
-            
-            if resp.status_code == 401 and API_KEY:
-                resp = await client.get(url, headers={"X-API-Key": API_KEY})
+            resp = await _get_upstream(client, url, headers)
             
             if resp.status_code == 200:
                 data = resp.json()
                 on_hand = data.get("on_hand", 0)
                 print(f"[DEBUG] Found SOH for {product_code}: {on_hand}")
+                product_stock_cache.set((pharmacy_id, date, product_code), on_hand, ttl=_stock_cache_ttl(date))
                 return JSONResponse({"on_hand": on_hand})
             else:
                 print(f"[ERROR] API returned {resp.status_code}: {resp.text}")
@@ -812,6 +1396,92 @@ async def api_product_stock(
             return JSONResponse({"error": str(e)}, status_code=500)
 
 
+async def fetch_stock_on_hand(headers: dict, pharmacy_id: int, stock_date: str, codes: list) -> tuple:
+    """Resolve on-hand for many product codes through the cache, the DB or the API
+
+    Returns (on_hand, errors): on_hand maps code -> quantity, errors maps
+    code -> message for codes that could not be resolved.
+    """
+    on_hand = {}
+    errors = {}
+    missing = []
+    for code in codes:
+        cached = product_stock_cache.get((pharmacy_id, stock_date, code))
+        if cached is not None:
+            on_hand[code] = cached
+        else:
+            missing.append(code)
+
+    if not missing:
+        return on_hand, errors
+
+    ttl = _stock_cache_ttl(stock_date)
+
+    if STOCK_DIRECT_DB:
+        try:
+            db_on_hand = await run_in_threadpool(_query_stock_on_hand, pharmacy_id, stock_date, missing)
+            for code, value in db_on_hand.items():
+                on_hand[code] = value
+                product_stock_cache.set((pharmacy_id, stock_date, code), value, ttl=ttl)
+            return on_hand, errors
+        except Exception as e:
+            print(f"[WARNING] Direct DB stock lookup failed, falling back to API: {e}")
+
+    semaphore = asyncio.Semaphore(STOCK_BATCH_CONCURRENCY)
+
+    async def fetch_stock(client: httpx.AsyncClient, code: str) -> None:
+        url = f"{API_BASE_URL}/products/{quote(code)}/stock?date={stock_date}&pharmacy_id={pharmacy_id}"
+        async with semaphore:
+            try:
+                resp = await _get_upstream(client, url, headers)
+                if resp.status_code != 200:
+                    errors[code] = f"Upstream returned {resp.status_code}"
+                    return
+                value = resp.json().get("on_hand", 0)
+            except Exception as e:
+                errors[code] = str(e)
+                return
+        on_hand[code] = value
+        product_stock_cache.set((pharmacy_id, stock_date, code), value, ttl=ttl)
+
+    async with httpx.AsyncClient(timeout=20) as client:
+        await asyncio.gather(*[fetch_stock(client, code) for code in missing])
+
+    return on_hand, errors
+
+
+@app.post("/api/products/stock:batch")
+async def api_products_stock_batch(request: Request) -> JSONResponse:
+    """Get stock on hand for many products in one call
+
+    Body: {"pharmacy_id": 1, "date": "YYYY-MM-DD", "codes": [...]}. Returns
+    {"on_hand": {code: qty}, "errors": {code: message}}.
+    """
+    try:
+        body = await request.json()
+        pharmacy_id = int(body["pharmacy_id"])
+        stock_date = date.fromisoformat(str(body["date"])).isoformat()
+        codes = body.get("codes")
+        if not isinstance(codes, list):
+            raise ValueError("codes must be a list")
+        codes = list(dict.fromkeys(str(c).strip() for c in codes if c and str(c).strip()))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request data: {str(e)}")
+
+    if len(codes) > STOCK_BATCH_MAX_CODES:
+        raise HTTPException(status_code=400, detail=f"At most {STOCK_BATCH_MAX_CODES} codes per batch")
+
+    on_hand, errors = await fetch_stock_on_hand(_auth_headers(request), pharmacy_id, stock_date, codes)
+    print(f"[DEBUG] Stock batch for pharmacy {pharmacy_id} on {stock_date}: {len(codes)} codes, {len(errors)} errors")
+
+    return JSONResponse({
+        "pharmacy_id": pharmacy_id,
+        "date": stock_date,
+        "on_hand": {code: on_hand[code] for code in codes if code in on_hand},
+        "errors": errors,
+    })
+
+
 @app.get("/api/pharmacies/{pharmacy_id}/usage/top-180d")
 async def api_usage_top_180d(request: Request, pharmacy_id: int, limit: int = 200) -> JSONResponse:
     """Get 180-day average daily usage for top products"""
@@ -862,6 +1532,8 @@ async def api_negative_stock(request: Request, pid: int, date: str, limit: int =
     
     # Return the response as-is (API already filters and sorts)
     data = resp.json()
+    if limit == ALERT_SNAPSHOT_LIMITS["negative"]:
+        await _save_alert_snapshot("negative", pid, date, data if isinstance(data, list) else data.get("items", []))
     if isinstance(data, list):
         return JSONResponse({
             "pharmacy_id": pid,
@@ -872,21 +1544,121 @@ async def api_negative_stock(request: Request, pid: int, date: str, limit: int =
     return JSONResponse(data)
 
 
+ALERT_KINDS = ("negative", "low_gp")
+# Snapshots always hold the same query per kind, so two days are comparable;
+# calls with other limits or filters are served but not recorded
+ALERT_SNAPSHOT_LIMITS = {"negative": 200, "low_gp": 100}
+LOW_GP_SNAPSHOT_THRESHOLD = 20
+
+
+async def _save_alert_snapshot(kind: str, pharmacy_id: int, snapshot_date: str, items: list) -> AlertSnapshot:
+    """Store a day's negative-SOH or low-GP list column-wise; never fails the request"""
+    if kind == "negative":
+        rows = (
+            (item.get("product_code") or item.get("stock_code") or item.get("code"),
+             item.get("description") or item.get("product_name") or "",
+             item.get("on_hand"))
+            for item in items if isinstance(item, dict)
+        )
+    else:
+        rows = (
+            (item.get("nappi_code") or item.get("product_code"),
+             item.get("product_name") or item.get("product_description") or item.get("description") or "",
+             item.get("gp_percent", item.get("gp_pct")))
+            for item in items if isinstance(item, dict)
+        )
+    snapshot = AlertSnapshot.from_rows(rows)
+    try:
+        date.fromisoformat(snapshot_date)
+        await alert_snapshots.save(kind, pharmacy_id, snapshot_date, snapshot)
+    except Exception as e:
+        print(f"[WARNING] Failed to store {kind} snapshot for pharmacy {pharmacy_id} on {snapshot_date}: {e}")
+    return snapshot
+
+
+async def fetch_alert_snapshot(headers: dict, kind: str, pharmacy_id: int, snapshot_date: str) -> AlertSnapshot:
+    """Load a stored snapshot, fetching and storing it from upstream only if missing"""
+    snapshot = alert_snapshots.load(kind, pharmacy_id, snapshot_date)
+    if snapshot is not None:
+        return snapshot
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        limit = ALERT_SNAPSHOT_LIMITS[kind]
+        if kind == "negative":
+            resp = await _get_upstream(client, f"{API_BASE_URL}/pharmacies/{pharmacy_id}/stock-activity/negative-soh?date={snapshot_date}&limit={limit}", headers)
+        else:
+            resp = await _get_upstream(client, f"{API_BASE_URL}/pharmacies/{pharmacy_id}/stock-activity/worst-gp?date={snapshot_date}&limit={limit}", headers)
+            if resp.status_code != 200:
+                resp = await _get_upstream(client, f"{API_BASE_URL}/pharmacies/{pharmacy_id}/stock-activity/low_gp_products?date={snapshot_date}&threshold={LOW_GP_SNAPSHOT_THRESHOLD}", headers)
+
+    if resp.status_code != 200:
+        raise HTTPException(status_code=resp.status_code, detail=f"Failed to fetch {kind} list for {snapshot_date}")
+
+    data = resp.json()
+    if isinstance(data, dict):
+        data = data.get("items") or data.get("worst_gp_products") or data.get("low_gp_products") or []
+    return await _save_alert_snapshot(kind, pharmacy_id, snapshot_date, data[:limit] if kind == "low_gp" else data)
+
+
+@app.get("/api/pharmacies/{pharmacy_id}/stock-alerts/diff")
+async def api_stock_alerts_diff(request: Request, pharmacy_id: int, kind: str, since: str, date: str = None) -> JSONResponse:
+    """Day-over-day changes in the negative-SOH or low-GP product list
+
+    Compares the stored snapshot for `date` (defaults to yesterday) against the
+    one for `since`. Snapshots are recorded whenever /api/negative-stock or
+    single-date /api/worst-gp is served with the default limit and filters;
+    a missing day is fetched once and kept.
+
+    Args:
+        kind: negative (value is on_hand) or low_gp (value is gp_percent)
+        since: Earlier date in YYYY-MM-DD format
+        date: Later date in YYYY-MM-DD format
+    """
+    if kind not in ALERT_KINDS:
+        raise HTTPException(status_code=400, detail="kind must be 'negative' or 'low_gp'")
+    if not date:
+        date = (datetime.now(SA_TIMEZONE) - timedelta(days=1)).strftime("%Y-%m-%d")
+    try:
+        if datetime.strptime(since, "%Y-%m-%d") >= datetime.strptime(date, "%Y-%m-%d"):
+            raise HTTPException(status_code=400, detail="since must be before date")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+
+    headers = _auth_headers(request)
+    old, new = await asyncio.gather(
+        fetch_alert_snapshot(headers, kind, pharmacy_id, since),
+        fetch_alert_snapshot(headers, kind, pharmacy_id, date),
+    )
+    changes = diff_snapshots(old, new)
+
+    return JSONResponse({
+        "pharmacy_id": pharmacy_id,
+        "kind": kind,
+        "since": since,
+        "date": date,
+        "previous_count": len(old),
+        "current_count": len(new),
+        **changes,
+    })
+
+
 @app.get("/api/pharmacies/{pharmacy_id}/usage/product/{product_code}")
 async def api_usage_product(request: Request, pharmacy_id: int, product_code: str) -> JSONResponse:
     """Get usage data for a specific product"""
+    cached = product_usage_cache.get((pharmacy_id, product_code))
+    if cached is not None:
+        return JSONResponse(cached)
+
     headers = _auth_headers(request)
     
     async with httpx.AsyncClient(timeout=20) as client:
         try:
             url = f"{API_BASE_URL}/pharmacies/{pharmacy_id}/usage/product/{quote(product_code)}"
-            resp = await client.get(url, headers=headers)
-            
-            if resp.status_code == 401 and API_KEY:
-                resp = await client.get(url, headers={"X-API-Key": API_KEY})
+            resp = await _get_upstream(client, url, headers)
             
             if resp.status_code == 200:
                 data = resp.json()
+                product_usage_cache.set((pharmacy_id, product_code), data)
                 return JSONResponse(data)
             else:
                 return JSONResponse({"error": f"Failed to fetch product usage: {resp.status_code}"}, status_code=resp.status_code)
@@ -895,6 +1667,281 @@ async def api_usage_product(request: Request, pharmacy_id: int, product_code: st
             return JSONResponse({"error": str(e)}, status_code=500)
 
 
+@app.post("/api/pharmacies/{pharmacy_id}/usage/products:batch")
+async def api_usage_products_batch(request: Request, pharmacy_id: int) -> JSONResponse:
+    """Get usage data for many products in one call
+
+    Body: {"codes": ["LP9037679", ...]}. Uncached codes are fetched upstream
+    concurrently (bounded by USAGE_BATCH_CONCURRENCY). Returns a map keyed by
+    product code; codes that failed upstream are listed under "errors".
+    """
+    try:
+        body = await request.json()
+        codes = body.get("codes") if isinstance(body, dict) else body
+        if not isinstance(codes, list):
+            raise ValueError("codes must be a list")
+        codes = list(dict.fromkeys(str(c).strip() for c in codes if c and str(c).strip()))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request data: {str(e)}")
+
+    if len(codes) > USAGE_BATCH_MAX_CODES:
+        raise HTTPException(status_code=400, detail=f"At most {USAGE_BATCH_MAX_CODES} codes per batch")
+
+    usage = {}
+    errors = {}
+    missing = []
+    for code in codes:
+        cached = product_usage_cache.get((pharmacy_id, code))
+        if cached is not None:
+            usage[code] = cached
+        else:
+            missing.append(code)
+
+    if missing:
+        headers = _auth_headers(request)
+        semaphore = asyncio.Semaphore(USAGE_BATCH_CONCURRENCY)
+
+        async def fetch_usage(client: httpx.AsyncClient, code: str) -> None:
+            url = f"{API_BASE_URL}/pharmacies/{pharmacy_id}/usage/product/{quote(code)}"
+            async with semaphore:
+                try:
+                    resp = await _get_upstream(client, url, headers)
+                    if resp.status_code != 200:
+                        errors[code] = f"Upstream returned {resp.status_code}"
+                        return
+                    data = resp.json()
+                except Exception as e:
+                    errors[code] = str(e)
+                    return
+            usage[code] = data
+            product_usage_cache.set((pharmacy_id, code), data)
+
+        async with httpx.AsyncClient(timeout=20) as client:
+            await asyncio.gather(*[fetch_usage(client, code) for code in missing])
+
+    print(f"[DEBUG] Usage batch for pharmacy {pharmacy_id}: {len(codes)} codes, {len(missing)} fetched upstream, {len(errors)} errors")
+
+    return JSONResponse({
+        "pharmacy_id": pharmacy_id,
+        "usage": {code: usage[code] for code in codes if code in usage},
+        "errors": errors,
+    })
+
+
+# =====================================================
+# REORDER / DAYS OF COVER
+# =====================================================
+
+def _query_catalog_on_hand(pharmacy_id: int, stock_date: str) -> dict:
+    """Latest non-zero on-hand on or before stock_date for every stocked product, from the DB"""
+    sql = text(
+        """
+        SELECT product_code, on_hand FROM (
+            SELECT DISTINCT ON (pr.product_code) pr.product_code, f.on_hand
+            FROM pharma.fact_stock_activity f
+            JOIN pharma.products pr ON pr.product_id = f.product_id
+            WHERE f.pharmacy_id = :pharmacy_id
+              AND f.business_date <= :as_of
+            ORDER BY pr.product_code, f.business_date DESC
+        ) latest
+        WHERE on_hand <> 0
+        """
+    )
+    with engine.connect() as conn:
+        rows = conn.execute(sql, {"pharmacy_id": pharmacy_id, "as_of": stock_date}).fetchall()
+    return {row.product_code: float(row.on_hand) for row in rows}
+
+
+async def build_reorder_base_for(headers: dict, pharmacy_id: int, stock_date: str, fill_missing: bool = False):
+    """Fetch 180-day usage and on-hand for a pharmacy and join them into one frame
+
+    On-hand comes from the whole stock file when STOCK_DIRECT_DB is set, so
+    stock that does not sell (dead stock) is included. Otherwise it comes
+    from the day's stock-activity list, which only has products that moved;
+    selling products missing from it are looked up one by one when
+    ``fill_missing`` is set (the nightly precompute), and left out of the
+    frame otherwise so a request never waits on thousands of lookups.
+
+    Returns (base, on_hand_unknown): the frame and how many selling products
+    were left out for lack of an on-hand figure.
+    """
+    async with httpx.AsyncClient(timeout=60) as client:
+        usage_url = f"{API_BASE_URL}/pharmacies/{pharmacy_id}/usage/top-180d?limit={REORDER_USAGE_LIMIT}"
+        stock_url = f"{API_BASE_URL}/pharmacies/{pharmacy_id}/stock-activity?date={stock_date}&limit=5000"
+        usage_resp, stock_resp = await asyncio.gather(
+            _get_upstream(client, usage_url, headers),
+            _get_upstream(client, stock_url, headers),
+        )
+
+    if usage_resp.status_code != 200:
+        raise HTTPException(status_code=usage_resp.status_code, detail="Failed to fetch usage data")
+    usage_data = usage_resp.json()
+    usage_items = usage_data.get("items", []) if isinstance(usage_data, dict) else usage_data
+
+    on_hand = {}
+    descriptions = {}
+    if stock_resp.status_code == 200:
+        stock_data = stock_resp.json()
+        stock_items = stock_data.get("items", []) if isinstance(stock_data, dict) else stock_data
+        for item in stock_items:
+            code = item.get("product_code") or item.get("stock_code") or item.get("code")
+            if code:
+                on_hand[code] = float(item.get("on_hand") or 0)
+                descriptions[code] = item.get("description") or ""
+    else:
+        print(f"[WARNING] Stock activity returned {stock_resp.status_code} for pharmacy {pharmacy_id}")
+
+    complete = False
+    if STOCK_DIRECT_DB:
+        try:
+            on_hand = await run_in_threadpool(_query_catalog_on_hand, pharmacy_id, stock_date)
+            complete = True
+        except Exception as e:
+            print(f"[WARNING] Catalog on-hand query failed, using stock activity: {e}")
+
+    # Products that sell but had no activity row on the date
+    missing = [] if complete else [
+        u.get("product_code") for u in usage_items if u.get("product_code") and u.get("product_code") not in on_hand
+    ]
+    if missing and fill_missing:
+        extra, errors = await fetch_stock_on_hand(headers, pharmacy_id, stock_date, missing)
+        on_hand.update(extra)
+        missing = list(errors)
+    if missing:
+        print(f"[WARNING] Reorder: on-hand unavailable for {len(missing)} products at pharmacy {pharmacy_id}")
+
+    base = build_reorder_base(usage_items, on_hand, descriptions, drop_missing_on_hand=not complete)
+    try:
+        is_closed = date.fromisoformat(stock_date) < datetime.now(SA_TIMEZONE).date()
+    except ValueError:
+        is_closed = False
+    reorder_base_cache.set(
+        (pharmacy_id, stock_date),
+        (base, datetime.now(SA_TIMEZONE).isoformat(), len(missing)),
+        ttl=None if is_closed else REORDER_OPEN_TTL,
+    )
+    print(f"[DEBUG] Reorder base for pharmacy {pharmacy_id} on {stock_date}: {len(base)} products")
+    return base, len(missing)
+
+
+async def _precompute_reorder_nightly() -> None:
+    """Build yesterday's reorder frames for every pharmacy once a night"""
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+    while True:
+        now_sa = datetime.now(SA_TIMEZONE)
+        next_run = now_sa.replace(hour=REORDER_PRECOMPUTE_HOUR, minute=0, second=0, microsecond=0)
+        if next_run <= now_sa:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now_sa).total_seconds())
+
+        stock_date = (datetime.now(SA_TIMEZONE) - timedelta(days=1)).strftime("%Y-%m-%d")
+        try:
+            async with httpx.AsyncClient(timeout=30) as client:
+                resp = await _get_upstream(client, f"{API_BASE_URL}/admin/pharmacies", headers)
+            pharmacies = resp.json() if resp.status_code == 200 else []
+            pharmacy_ids = [p.get("pharmacy_id") or p.get("id") for p in pharmacies if isinstance(p, dict)]
+        except Exception as e:
+            print(f"[ERROR] Reorder precompute could not list pharmacies: {e}")
+            continue
+
+        for pid in pharmacy_ids:
+            if pid is None or pid == 100:
+                continue
+            try:
+                await build_reorder_base_for(headers, pid, stock_date, fill_missing=True)
+            except Exception as e:
+                print(f"[ERROR] Reorder precompute failed for pharmacy {pid}: {e}")
+
+
+_reorder_precompute_lock = None
+
+
+def _acquire_reorder_precompute_lock() -> bool:
+    """Take the precompute file lock without blocking; only one worker gets it"""
+    global _reorder_precompute_lock
+    try:
+        os.makedirs(os.path.dirname(REORDER_PRECOMPUTE_LOCK) or ".", exist_ok=True)
+        handle = open(REORDER_PRECOMPUTE_LOCK, "a")
+    except OSError as e:
+        print(f"[WARNING] Could not open reorder precompute lock {REORDER_PRECOMPUTE_LOCK}: {e}")
+        return False
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    # Kept open for the life of the process; the lock is released when it exits
+    _reorder_precompute_lock = handle
+    return True
+
+
+@app.on_event("startup")
+async def start_reorder_precompute() -> None:
+    if not API_KEY:
+        return
+    if not _acquire_reorder_precompute_lock():
+        print("[DEBUG] Reorder precompute is running in another worker")
+        return
+    asyncio.create_task(_precompute_reorder_nightly())
+
+
+@app.get("/api/pharmacies/{pharmacy_id}/stock/reorder")
+async def api_stock_reorder(
+    request: Request,
+    pharmacy_id: int,
+    date: str = None,
+    sort: str = "days_of_cover",
+    order: str = "asc",
+    only: str = "all",
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=1000),
+    lead_time_days: float = Query(7, ge=0),
+    safety_days: float = Query(7, ge=0),
+    target_days: float = Query(30, ge=0),
+    dead_stock_days: float = Query(180, ge=1),
+) -> JSONResponse:
+    """Days-of-cover, reorder points and dead-stock flags across the whole catalog
+
+    Joins 180-day average daily usage with on-hand for every product and
+    computes the metrics column-wise. The joined frame is precomputed nightly
+    for yesterday and cached per (pharmacy, date). ``on_hand_unknown`` counts
+    selling products left out because no on-hand figure was available.
+
+    Args:
+        date: Stock date in YYYY-MM-DD format (defaults to yesterday)
+        sort: One of days_of_cover, on_hand, avg_daily_usage, reorder_qty, product_code, description
+        order: asc or desc
+        only: all, reorder (needs reordering) or dead (dead stock)
+    """
+    if sort not in REORDER_SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(REORDER_SORT_COLUMNS)}")
+    if order not in ("asc", "desc") or only not in ("all", "reorder", "dead"):
+        raise HTTPException(status_code=400, detail="order must be asc/desc and only must be all/reorder/dead")
+
+    if not date:
+        date = (datetime.now(SA_TIMEZONE) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    cached = reorder_base_cache.get((pharmacy_id, date))
+    if cached is None:
+        base, on_hand_unknown = await build_reorder_base_for(_auth_headers(request), pharmacy_id, date)
+        computed_at = datetime.now(SA_TIMEZONE).isoformat()
+    else:
+        base, computed_at, on_hand_unknown = cached
+
+    frame = compute_reorder_frame(base, lead_time_days, safety_days, target_days, dead_stock_days)
+    result = page_reorder_frame(frame, sort=sort, descending=order == "desc", only=only, page=page, page_size=page_size)
+
+    return JSONResponse({
+        "pharmacy_id": pharmacy_id,
+        "date": date,
+        "computed_at": computed_at,
+        "reorder_count": int(frame["needs_reorder"].sum()),
+        "dead_stock_count": int(frame["dead_stock"].sum()),
+        "on_hand_unknown": on_hand_unknown,
+        **result,
+    })
+
+
 # =====================================================
 # AI DASHBOARD INSIGHTS
 # =====================================================
@@ -1086,6 +2133,14 @@ async def calculate_group_average_metrics(request: Request, from_date: str, to_d
     # Exclude pharmacy 100 (group aggregate) and optionally the current pharmacy
     pharmacy_ids = [pid for pid in pharmacy_ids if pid != 100 and pid != exclude_pharmacy_id]
     
+    # Only fan out to pharmacies the caller may read
+    user_id, username = _request_identity(request)
+    if user_id is not None and not is_admin_identity(user_id, username):
+        await ensure_permission_matrix()
+        readable = permission_matrix.readable(user_id)
+        if readable is not None:
+            pharmacy_ids = [pid for pid in pharmacy_ids if pid in readable]
+    
     if not pharmacy_ids:
         return None
     
@@ -2548,6 +3603,500 @@ def generate_smart_insights(metrics: dict, prev_year: dict, group_metrics: dict
     }
 
 
+# =====================================================
+# DEBTOR REPORTS
+# =====================================================
+
+@app.on_event("shutdown")
+def stop_debtor_parse_pool() -> None:
+    debtor_parse_pool.shutdown()
+
+
+async def save_debtor_report(pharmacy_id: int, report_date: str, debtors: list) -> int:
+    """Bulk upsert parsed debtors (COPY + ON CONFLICT) off the event loop; returns rows written
+
+    The table is created by the Alembic migration (alembic upgrade head, run
+    before each deploy), never at runtime; until it exists this raises
+    DebtorStoreNotReady and the rest of the app keeps working.
+    """
+    saved = await run_in_threadpool(upsert_debtors, engine, pharmacy_id, report_date, debtors)
+    print(f"[DEBUG] Saved {saved} debtors for pharmacy {pharmacy_id} ({report_date})")
+    return saved
+
+
+def _with_pharmacy_id(debtors: list, pharmacy_id: int) -> list:
+    # Cached parses are keyed on content only; the same PDF may be uploaded for another pharmacy
+    for debtor in debtors:
+        debtor["pharmacy_id"] = pharmacy_id
+    return debtors
+
+
+def _uploaded_pdf(file: UploadFile):
+    """The upload's spooled file, rewound; it is read in place rather than into memory"""
+    pdf = file.file
+    pdf.seek(0, os.SEEK_END)
+    if pdf.tell() == 0:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    pdf.seek(0)
+    return pdf
+
+
+async def _cached_debtor_steps(cached: dict, pharmacy_id: int):
+    """A cached parse as a single, final stream step"""
+    yield {
+        "page": None,
+        "total_pages": None,
+        "debtors": _with_pharmacy_id(cached["debtors"], pharmacy_id),
+        "total_accounts": cached["total_accounts"],
+        "total_outstanding": cached["total_outstanding"],
+        "done": True,
+        "cached": True,
+    }
+
+
+@app.post("/api/pharmacies/{pharmacy_id}/debtors/parse")
+async def api_parse_debtor_report(
+    request: Request, pharmacy_id: int, file: UploadFile = File(...), save: bool = False, report_date: str = None
+) -> JSONResponse:
+    """Parse an uploaded debtor PDF report in the debtor parse worker pool
+
+    Returns 503 when the parser backlog is full and 504 when a job exceeds
+    DEBTOR_PARSE_TIMEOUT, so the upload never ties up the event loop. Needs a
+    signed-in user, with write access to the pharmacy when saving.
+
+    Args:
+        save: Also add the report to the debtor history (returning the movements
+              since the previous report), bulk upsert it into the debtor table
+              and make it the index behind debtor search and statistics
+        report_date: Date the report is for (YYYY-MM-DD, default today SA time)
+    """
+    if save:
+        await _require_pharmacy_write(request, pharmacy_id)
+        report_date = report_date or datetime.now(SA_TIMEZONE).strftime("%Y-%m-%d")
+        try:
+            date.fromisoformat(report_date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="report_date must be YYYY-MM-DD")
+    else:
+        _require_session(request)
+    pdf = _uploaded_pdf(file)
+    cache_key = await run_in_threadpool(parse_cache_key, pdf, PARSER_VERSION)
+    result = await run_in_threadpool(debtor_parse_cache.get, cache_key)
+    cached = result is not None
+    if cached:
+        print(f"[DEBUG] Debtor report cache hit for pharmacy {pharmacy_id}: {result['total_accounts']} accounts")
+        _with_pharmacy_id(result["debtors"], pharmacy_id)
+    else:
+        try:
+            result = await debtor_parse_pool.parse(pdf, pharmacy_id)
+        except ParseQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+        except ParseTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            print(f"[ERROR] Debtor PDF parsing failed for pharmacy {pharmacy_id}: {e}")
+            raise HTTPException(status_code=422, detail=f"Could not parse debtor report: {str(e)}")
+
+        print(f"[DEBUG] Parsed debtor report for pharmacy {pharmacy_id}: {result['total_accounts']} accounts")
+        try:
+            await run_in_threadpool(debtor_parse_cache.set, cache_key, result)
+        except OSError as e:
+            print(f"[WARNING] Could not cache debtor report for pharmacy {pharmacy_id}: {e}")
+
+    response = {
+        "pharmacy_id": pharmacy_id,
+        "filename": file.filename,
+        "cached": cached,
+        "total_accounts": result["total_accounts"],
+        "total_outstanding": result["total_outstanding"],
+        "debtors": result["debtors"],
+    }
+
+    if save:
+        try:
+            response["saved"] = await save_debtor_report(pharmacy_id, report_date, result["debtors"])
+            response["report_date"] = report_date
+        except DebtorStoreNotReady as e:
+            print(f"[ERROR] Saving debtor report for pharmacy {pharmacy_id} failed: {e}")
+            raise HTTPException(status_code=503, detail="Debtor reports cannot be saved until the database migration has run")
+        except Exception as e:
+            print(f"[ERROR] Saving debtor report for pharmacy {pharmacy_id} failed: {e}")
+            raise HTTPException(status_code=502, detail=f"Could not save debtor report: {str(e)}")
+        # History is derived from the saved table, so it only moves once the save succeeded
+        try:
+            history = await run_in_threadpool(debtor_history.record, pharmacy_id, report_date, result["debtors"])
+            response["previous_report_date"] = history["previous_date"]
+            response["movements"] = history["movements"] and history["movements"]["summary"]
+        except Exception as e:
+            print(f"[WARNING] Could not compare debtor report for pharmacy {pharmacy_id} with the previous one: {e}")
+        # Only a saved report replaces the index behind search and statistics; a plain parse is a preview
+        debtor_indexes.set(pharmacy_id, await run_in_threadpool(DebtorIndex, result["debtors"], "upload"))
+
+    return JSONResponse(response)
+
+
+@app.post("/api/pharmacies/{pharmacy_id}/debtors/parse/stream")
+async def api_parse_debtor_report_stream(
+    request: Request,
+    pharmacy_id: int,
+    file: UploadFile = File(...),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+):
+    """Parse an uploaded debtor PDF and stream the records page range by page range
+
+    Each line (NDJSON) or event (SSE, with format=sse or Accept: text/event-stream)
+    carries the debtors completed in that step plus running totals:
+    {"page", "total_pages", "debtors", "total_accounts", "total_outstanding", "done"}.
+    The first step is parsed before the response starts, so a full backlog
+    still returns 503; later failures are sent as a final {"error": ...} step.
+    A report already in the parse cache (from /debtors/parse) is sent as one
+    final step; streamed parses are not added to it. Needs a signed-in user.
+    """
+    _require_session(request)
+    pdf = _uploaded_pdf(file)
+    use_sse = format == "sse" or "text/event-stream" in request.headers.get("accept", "")
+    cache_key = await run_in_threadpool(parse_cache_key, pdf, PARSER_VERSION)
+    cached = await run_in_threadpool(debtor_parse_cache.get, cache_key)
+    if cached is not None:
+        steps = _cached_debtor_steps(cached, pharmacy_id)
+    else:
+        steps = debtor_parse_pool.stream(pdf, pharmacy_id)
+
+    try:
+        first = await steps.__anext__()
+    except ParseQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except ParseTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        print(f"[ERROR] Debtor PDF parsing failed for pharmacy {pharmacy_id}: {e}")
+        raise HTTPException(status_code=422, detail=f"Could not parse debtor report: {str(e)}")
+
+    def encode(step: dict) -> str:
+        payload = json.dumps(step, default=str)
+        return f"data: {payload}\n\n" if use_sse else f"{payload}\n"
+
+    async def body():
+        # Steps are forwarded as they arrive and not kept, so memory stays flat;
+        # a streamed parse is therefore not written to the parse cache
+        step = first
+        try:
+            yield encode({"pharmacy_id": pharmacy_id, "filename": file.filename, **step})
+            async for step in steps:
+                yield encode({"pharmacy_id": pharmacy_id, "filename": file.filename, **step})
+        except Exception as e:
+            print(f"[ERROR] Debtor PDF stream failed for pharmacy {pharmacy_id} after page {step.get('page')}: {e}")
+            yield encode({"pharmacy_id": pharmacy_id, "error": f"Could not parse debtor report: {str(e)}", "done": True})
+            return
+        print(f"[DEBUG] Streamed debtor report for pharmacy {pharmacy_id}: {step['total_accounts']} accounts")
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def get_debtor_index(request: Request, pharmacy_id: int, refresh: bool = False) -> DebtorIndex:
+    """Debtor index for a pharmacy: from the last upload, or built from the upstream debtor list
+
+    The index is shared by everyone with access to the pharmacy, so the
+    caller's access is checked first (see _require_pharmacy_read).
+    """
+    await _require_pharmacy_read(request, pharmacy_id)
+    index = None if refresh else debtor_indexes.get(pharmacy_id)
+    if index is not None:
+        return index
+
+    headers = _auth_headers(request)
+    debtors = []
+    async with httpx.AsyncClient(timeout=60) as client:
+        for page in range(1, DEBTOR_INDEX_MAX_PAGES + 1):
+            url = (
+                f"{API_BASE_URL}/pharmacies/{pharmacy_id}/debtors"
+                f"?per_page={DEBTOR_INDEX_PAGE_SIZE}&page={page}&exclude_medical_aid=false"
+            )
+            resp = await _get_upstream(client, url, headers)
+            if resp.status_code != 200:
+                raise HTTPException(status_code=resp.status_code, detail=f"Failed to load debtors: {resp.text[:200]}")
+            data = resp.json()
+            batch = data.get("debtors", []) if isinstance(data, dict) else data
+            debtors.extend(batch or [])
+            if len(batch or []) < DEBTOR_INDEX_PAGE_SIZE:
+                break
+
+    print(f"[DEBUG] Indexed {len(debtors)} debtors for pharmacy {pharmacy_id} from the API")
+    index = await run_in_threadpool(DebtorIndex, debtors, "api")
+    debtor_indexes.set(pharmacy_id, index)
+    return index
+
+
+@app.get("/api/pharmacies/{pharmacy_id}/debtors/statistics")
+async def api_debtor_statistics(
+    request: Request,
+    pharmacy_id: int,
+    thresholds: str = "100,500,1000,5000",
+    exclude_medical_aid: bool = False,
+    refresh: bool = False,
+) -> JSONResponse:
+    """Ageing totals plus account counts / outstanding at or above each balance threshold
+
+    Same totals as the upstream /debtors/statistics (total_accounts,
+    total_outstanding, current … d180), answered from the debtor index.
+    """
+    try:
+        threshold_values = [float(t) for t in thresholds.split(",") if t.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="thresholds must be comma-separated numbers")
+
+    index = await get_debtor_index(request, pharmacy_id, refresh=refresh)
+    return JSONResponse({
+        "pharmacy_id": pharmacy_id,
+        **index.statistics(threshold_values, exclude_medical_aid=exclude_medical_aid),
+    })
+
+
+@app.get("/api/pharmacies/{pharmacy_id}/debtors/search")
+async def api_debtor_search(
+    request: Request,
+    pharmacy_id: int,
+    q: str = "",
+    min_balance: float = 0,
+    buckets: str = None,
+    has_email: bool = False,
+    has_phone: bool = False,
+    exclude_medical_aid: bool = True,
+    sort: str = "balance",
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=1000),
+    refresh: bool = False,
+) -> JSONResponse:
+    """Server-side filtered, sorted and paginated debtor list
+
+    Args:
+        q: Prefix search on account number, name or any word of the name
+        min_balance: Only debtors with balance >= min_balance
+        buckets: Comma-separated ageing buckets; keeps debtors with an amount
+                 in at least one (omit for all buckets, empty for none)
+        sort: One of acc_no, name, current … d180, balance, email, phone
+    """
+    if sort not in DEBTOR_SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(DEBTOR_SORT_COLUMNS)}")
+    bucket_list = None
+    if buckets is not None:
+        bucket_list = [b.strip() for b in buckets.split(",") if b.strip()]
+        unknown = [b for b in bucket_list if b not in AGEING_BUCKETS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown ageing buckets: {', '.join(unknown)}")
+
+    index = await get_debtor_index(request, pharmacy_id, refresh=refresh)
+    result = index.search(
+        query=q,
+        min_balance=min_balance,
+        buckets=bucket_list,
+        has_email=has_email,
+        has_phone=has_phone,
+        exclude_medical_aid=exclude_medical_aid,
+        sort=sort,
+        descending=order == "desc",
+        page=page,
+        page_size=page_size,
+    )
+    return JSONResponse({"pharmacy_id": pharmacy_id, **result})
+
+
+def _history_date(value: str, name: str) -> str:
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be YYYY-MM-DD")
+
+
+@app.get("/api/pharmacies/{pharmacy_id}/debtors/history/movements")
+async def api_debtor_movements(
+    request: Request,
+    pharmacy_id: int,
+    report_date: str = None,
+    since: str = None,
+    limit: int = Query(DEBTOR_MOVEMENT_LIMIT, ge=0, le=10000),
+) -> JSONResponse:
+    """Accounts paid down, aged into a worse bucket, new and closed between two saved reports
+
+    Args:
+        report_date: Report to compare (default the latest saved report)
+        since: Report to compare against (default the one before report_date)
+        limit: Maximum accounts per movement list, largest amounts first
+    """
+    await _require_pharmacy_read(request, pharmacy_id)
+    dates = await run_in_threadpool(debtor_history.dates, pharmacy_id)
+    report_date = _history_date(report_date, "report_date") if report_date else (dates[-1] if dates else None)
+    if report_date not in dates:
+        raise HTTPException(status_code=404, detail="No saved debtor report for that date")
+    if since:
+        since = _history_date(since, "since")
+        if since not in dates:
+            raise HTTPException(status_code=404, detail="No saved debtor report for the since date")
+    else:
+        earlier = [d for d in dates if d < report_date]
+        if not earlier:
+            raise HTTPException(status_code=404, detail="No earlier debtor report to compare against")
+        since = earlier[-1]
+
+    old = await run_in_threadpool(debtor_history.load, pharmacy_id, since)
+    new = await run_in_threadpool(debtor_history.load, pharmacy_id, report_date)
+    movements = await run_in_threadpool(diff_debtor_snapshots, old, new, limit)
+    return JSONResponse({"pharmacy_id": pharmacy_id, "report_date": report_date, "since": since, **movements})
+
+
+@app.get("/api/pharmacies/{pharmacy_id}/debtors/history/trend")
+async def api_debtor_trend(request: Request, pharmacy_id: int, from_date: str = None, to_date: str = None) -> JSONResponse:
+    """Outstanding, ageing and movement totals per saved report, oldest first
+
+    Read from the stored per-report summary rows; only reports saved since
+    their row was built are summarised again from the debtor table.
+    """
+    await _require_pharmacy_read(request, pharmacy_id)
+    from_date = _history_date(from_date, "from_date") if from_date else None
+    to_date = _history_date(to_date, "to_date") if to_date else None
+    rows = await run_in_threadpool(debtor_history.trend, pharmacy_id)
+    rows = [
+        row for row in rows
+        if (from_date is None or row["report_date"] >= from_date) and (to_date is None or row["report_date"] <= to_date)
+    ]
+    return JSONResponse({"pharmacy_id": pharmacy_id, "reports": len(rows), "trend": rows})
+
+
+@app.get("/api/pharmacies/{pharmacy_id}/debtors/history/accounts/{acc_no}")
+async def api_debtor_account_history(request: Request, pharmacy_id: int, acc_no: str) -> JSONResponse:
+    """Ageing and balance of one account in every saved report"""
+    await _require_pharmacy_read(request, pharmacy_id)
+    history = await run_in_threadpool(debtor_history.account_history, pharmacy_id, acc_no.strip())
+    return JSONResponse({"pharmacy_id": pharmacy_id, "acc_no": acc_no.strip(), "history": history})
+
+
+@app.get("/api/debtors/parser/stats")
+async def api_debtor_parser_stats(request: Request) -> JSONResponse:
+    """Worker pool and parse cache counters for the debtor PDF parser (admin only)"""
+    if not await _check_admin_access(request):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return JSONResponse({
+        **debtor_parse_pool.stats,
+        "parser_version": PARSER_VERSION,
+        "cache": debtor_parse_cache.stats,
+    })
+
+
+# =====================================================
+# DEBTOR REMINDERS
+# =====================================================
+
+@app.on_event("startup")
+async def start_reminder_workers() -> None:
+    # A database that is down at boot must not stop the app; the workers keep retrying
+    try:
+        await run_in_threadpool(reminder_queue.create_tables)
+        recovered = await run_in_threadpool(reminder_queue.recover)
+        if recovered:
+            print(f"[DEBUG] Re-queued {recovered} reminder messages whose lease expired")
+    except Exception as e:
+        print(f"[ERROR] Reminder queue not ready: {e}")
+    for channel in REMINDER_CHANNELS:
+        try:
+            worker = ReminderWorker.from_env(reminder_queue, channel)
+        except ValueError as e:
+            print(f"[ERROR] Reminder {channel} worker not started: {e}")
+            continue
+        reminder_workers[channel] = (worker, asyncio.create_task(worker.run()))
+
+
+@app.on_event("shutdown")
+async def stop_reminder_workers() -> None:
+    for _, task in reminder_workers.values():
+        task.cancel()
+
+
+@app.post("/api/pharmacies/{pharmacy_id}/debtors/reminders")
+async def api_queue_debtor_reminders(request: Request, pharmacy_id: int) -> JSONResponse:
+    """Queue email or SMS reminders for a set of debtor accounts
+
+    Body: {"channel": "email"|"sms", "accounts": [...], "template_variables": {...},
+    "arrears_buckets": [...] (optional, default d60-d180)}; accounts are debtor
+    records (acc_no, name, email, phone, balance and ageing buckets) and
+    template_variables must include REQUIRED_TEMPLATE_VARIABLES for the channel.
+    Messages are rendered immediately and sent by the background workers;
+    poll GET /api/reminders/jobs/{job_id} for progress. Needs a signed-in
+    user with write access to the pharmacy.
+    """
+    await _require_pharmacy_write(request, pharmacy_id)
+    try:
+        body = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+    channel = body.get("channel")
+    accounts = body.get("accounts") or []
+    template_variables = body.get("template_variables") or {}
+    if channel not in REMINDER_CHANNELS:
+        raise HTTPException(status_code=400, detail=f"channel must be one of: {', '.join(REMINDER_CHANNELS)}")
+    if not isinstance(accounts, list) or not accounts:
+        raise HTTPException(status_code=400, detail="accounts must be a non-empty list")
+    if len(accounts) > REMINDER_MAX_ACCOUNTS:
+        raise HTTPException(status_code=400, detail=f"At most {REMINDER_MAX_ACCOUNTS} accounts per request")
+    missing = [name for name in REQUIRED_TEMPLATE_VARIABLES[channel] if not str(template_variables.get(name) or "").strip()]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing template variables: {', '.join(missing)}")
+
+    arrears_buckets = body.get("arrears_buckets") or None
+    render_args = (channel, accounts, template_variables) + ((arrears_buckets,) if arrears_buckets else ())
+    messages, skipped = await run_in_threadpool(render_reminders, *render_args)
+    job_id = await run_in_threadpool(
+        reminder_queue.enqueue, pharmacy_id, channel, messages, len(skipped), request.session.get("username")
+    )
+    print(f"[DEBUG] Queued reminder job {job_id}: {len(messages)} {channel} messages for pharmacy {pharmacy_id}")
+    return JSONResponse(
+        {"job_id": job_id, "channel": channel, "queued": len(messages), "skipped": skipped},
+        status_code=202,
+    )
+
+
+@app.get("/api/reminders/jobs/{job_id}")
+async def api_reminder_job(request: Request, job_id: str) -> JSONResponse:
+    """Progress of a reminder job: sent / failed / remaining counts and recent errors
+
+    Needs read access to the job's pharmacy (the errors list recipients).
+    """
+    progress = await run_in_threadpool(reminder_queue.progress, job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Reminder job not found")
+    await _require_pharmacy_read(request, progress["pharmacy_id"])
+    return JSONResponse(progress)
+
+
+@app.post("/api/reminders/jobs/{job_id}/cancel")
+async def api_cancel_reminder_job(request: Request, job_id: str) -> JSONResponse:
+    """Stop sending the remaining messages of a reminder job"""
+    progress = await run_in_threadpool(reminder_queue.progress, job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Reminder job not found")
+    await _require_pharmacy_write(request, progress["pharmacy_id"])
+    await run_in_threadpool(reminder_queue.cancel, job_id)
+    return JSONResponse(await run_in_threadpool(reminder_queue.progress, job_id))
+
+
+@app.get("/api/pharmacies/{pharmacy_id}/reminders/jobs")
+async def api_reminder_jobs(request: Request, pharmacy_id: int, limit: int = Query(20, ge=1, le=100)) -> JSONResponse:
+    """Recent reminder jobs for a pharmacy, newest first; needs read access to the pharmacy"""
+    await _require_pharmacy_read(request, pharmacy_id)
+    return JSONResponse({"pharmacy_id": pharmacy_id, "jobs": await run_in_threadpool(reminder_queue.list_jobs, pharmacy_id, limit)})
+
+
+@app.get("/api/reminders/stats")
+async def api_reminder_stats() -> JSONResponse:
+    """Per-channel reminder worker counters"""
+    return JSONResponse({channel: worker.stats for channel, (worker, _) in reminder_workers.items()})
+
+
 @app.get("/admin", response_class=HTMLResponse)
 async def admin_page(request: Request):
     """Admin page for user management - only accessible by Charl (user_id: 2)"""
@@ -2562,7 +4111,15 @@ async def admin_page(request: Request):
         print(f"[DEBUG] No username in session - redirecting to login")
         return RedirectResponse(url="/login", status_code=303)
     
-    # If user_id is not set, try to fetch it from admin/users endpoint
+    # If user_id is not set, take it from the session token's claims
+    if not user_id and auth_token:
+        claims = jwt_claims.get(auth_token)
+        if claims and claims["user_id"]:
+            user_id = claims["user_id"]
+            request.session["user_id"] = user_id
+            print(f"[DEBUG] Found user_id from token claims: {user_id}")
+
+    # Opaque (non-JWT) tokens carry no claims; fall back to looking the user up
     if not user_id:
         # Admin endpoints should use the user's auth_token, not the global API_KEY
         bearer = request.session.get("auth_token") or API_KEY or ""
@@ -2586,7 +4143,7 @@ async def admin_page(request: Request):
                 print(f"[WARNING] Failed to fetch user_id from admin/users: {e}")
     
     # Check if user is admin (Charl user_id: 2, Amin user_id: 9, or username is "admin"/"charl"/"amin")
-    is_admin = user_id in [2, 9] or (username and username.lower() in ["charl", "admin", "amin"])
+    is_admin = is_admin_identity(user_id, username)
     
     if not is_admin:
         print(f"[DEBUG] Access denied - User ID: {user_id}, Username: {username}")
@@ -2607,115 +4164,184 @@ async def admin_page(request: Request):
 
 
 # Admin API Proxy Endpoints
-def _check_admin_access(request: Request) -> bool:
+async def _confirm_admin_token(token: str) -> bool:
+    """Whether the upstream accepts the token for /admin/users; cached per token for ADMIN_TOKEN_CHECK_TTL"""
+    key = token_key(token)
+    confirmed = admin_token_checks.get(key)
+    if confirmed is not None:
+        return confirmed
+    try:
+        async with httpx.AsyncClient(timeout=15) as client:
+            resp = await client.get(f"{API_BASE_URL}/admin/users", headers={"Authorization": f"Bearer {token}"})
+    except httpx.HTTPError as e:
+        print(f"[WARNING] Could not confirm admin token with the backend: {e}")
+        return False
+    confirmed = resp.status_code == 200
+    admin_token_checks.set(key, confirmed)
+    if confirmed:
+        # The same answer the admin user list would fetch with this token
+        users = resp.json()
+        admin_users_cache.set(key, {"users": users, "etag": json_etag(users)})
+    return confirmed
+
+
+async def _check_admin_access(request: Request) -> bool:
     """Check if current user is admin (user_id: 2 or 9, or username: 'Charl', 'admin', or 'Amin')
     
     Supports both session-based auth and bearer token auth for cross-origin requests.
+    Bearer tokens are decoded once and their claims cached until the token expires.
+    Without JWT_SECRET their signature can't be checked here, so admin claims only
+    count once the backend has accepted the token for /admin/users.
     """
     # First check session-based auth
     user_id = request.session.get("user_id")
     username = request.session.get("username")
-    print(f"[DEBUG] _check_admin_access - session user_id: {user_id}, username: {username}")
     
-    if user_id in [2, 9] or (username and username.lower() in ["charl", "admin", "amin"]):
-        print(f"[DEBUG] Session auth SUCCESS")
+    if is_admin_identity(user_id, username):
         return True
     
     # Check for bearer token in Authorization header (for cross-origin requests from webApp2)
     auth_header = request.headers.get("Authorization", "")
-    print(f"[DEBUG] Auth header: {auth_header[:50] if auth_header else 'None'}...")
-    
-    if auth_header.startswith("Bearer "):
-        token = auth_header[7:]
-        print(f"[DEBUG] Validating bearer token: {token[:20]}...")
-        
-        # Try to decode JWT token to get user info
-        try:
-            import jwt
-            # Decode without verification (just to get the payload)
-            # The token was already verified by the login endpoint
-            payload = jwt.decode(token, options={"verify_signature": False})
-            print(f"[DEBUG] JWT payload: {payload}")
-            
-            token_user_id = payload.get("user_id") or payload.get("sub")
-            token_username = payload.get("username", "")
-            
-            # Convert user_id to int if it's a string
-            if isinstance(token_user_id, str) and token_user_id.isdigit():
-                token_user_id = int(token_user_id)
-            
-            print(f"[DEBUG] Bearer token auth - user_id: {token_user_id}, username: {token_username}")
-            if token_user_id in [2, 9] or (token_username and token_username.lower() in ["charl", "admin", "amin"]):
-                # Store in session for subsequent requests
-                request.session["user_id"] = token_user_id
-                request.session["username"] = token_username
-                request.session["auth_token"] = token
-                print(f"[DEBUG] Bearer auth SUCCESS")
-                return True
-            else:
-                print(f"[DEBUG] User {token_username} ({token_user_id}) is not admin")
-        except Exception as e:
-            print(f"[DEBUG] JWT decode error: {e}")
+    if not auth_header.startswith("Bearer "):
+        print(f"[DEBUG] Admin access DENIED - no admin session or bearer token (user_id: {user_id}, username: {username})")
+        return False
+
+    token = auth_header[7:]
+    claims = jwt_claims.get(token)
+    if claims and claims["is_admin"] and not jwt_claims.secret and not await _confirm_admin_token(token):
+        print(f"[DEBUG] Admin access DENIED - backend did not accept the bearer token of {claims['username']} ({claims['user_id']})")
+        return False
+    if claims and claims["is_admin"]:
+        # Store in session for subsequent requests
+        if request.session.get("auth_token") != token:
+            request.session["user_id"] = claims["user_id"]
+            request.session["username"] = claims["username"]
+            request.session["auth_token"] = token
+        return True
+
+    if claims:
+        print(f"[DEBUG] Admin access DENIED - user {claims['username']} ({claims['user_id']}) is not admin")
     else:
-        print(f"[DEBUG] No bearer token found")
-    
-    print(f"[DEBUG] Admin access DENIED")
+        print(f"[DEBUG] Admin access DENIED - invalid bearer token")
     return False
 
-@app.get("/api/admin/users")
-async def api_admin_list_users(request: Request) -> JSONResponse:
-    """Proxy endpoint to list all users - only accessible by admin users"""
-    user_id = request.session.get("user_id")
-    username = request.session.get("username")
-    print(f"[DEBUG] /api/admin/users - user_id: {user_id}, username: {username}")
-    
-    if not _check_admin_access(request):
-        print(f"[DEBUG] Access denied - user_id: {user_id}, username: {username}")
-        raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
-    
-    # Admin endpoints should use the user's auth_token, not the global API_KEY
-    # The user must be authenticated to access admin endpoints
-    bearer = request.session.get("auth_token") or API_KEY or ""
+def _admin_data_changed() -> None:
+    """Drop everything cached from the admin user/access data after an admin change"""
+    admin_users_cache.clear()
+    admin_token_checks.clear()
+    permission_matrix.clear()
+    # Cached login pharmacy lists are per username, not per user_id, so drop them all
+    user_pharmacies_cache.clear()
+
+
+async def _fetch_admin_users(bearer: str) -> list:
+    """Upstream /admin/users with the given bearer, retrying with X-API-Key on 401"""
     headers = {"Authorization": f"Bearer {bearer}"} if bearer else {}
-    
-    print(f"[DEBUG] Calling backend /admin/users with bearer: {bearer[:20] if bearer else 'None'}...")
-    print(f"[DEBUG] API_KEY present: {bool(API_KEY)}, auth_token in session: {bool(request.session.get('auth_token'))}")
-    print(f"[DEBUG] Using token from: {'session' if request.session.get('auth_token') else 'API_KEY' if API_KEY else 'none'}")
-    
     async with httpx.AsyncClient(timeout=15) as client:
         url = f"{API_BASE_URL}/admin/users"
         resp = await client.get(url, headers=headers)
     
-    print(f"[DEBUG] Backend response status: {resp.status_code}")
-    print(f"[DEBUG] Backend response headers: {dict(resp.headers)}")
-    
-    # If Bearer token fails with 401, try X-API-Key header (like dashboard does)
-    if resp.status_code == 401 and bearer:
-        print(f"[DEBUG] Bearer token failed, trying X-API-Key header...")
-        alt_headers = {"X-API-Key": bearer}
-        resp = await client.get(url, headers=alt_headers)
-        print(f"[DEBUG] X-API-Key response status: {resp.status_code}")
+        # If Bearer token fails with 401, try X-API-Key header (like dashboard does)
+        if resp.status_code == 401 and bearer:
+            print(f"[DEBUG] Bearer token failed, trying X-API-Key header...")
+            resp = await client.get(url, headers={"X-API-Key": bearer})
     
     if resp.status_code != 200:
         error_text = resp.text[:500] if resp.text else "No error message"
         print(f"[DEBUG] Backend error: {error_text}")
         raise HTTPException(status_code=resp.status_code, detail=f"Backend returned {resp.status_code}: {error_text}")
     
-    data = resp.json()
-    print(f"[DEBUG] Users list response type: {type(data)}, length: {len(data) if isinstance(data, list) else 'N/A'}")
-    if isinstance(data, list) and len(data) > 0:
-        print(f"[DEBUG] First user keys: {list(data[0].keys()) if isinstance(data[0], dict) else 'Not a dict'}")
-        print(f"[DEBUG] First user: {data[0]}")
-        if 'pharmacies' in data[0]:
-            print(f"[DEBUG] First user has 'pharmacies' field: {data[0]['pharmacies']}")
+    users = resp.json()
+    print(f"[DEBUG] Loaded {len(users) if isinstance(users, list) else 'N/A'} users from /admin/users")
+    return users
+
+
+def _load_permission_matrix(users) -> None:
+    if isinstance(users, list):
+        loaded = permission_matrix.load_admin_users(users)
+        print(f"[DEBUG] Permission matrix loaded for {loaded} users")
+
+
+async def get_admin_users(request: Request, refresh: bool = False) -> dict:
+    """Upstream /admin/users as {"users", "etag"}, fetched with the admin's own token
+
+    Cached per token for ADMIN_USERS_TTL seconds, so a cached list is only
+    served to a token the backend has already accepted for it. Also reloads
+    the permission matrix.
+    """
+    # Admin endpoints should use the user's auth_token, not the global API_KEY
+    session_token = request.session.get("auth_token")
+    key = token_key(session_token) if session_token else None
+    cached = None if refresh or key is None else admin_users_cache.get(key)
+    if cached is not None:
+        return cached
+
+    print(f"[DEBUG] Calling backend /admin/users using token from: {'session' if session_token else 'API_KEY' if API_KEY else 'none'}")
+    users = await _fetch_admin_users(session_token or API_KEY or "")
+    cached = {"users": users, "etag": json_etag(users)}
+    if key is not None:
+        admin_users_cache.set(key, cached)
+    _load_permission_matrix(users)
+    return cached
+
+
+@app.get("/api/admin/users")
+async def api_admin_list_users(
+    request: Request,
+    q: str = None,
+    page: int = Query(None, ge=1),
+    page_size: int = Query(None, ge=1, le=500),
+    fields: str = None,
+    refresh: bool = False,
+):
+    """Proxy endpoint to list all users - only accessible by admin users
+
+    Without q/page/page_size/fields the full upstream list is returned as
+    before. With any of them the response is {"users", "total", "page",
+    "page_size", "pages"}. Responses carry an ETag; a matching
+    If-None-Match gets 304.
+
+    Args:
+        q: Case-insensitive substring of the username
+        page: 1-based page (default 1)
+        page_size: Users per page (default 50, max 500)
+        fields: Comma-separated user fields to return, e.g. user_id,username,is_active
+        refresh: Reload the list from the backend instead of the cache
+    """
+    if not await _check_admin_access(request):
+        print(f"[DEBUG] Access denied - user_id: {request.session.get('user_id')}, username: {request.session.get('username')}")
+        raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
     
-    return JSONResponse(data)
+    cached = await get_admin_users(request, refresh=refresh)
+    users = cached["users"]
+    if q is None and page is None and page_size is None and fields is None:
+        return conditional_json(request, users, etag=cached["etag"])
+
+    if q:
+        needle = q.strip().lower()
+        users = [u for u in users if needle in str(u.get("username") or "").lower()]
+    page = page or 1
+    page_size = page_size or 50
+    total = len(users)
+    users = users[(page - 1) * page_size:page * page_size]
+    if fields:
+        keep = [f.strip() for f in fields.split(",") if f.strip()]
+        users = [{f: u.get(f) for f in keep if f in u} for u in users]
+
+    payload = {
+        "users": users,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "pages": (total + page_size - 1) // page_size,
+    }
+    return conditional_json(request, payload, etag=derived_etag(cached["etag"], q, page, page_size, fields))
 
 
 @app.get("/api/admin/users/{user_id}")
 async def api_admin_get_user(request: Request, user_id: int) -> JSONResponse:
     """Proxy endpoint to get user details - only accessible by Charl"""
-    if not _check_admin_access(request):
+    if not await _check_admin_access(request):
         raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
     
     # Admin endpoints should use the user's auth_token, not the global API_KEY
@@ -2736,7 +4362,7 @@ async def api_admin_get_user(request: Request, user_id: int) -> JSONResponse:
 @app.post("/api/admin/users")
 async def api_admin_create_user(request: Request) -> JSONResponse:
     """Proxy endpoint to create a new user - only accessible by Charl"""
-    if not _check_admin_access(request):
+    if not await _check_admin_access(request):
         raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
     
     # Admin endpoints should use the user's auth_token, not the global API_KEY
@@ -2768,13 +4394,14 @@ async def api_admin_create_user(request: Request) -> JSONResponse:
             print(f"[DEBUG] Raw error: {error_detail}")
         raise HTTPException(status_code=resp.status_code, detail=error_detail)
     
+    _admin_data_changed()
     return JSONResponse(resp.json())
 
 
 @app.put("/api/admin/users/{user_id}")
 async def api_admin_update_user(request: Request, user_id: int) -> JSONResponse:
     """Proxy endpoint to update a user - only accessible by Charl"""
-    if not _check_admin_access(request):
+    if not await _check_admin_access(request):
         raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
     
     # Admin endpoints should use the user's auth_token, not the global API_KEY
@@ -2791,13 +4418,14 @@ async def api_admin_update_user(request: Request, user_id: int) -> JSONResponse:
         error_detail = resp.json().get("detail", "Failed to update user") if resp.headers.get("content-type", "").startswith("application/json") else "Failed to update user"
         raise HTTPException(status_code=resp.status_code, detail=error_detail)
     
+    _admin_data_changed()
     return JSONResponse(resp.json())
 
 
 @app.post("/api/admin/users/{user_id}/pharmacies")
 async def api_admin_grant_pharmacy_access(request: Request, user_id: int) -> JSONResponse:
     """Proxy endpoint to grant pharmacy access - only accessible by Charl"""
-    if not _check_admin_access(request):
+    if not await _check_admin_access(request):
         raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
     
     # Admin endpoints should use the user's auth_token, not the global API_KEY
@@ -2814,13 +4442,14 @@ async def api_admin_grant_pharmacy_access(request: Request, user_id: int) -> JSO
         error_detail = resp.json().get("detail", "Failed to grant pharmacy access") if resp.headers.get("content-type", "").startswith("application/json") else "Failed to grant pharmacy access"
         raise HTTPException(status_code=resp.status_code, detail=error_detail)
     
+    _admin_data_changed()
     return JSONResponse(resp.json())
 
 
 @app.delete("/api/admin/users/{user_id}/pharmacies/{pharmacy_id}")
 async def api_admin_revoke_pharmacy_access(request: Request, user_id: int, pharmacy_id: int) -> JSONResponse:
     """Proxy endpoint to revoke pharmacy access - only accessible by Charl"""
-    if not _check_admin_access(request):
+    if not await _check_admin_access(request):
         raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
     
     # Admin endpoints should use the user's auth_token, not the global API_KEY
@@ -2835,13 +4464,85 @@ async def api_admin_revoke_pharmacy_access(request: Request, user_id: int, pharm
         error_detail = resp.json().get("detail", "Failed to revoke pharmacy access") if resp.headers.get("content-type", "").startswith("application/json") else "Failed to revoke pharmacy access"
         raise HTTPException(status_code=resp.status_code, detail=error_detail)
     
+    _admin_data_changed()
     return JSONResponse(resp.json())
 
 
+@app.post("/api/admin/pharmacy-access/bulk")
+async def api_admin_bulk_pharmacy_access(request: Request) -> JSONResponse:
+    """Grant or revoke many user/pharmacy access pairs in one call - only accessible by admin users
+
+    Body: {"operations": [{"user_id", "pharmacy_id", "action": "grant" | "revoke",
+    "can_read": true, "can_write": false}, ...]}. Operations are sent upstream
+    ADMIN_BULK_CONCURRENCY at a time; one failing does not stop the others.
+    Returns per-operation results in request order, and cached admin data is
+    invalidated once at the end.
+    """
+    if not await _check_admin_access(request):
+        raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
+
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+    operations = body.get("operations") if isinstance(body, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise HTTPException(status_code=400, detail="operations must be a non-empty list")
+    if len(operations) > ADMIN_BULK_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {ADMIN_BULK_MAX_OPERATIONS} operations per request")
+
+    # Admin endpoints should use the user's auth_token, not the global API_KEY
+    bearer = request.session.get("auth_token") or API_KEY or ""
+    headers = {"Authorization": f"Bearer {bearer}"} if bearer else {}
+    semaphore = asyncio.Semaphore(ADMIN_BULK_CONCURRENCY)
+
+    async def apply(index: int, op, client: httpx.AsyncClient) -> dict:
+        result = {"index": index, "user_id": None, "pharmacy_id": None, "action": None, "ok": False}
+        try:
+            user_id = int(op["user_id"])
+            pharmacy_id = int(op["pharmacy_id"])
+            action = op.get("action", "grant")
+            if action not in ("grant", "revoke"):
+                raise ValueError("action must be grant or revoke")
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return {**result, "status": 400, "detail": f"Invalid operation: {e}"}
+        result.update(user_id=user_id, pharmacy_id=pharmacy_id, action=action)
+
+        async with semaphore:
+            try:
+                if action == "grant":
+                    access = {
+                        "pharmacy_id": pharmacy_id,
+                        "can_read": bool(op.get("can_read", True)),
+                        "can_write": bool(op.get("can_write", False)),
+                    }
+                    resp = await client.post(f"{API_BASE_URL}/admin/users/{user_id}/pharmacies", json=access, headers=headers)
+                else:
+                    resp = await client.delete(f"{API_BASE_URL}/admin/users/{user_id}/pharmacies/{pharmacy_id}", headers=headers)
+            except httpx.HTTPError as e:
+                return {**result, "status": 502, "detail": f"Request error: {str(e)}"}
+
+        result["status"] = resp.status_code
+        result["ok"] = resp.status_code in (200, 204)
+        if not result["ok"]:
+            is_json = resp.headers.get("content-type", "").startswith("application/json")
+            result["detail"] = resp.json().get("detail", f"Failed to {action} pharmacy access") if is_json else resp.text[:200]
+        return result
+
+    async with httpx.AsyncClient(timeout=15) as client:
+        results = await asyncio.gather(*(apply(i, op, client) for i, op in enumerate(operations)))
+
+    succeeded = sum(1 for r in results if r["ok"])
+    if succeeded:
+        _admin_data_changed()
+    print(f"[DEBUG] Bulk pharmacy access: {succeeded}/{len(results)} operations succeeded")
+    return JSONResponse({"succeeded": succeeded, "failed": len(results) - succeeded, "results": results})
+
+
 @app.get("/api/admin/users/{user_id}/pharmacies")
 async def api_admin_get_user_pharmacies(request: Request, user_id: int) -> JSONResponse:
     """Proxy endpoint to fetch a user's pharmacy access - only accessible by Charl"""
-    if not _check_admin_access(request):
+    if not await _check_admin_access(request):
         raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
     
     bearer = request.session.get("auth_token") or API_KEY or ""
@@ -2867,7 +4568,7 @@ async def api_admin_get_user_pharmacies(request: Request, user_id: int) -> JSONR
 @app.delete("/api/admin/users/{user_id}")
 async def api_admin_delete_user(request: Request, user_id: int) -> JSONResponse:
     """Proxy endpoint to delete a user - only accessible by Charl"""
-    if not _check_admin_access(request):
+    if not await _check_admin_access(request):
         raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
     
     # Admin endpoints should use the user's auth_token, not the global API_KEY
@@ -2882,6 +4583,7 @@ async def api_admin_delete_user(request: Request, user_id: int) -> JSONResponse:
         error_detail = resp.json().get("detail", "Failed to delete user") if resp.headers.get("content-type", "").startswith("application/json") else "Failed to delete user"
         raise HTTPException(status_code=resp.status_code, detail=error_detail)
     
+    _admin_data_changed()
     if resp.status_code == 204:
         return JSONResponse({"message": "User deleted successfully"})
     
@@ -2891,7 +4593,7 @@ async def api_admin_delete_user(request: Request, user_id: int) -> JSONResponse:
 @app.get("/api/admin/pharmacies")
 async def api_admin_list_pharmacies(request: Request) -> JSONResponse:
     """Proxy endpoint to list all pharmacies - only accessible by Charl"""
-    if not _check_admin_access(request):
+    if not await _check_admin_access(request):
         raise HTTPException(status_code=403, detail="Admin access restricted to admin users only")
     
     # Admin endpoints should use the user's auth_token, not the global API_KEY
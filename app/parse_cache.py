@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Optional, Union
+
+
+def parse_cache_key(pdf: Union[bytes, BinaryIO], parser_version: str) -> str:
+    """SHA-256 of the parser version and the PDF content
+
+    ``pdf`` is the content or a seekable binary file, which is hashed in
+    blocks and rewound, so an upload is never read into memory whole.
+    """
+    digest = hashlib.sha256(parser_version.encode())
+    digest.update(b"\0")
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        digest.update(pdf)
+    else:
+        pdf.seek(0)
+        for block in iter(lambda: pdf.read(1024 * 1024), b""):
+            digest.update(block)
+        pdf.seek(0)
+    return digest.hexdigest()
+
+
+class ParseResultCache:
+    """Parsed debtor reports keyed by content hash, stored on disk.
+
+    Debtors are stored column-wise (field names once, then one value list per
+    record) as gzipped JSON under ``<directory>/<key[:2]>/<key>.json.gz``.
+    The total size on disk is bounded by ``max_bytes``; the least recently
+    used reports are deleted first. Reads and writes happen in a threadpool,
+    hence the lock.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._sizes: "Optional[OrderedDict[str, int]]" = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def _index(self) -> "OrderedDict[str, int]":
+        # Built once from disk, oldest access first
+        if self._sizes is None:
+            entries = []
+            if os.path.isdir(self.directory):
+                for root, _, files in os.walk(self.directory):
+                    for name in files:
+                        if name.endswith(".json.gz"):
+                            st = os.stat(os.path.join(root, name))
+                            entries.append((st.st_mtime, name[: -len(".json.gz")], st.st_size))
+            self._sizes = OrderedDict((key, size) for _, key, size in sorted(entries))
+        return self._sizes
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            sizes = self._index()
+            if key not in sizes:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    stored = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                sizes.pop(key, None)
+                self.misses += 1
+                return None
+            sizes.move_to_end(key)
+            self.hits += 1
+
+        columns = stored["columns"]
+        return {
+            "total_accounts": stored["total_accounts"],
+            "total_outstanding": stored["total_outstanding"],
+            "debtors": [dict(zip(columns, row)) for row in stored["rows"]],
+        }
+
+    def set(self, key: str, result: dict) -> None:
+        debtors = result.get("debtors") or []
+        columns = list(debtors[0]) if debtors else []
+        stored = {
+            "total_accounts": result.get("total_accounts", len(debtors)),
+            "total_outstanding": result.get("total_outstanding", 0.0),
+            "columns": columns,
+            "rows": [[debtor.get(column) for column in columns] for debtor in debtors],
+        }
+        payload = gzip.compress(json.dumps(stored, separators=(",", ":"), default=str).encode("utf-8"), compresslevel=6)
+        if len(payload) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        with self._lock:
+            sizes = self._index()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            sizes[key] = len(payload)
+            sizes.move_to_end(key)
+
+            total = sum(sizes.values())
+            while total > self.max_bytes and len(sizes) > 1:
+                old_key, old_size = sizes.popitem(last=False)
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+                total -= old_size
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = self._index()
+            return {
+                "entries": len(sizes),
+                "bytes": sum(sizes.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
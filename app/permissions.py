@@ -0,0 +1,107 @@
+import time
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+
+def _pharmacy_id(pharmacy: dict) -> Optional[int]:
+    value = pharmacy.get("pharmacy_id") or pharmacy.get("id") or pharmacy.get("pharmacyId") or pharmacy.get("store_id")
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _flag(pharmacy: dict, names: Tuple[str, ...], default: Optional[bool]) -> Optional[bool]:
+    for name in names:
+        if pharmacy.get(name) is not None:
+            return bool(pharmacy[name])
+    return default
+
+
+class PermissionMatrix:
+    """Readable / writable pharmacy ids per user, for local access checks.
+
+    Filled from the upstream /admin/users list (when its entries include
+    ``pharmacies``) and from the pharmacy list fetched at login. Entries
+    older than ``ttl`` count as unknown; callers should let a request for
+    an unknown user through, since the upstream still has the final say.
+    Access flags are read the same way the admin screen reads them:
+    can_read (default true) and can_write. A pharmacy listed without a
+    can_write flag has unknown write access, again left to the upstream.
+    """
+
+    def __init__(self, ttl: float = 300) -> None:
+        self.ttl = ttl
+        # user_id -> (readable, writable, write unknown, loaded at)
+        self._entries: Dict[int, Tuple[FrozenSet[int], FrozenSet[int], FrozenSet[int], float]] = {}
+        self.loaded_at: Optional[float] = None
+
+    def set_user(self, user_id: int, pharmacies: Iterable[dict]) -> None:
+        read, write, write_unknown = set(), set(), set()
+        for pharmacy in pharmacies or []:
+            if not isinstance(pharmacy, dict):
+                continue
+            pid = _pharmacy_id(pharmacy)
+            if pid is None or not _flag(pharmacy, ("can_read", "read_access", "read"), True):
+                continue
+            read.add(pid)
+            can_write = _flag(pharmacy, ("can_write", "write_access", "write"), None)
+            if can_write:
+                write.add(pid)
+            elif can_write is None:
+                write_unknown.add(pid)
+        self._entries[int(user_id)] = (frozenset(read), frozenset(write), frozenset(write_unknown), time.monotonic())
+
+    def load_admin_users(self, users: Iterable[dict]) -> int:
+        """Reload the matrix from an /admin/users list; returns the users loaded
+
+        Users whose row carries no ``pharmacies`` keep the entry seeded at
+        their login; users missing from the list are dropped.
+        """
+        previous, self._entries = self._entries, {}
+        for user in users or []:
+            if not isinstance(user, dict) or user.get("user_id") is None:
+                continue
+            if isinstance(user.get("pharmacies"), list):
+                self.set_user(user["user_id"], user["pharmacies"])
+            else:
+                try:
+                    user_id = int(user["user_id"])
+                except (TypeError, ValueError):
+                    continue
+                if user_id in previous:
+                    self._entries[user_id] = previous[user_id]
+        self.loaded_at = time.monotonic()
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries = {}
+        self.loaded_at = None
+
+    @property
+    def stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    def _entry(self, user_id) -> Optional[Tuple[FrozenSet[int], FrozenSet[int], FrozenSet[int], float]]:
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry[3] > self.ttl:
+            return None
+        return entry
+
+    def readable(self, user_id) -> Optional[FrozenSet[int]]:
+        """Pharmacy ids the user may read, or None if the user is unknown"""
+        entry = self._entry(user_id)
+        return entry[0] if entry else None
+
+    def allows(self, user_id, pharmacy_id: int, write: bool = False) -> Optional[bool]:
+        """True / False, or None if the user (or their write access to the pharmacy) is unknown"""
+        entry = self._entry(user_id)
+        if entry is None:
+            return None
+        if not write:
+            return pharmacy_id in entry[0]
+        if pharmacy_id in entry[1]:
+            return True
+        return None if pharmacy_id in entry[2] else False
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,560 @@
+"""
+Debtor reminder outbox: a persistent queue of email/SMS messages drained by
+rate-limited background workers.
+
+A send request renders every message up front from precompiled Jinja2
+templates and stores them as one job. Each channel has a worker that claims
+due messages in batches, sends a batch over one connection, and reschedules
+failures with exponential backoff until REMINDER_MAX_ATTEMPTS. A claim is a
+lease: messages a worker has not completed within REMINDER_LEASE_SECONDS
+(e.g. because the process died mid-batch) become claimable again.
+
+Configuration (environment):
+    REMINDER_QUEUE_URL: SQLAlchemy URL of a separate queue database (default: the app's
+        DATABASE_URL, whose tables the Alembic migration creates)
+    REMINDER_MAX_ATTEMPTS: attempts per message before it is marked failed (default 5)
+    REMINDER_LEASE_SECONDS: how long a claimed batch is reserved for its worker (default 300)
+    EMAIL_RATE_PER_MIN / SMS_RATE_PER_MIN: per-channel send rate (default 60 / 30)
+    EMAIL_BATCH_SIZE / SMS_BATCH_SIZE: messages per batch (default 20 / 50)
+    SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_FROM, SMTP_STARTTLS: email delivery
+    SMS_API_URL, SMS_API_KEY: SMS gateway accepting {"messages": [{"to", "body"}]}
+
+Without SMTP_HOST / SMS_API_URL messages are written to the log instead of
+being delivered. For local development set
+REMINDER_QUEUE_URL=sqlite:///data/reminder_queue.db.
+"""
+
+import asyncio
+import os
+import smtplib
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+
+CHANNELS = ("email", "sms")
+DEFAULT_ARREARS_BUCKETS = ("d60", "d90", "d120", "d150", "d180")
+REQUIRED_TEMPLATE_VARIABLES = {
+    "email": ("pharmacy_name", "bank_name", "account_number", "pharmacy_email", "pharmacy_phone"),
+    "sms": ("pharmacy_name", "bank_name", "account_number"),
+}
+MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+# Schema of the app's own tables on the shared Postgres database (see alembic/versions)
+POSTGRES_SCHEMA = "pharmasight"
+LEASE_SECONDS = int(os.getenv("REMINDER_LEASE_SECONDS", "300"))
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates", "reminders")
+
+
+def _money(value) -> str:
+    return f"{float(value or 0):,.2f}"
+
+
+# Compiled once at import; rendering a batch only evaluates the compiled templates
+_template_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(["html"]),
+    undefined=StrictUndefined,
+    keep_trailing_newline=False,
+)
+TEMPLATES = {
+    "email_subject": _template_env.get_template("debtor_email_subject.txt"),
+    "email_body": _template_env.get_template("debtor_email.html"),
+    "sms_body": _template_env.get_template("debtor_sms.txt"),
+}
+
+
+def render_reminders(
+    channel: str,
+    accounts: Iterable[dict],
+    template_variables: dict,
+    arrears_buckets: Iterable[str] = DEFAULT_ARREARS_BUCKETS,
+) -> Tuple[List[dict], List[dict]]:
+    """Render one message per account.
+
+    Returns (messages, skipped); accounts without an email address / phone
+    number for the channel are skipped with a reason.
+    """
+    arrears_buckets = list(arrears_buckets)
+    messages, skipped = [], []
+    for account in accounts:
+        recipient = (account.get("email") if channel == "email" else account.get("phone")) or ""
+        recipient = str(recipient).strip()
+        if not recipient:
+            skipped.append({"acc_no": account.get("acc_no"), "reason": f"no {'email address' if channel == 'email' else 'phone number'}"})
+            continue
+
+        arrears = sum(float(account.get(bucket) or 0) for bucket in arrears_buckets)
+        balance = float(account.get("balance") or 0) or sum(
+            float(account.get(bucket) or 0) for bucket in ("current", "d30", "d60", "d90", "d120", "d150", "d180")
+        )
+        context = {
+            **template_variables,
+            "name": account.get("name") or "",
+            "acc_no": account.get("acc_no") or "",
+            "amount": _money(arrears),
+            "arrears_amount": _money(arrears),
+            "total_balance": _money(balance),
+        }
+        if channel == "email":
+            subject = TEMPLATES["email_subject"].render(context).strip()
+            body = TEMPLATES["email_body"].render(context)
+        else:
+            subject = None
+            body = TEMPLATES["sms_body"].render(context).strip()
+        messages.append({"acc_no": context["acc_no"], "recipient": recipient, "subject": subject, "body": body})
+    return messages, skipped
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ReminderQueue:
+    """Jobs and messages persisted with SQLAlchemy.
+
+    By default the queue lives in the app's Postgres database, in the
+    pharmasight schema, where the Alembic migration creates its tables.
+    REMINDER_QUEUE_URL points it at another database instead (e.g. SQLite
+    for local development), whose tables create_tables builds.
+
+    Message status: pending -> sending -> sent | failed; a failed attempt
+    goes back to pending with next_attempt_at pushed out until MAX_ATTEMPTS.
+    A 'sending' message whose lease_until has passed is claimable again.
+    """
+
+    def __init__(self, engine: Engine, migrated: bool = False) -> None:
+        self.engine = engine
+        self.migrated = migrated
+        self.schema = POSTGRES_SCHEMA if engine.dialect.name == "postgresql" else None
+        prefix = f"{self.schema}." if self.schema else ""
+        self.jobs_table = f"{prefix}reminder_jobs"
+        self.messages_table = f"{prefix}reminder_messages"
+
+    @classmethod
+    def from_env(cls, default_engine: Optional[Engine] = None) -> "ReminderQueue":
+        """Queue on REMINDER_QUEUE_URL if set, else on ``default_engine`` (the app database)"""
+        url = os.getenv("REMINDER_QUEUE_URL")
+        if not url and default_engine is not None:
+            return cls(default_engine, migrated=True)
+        url = url or "sqlite:///data/reminder_queue.db"
+        if url.startswith("sqlite:///"):
+            directory = os.path.dirname(url[len("sqlite:///"):])
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            engine = create_engine(url, connect_args={"check_same_thread": False})
+        else:
+            engine = create_engine(url, pool_pre_ping=True)
+        return cls(engine)
+
+    def create_tables(self) -> None:
+        """Create the queue tables, except on the app database where the migration owns them"""
+        if self.migrated:
+            return
+        with self.engine.begin() as conn:
+            if self.schema:
+                conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self.schema}"))
+            conn.execute(text(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.jobs_table} (
+                    job_id VARCHAR(32) PRIMARY KEY,
+                    pharmacy_id INTEGER NOT NULL,
+                    channel VARCHAR(8) NOT NULL,
+                    created_by VARCHAR(100),
+                    total INTEGER NOT NULL,
+                    skipped INTEGER NOT NULL DEFAULT 0,
+                    cancelled BOOLEAN NOT NULL DEFAULT FALSE,
+                    created_at TIMESTAMP NOT NULL
+                )
+                """
+            ))
+            conn.execute(text(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.messages_table} (
+                    message_id VARCHAR(32) PRIMARY KEY,
+                    job_id VARCHAR(32) NOT NULL,
+                    channel VARCHAR(8) NOT NULL,
+                    acc_no VARCHAR(64),
+                    recipient VARCHAR(255) NOT NULL,
+                    subject TEXT,
+                    body TEXT NOT NULL,
+                    status VARCHAR(10) NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMP NOT NULL,
+                    last_error TEXT,
+                    sent_at TIMESTAMP,
+                    lease_until TIMESTAMP
+                )
+                """
+            ))
+            # Queues created before claims were leased
+            columns = {column["name"] for column in inspect(conn).get_columns("reminder_messages", schema=self.schema)}
+            if "lease_until" not in columns:
+                conn.execute(text(f"ALTER TABLE {self.messages_table} ADD COLUMN lease_until TIMESTAMP"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_reminder_messages_due "
+                f"ON {self.messages_table} (channel, status, next_attempt_at)"
+            ))
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_reminder_messages_job ON {self.messages_table} (job_id, status)"
+            ))
+
+    def recover(self) -> int:
+        """Return messages whose lease has expired (their worker died mid-batch) to the queue
+
+        Messages still leased by a live worker, e.g. in another process
+        sharing the queue, are left alone.
+        """
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                text(
+                    f"UPDATE {self.messages_table} SET status = 'pending', lease_until = NULL "
+                    "WHERE status = 'sending' AND (lease_until IS NULL OR lease_until <= :now)"
+                ),
+                {"now": _utcnow()},
+            )
+            return result.rowcount
+
+    def enqueue(self, pharmacy_id: int, channel: str, messages: List[dict], skipped: int = 0, created_by: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = _utcnow()
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"INSERT INTO {self.jobs_table} (job_id, pharmacy_id, channel, created_by, total, skipped, cancelled, created_at) "
+                    "VALUES (:job_id, :pharmacy_id, :channel, :created_by, :total, :skipped, FALSE, :created_at)"
+                ),
+                {"job_id": job_id, "pharmacy_id": pharmacy_id, "channel": channel, "created_by": created_by,
+                 "total": len(messages), "skipped": skipped, "created_at": now},
+            )
+            if messages:
+                conn.execute(
+                    text(
+                        f"INSERT INTO {self.messages_table} (message_id, job_id, channel, acc_no, recipient, subject, body, status, attempts, next_attempt_at) "
+                        "VALUES (:message_id, :job_id, :channel, :acc_no, :recipient, :subject, :body, 'pending', 0, :now)"
+                    ),
+                    [
+                        {"message_id": uuid.uuid4().hex, "job_id": job_id, "channel": channel, "now": now, **message}
+                        for message in messages
+                    ],
+                )
+        return job_id
+
+    def claim(self, channel: str, limit: int) -> List[dict]:
+        """Lease up to limit due messages as 'sending' and return them, oldest first
+
+        One UPDATE ... RETURNING, so two workers can never claim the same
+        message; on Postgres the candidates are picked with SKIP LOCKED so
+        concurrent workers take different rows instead of waiting.
+        """
+        skip_locked = " FOR UPDATE OF m SKIP LOCKED" if self.engine.dialect.name == "postgresql" else ""
+        now = _utcnow()
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    f"UPDATE {self.messages_table} SET status = 'sending', lease_until = :lease_until "
+                    "WHERE message_id IN ("
+                    f"SELECT m.message_id FROM {self.messages_table} m JOIN {self.jobs_table} j ON j.job_id = m.job_id "
+                    "WHERE m.channel = :channel AND NOT j.cancelled AND ("
+                    "(m.status = 'pending' AND m.next_attempt_at <= :now) OR (m.status = 'sending' AND m.lease_until <= :now)) "
+                    f"ORDER BY m.next_attempt_at LIMIT :limit{skip_locked}) "
+                    "RETURNING message_id, recipient, subject, body, attempts, next_attempt_at"
+                ),
+                {"channel": channel, "now": now, "limit": limit, "lease_until": now + timedelta(seconds=LEASE_SECONDS)},
+            ).mappings().all()
+        rows = sorted(rows, key=lambda row: row["next_attempt_at"])
+        return [{key: row[key] for key in ("message_id", "recipient", "subject", "body", "attempts")} for row in rows]
+
+    def complete(self, sent: List[str], failed: Dict[str, Tuple[int, str]]) -> None:
+        """Record a batch: sent message ids, and failed ids -> (attempts so far, error)"""
+        now = _utcnow()
+        with self.engine.begin() as conn:
+            if sent:
+                conn.execute(
+                    text(
+                        f"UPDATE {self.messages_table} SET status = 'sent', attempts = attempts + 1, sent_at = :now, "
+                        "last_error = NULL, lease_until = NULL WHERE message_id = :message_id"
+                    ),
+                    [{"message_id": message_id, "now": now} for message_id in sent],
+                )
+            for message_id, (attempts, error) in failed.items():
+                attempts += 1
+                if attempts >= MAX_ATTEMPTS:
+                    status, next_attempt_at = "failed", now
+                else:
+                    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+                    status, next_attempt_at = "pending", now + timedelta(seconds=delay)
+                conn.execute(
+                    text(
+                        f"UPDATE {self.messages_table} SET status = :status, attempts = :attempts, "
+                        "next_attempt_at = :next_attempt_at, last_error = :error, lease_until = NULL WHERE message_id = :message_id"
+                    ),
+                    {"status": status, "attempts": attempts, "next_attempt_at": next_attempt_at,
+                     "error": error[:500], "message_id": message_id},
+                )
+
+    def cancel(self, job_id: str) -> bool:
+        with self.engine.begin() as conn:
+            result = conn.execute(text(f"UPDATE {self.jobs_table} SET cancelled = TRUE WHERE job_id = :job_id"), {"job_id": job_id})
+            return result.rowcount > 0
+
+    def progress(self, job_id: str) -> Optional[dict]:
+        with self.engine.connect() as conn:
+            job = conn.execute(text(f"SELECT * FROM {self.jobs_table} WHERE job_id = :job_id"), {"job_id": job_id}).mappings().first()
+            if job is None:
+                return None
+            counts = dict(conn.execute(
+                text(f"SELECT status, COUNT(*) FROM {self.messages_table} WHERE job_id = :job_id GROUP BY status"),
+                {"job_id": job_id},
+            ).all())
+            errors = conn.execute(
+                text(
+                    f"SELECT acc_no, recipient, last_error, attempts FROM {self.messages_table} "
+                    "WHERE job_id = :job_id AND last_error IS NOT NULL ORDER BY acc_no LIMIT 50"
+                ),
+                {"job_id": job_id},
+            ).mappings().all()
+        return self._job_dict(job, counts, [dict(e) for e in errors])
+
+    def list_jobs(self, pharmacy_id: int, limit: int = 20) -> List[dict]:
+        with self.engine.connect() as conn:
+            jobs = conn.execute(
+                text(f"SELECT * FROM {self.jobs_table} WHERE pharmacy_id = :pharmacy_id ORDER BY created_at DESC LIMIT :limit"),
+                {"pharmacy_id": pharmacy_id, "limit": limit},
+            ).mappings().all()
+            result = []
+            for job in jobs:
+                counts = dict(conn.execute(
+                    text(f"SELECT status, COUNT(*) FROM {self.messages_table} WHERE job_id = :job_id GROUP BY status"),
+                    {"job_id": job["job_id"]},
+                ).all())
+                result.append(self._job_dict(job, counts))
+        return result
+
+    @staticmethod
+    def _job_dict(job, counts: dict, errors: Optional[list] = None) -> dict:
+        sent = counts.get("sent", 0)
+        failed = counts.get("failed", 0)
+        remaining = counts.get("pending", 0) + counts.get("sending", 0)
+        created_at = job["created_at"]
+        result = {
+            "job_id": job["job_id"],
+            "pharmacy_id": job["pharmacy_id"],
+            "channel": job["channel"],
+            "created_by": job["created_by"],
+            "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
+            "total": job["total"],
+            "skipped": job["skipped"],
+            "sent": sent,
+            "failed": failed,
+            "remaining": remaining,
+            "cancelled": bool(job["cancelled"]),
+            "done": remaining == 0 or bool(job["cancelled"]),
+            "percent": round(100.0 * (sent + failed) / job["total"], 1) if job["total"] else 100.0,
+        }
+        if errors is not None:
+            result["errors"] = errors
+        return result
+
+
+class RateLimiter:
+    """Token bucket: ``rate_per_min`` tokens per minute, bursting up to ``burst``"""
+
+    def __init__(self, rate_per_min: float, burst: int) -> None:
+        if not rate_per_min > 0:
+            raise ValueError(f"rate_per_min must be positive, got {rate_per_min}")
+        self.rate = rate_per_min / 60.0
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, wanted: int) -> int:
+        """Wait until at least one token is available and take up to wanted"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                granted = min(wanted, int(self.tokens))
+                self.tokens -= granted
+                return granted
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def give_back(self, count: int) -> None:
+        self.tokens = min(self.burst, self.tokens + count)
+
+
+class LogSender:
+    """Stand-in sender that writes messages to the log instead of delivering them"""
+
+    def __init__(self, channel: str) -> None:
+        self.channel = channel
+
+    def send_batch(self, messages: List[dict]) -> Dict[str, str]:
+        for message in messages:
+            print(f"[DEBUG] Reminder {self.channel} to {message['recipient']}: {message['subject'] or message['body'][:80]}")
+        return {}
+
+
+class SMTPSender:
+    """Sends a batch of emails over a single SMTP connection"""
+
+    def __init__(self, host: str, port: int, sender: str, user: str = "", password: str = "", starttls: bool = True) -> None:
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+
+    @classmethod
+    def from_env(cls) -> "SMTPSender":
+        return cls(
+            host=os.getenv("SMTP_HOST", ""),
+            port=int(os.getenv("SMTP_PORT", "587")),
+            sender=os.getenv("SMTP_FROM", "noreply@pharmasight.local"),
+            user=os.getenv("SMTP_USER", ""),
+            password=os.getenv("SMTP_PASSWORD", ""),
+            starttls=os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+        )
+
+    def send_batch(self, messages: List[dict]) -> Dict[str, str]:
+        """Returns message_id -> error for messages that were not accepted
+
+        A message the server refuses fails on its own. If the connection is
+        lost partway, only the messages not yet accepted are reported as
+        failed; the ones before it were delivered and stay sent.
+        """
+        errors = {}
+        remaining = list(messages)
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+                if self.starttls:
+                    smtp.starttls()
+                if self.user:
+                    smtp.login(self.user, self.password)
+                while remaining:
+                    message = remaining[0]
+                    email = EmailMessage()
+                    email["From"] = self.sender
+                    email["To"] = message["recipient"]
+                    email["Subject"] = message["subject"] or ""
+                    email.set_content(message["body"], subtype="html")
+                    try:
+                        smtp.send_message(email)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                        errors[message["message_id"]] = str(e)
+                    remaining.pop(0)
+        except OSError as e:
+            # smtplib errors are OSErrors too: connection, TLS or login failures
+            for message in remaining:
+                errors[message["message_id"]] = str(e)
+        return errors
+
+
+class HTTPSMSSender:
+    """Posts a batch of SMS messages to an HTTP gateway in one request"""
+
+    def __init__(self, url: str, api_key: str = "") -> None:
+        self.url = url
+        self.api_key = api_key
+
+    def send_batch(self, messages: List[dict]) -> Dict[str, str]:
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        payload = {"messages": [{"id": m["message_id"], "to": m["recipient"], "body": m["body"]} for m in messages]}
+        resp = httpx.post(self.url, json=payload, headers=headers, timeout=30)
+        resp.raise_for_status()
+        data = resp.json() if resp.content else {}
+        # Gateways may report per-message failures as {"errors": {id: reason}}
+        return dict(data.get("errors") or {}) if isinstance(data, dict) else {}
+
+
+def sender_from_env(channel: str):
+    if channel == "email" and os.getenv("SMTP_HOST"):
+        return SMTPSender.from_env()
+    if channel == "sms" and os.getenv("SMS_API_URL"):
+        return HTTPSMSSender(os.getenv("SMS_API_URL", ""), os.getenv("SMS_API_KEY", ""))
+    return LogSender(channel)
+
+
+class ReminderWorker:
+    """Drains one channel of the queue in rate-limited batches"""
+
+    def __init__(self, queue: ReminderQueue, channel: str, sender, rate_per_min: float, batch_size: int, idle_seconds: float = 5) -> None:
+        self.queue = queue
+        self.channel = channel
+        self.sender = sender
+        self.batch_size = batch_size
+        self.limiter = RateLimiter(rate_per_min, burst=batch_size)
+        self.idle_seconds = idle_seconds
+        self.sent = 0
+        self.failed_attempts = 0
+
+    @classmethod
+    def from_env(cls, queue: ReminderQueue, channel: str) -> "ReminderWorker":
+        prefix = channel.upper()
+        return cls(
+            queue,
+            channel,
+            sender_from_env(channel),
+            rate_per_min=float(os.getenv(f"{prefix}_RATE_PER_MIN", "60" if channel == "email" else "30")),
+            batch_size=int(os.getenv(f"{prefix}_BATCH_SIZE", "20" if channel == "email" else "50")),
+        )
+
+    async def run_once(self) -> int:
+        """Send one batch if anything is due; returns the number of messages attempted"""
+        granted = await self.limiter.acquire(self.batch_size)
+        batch = await run_in_threadpool(self.queue.claim, self.channel, granted)
+        if len(batch) < granted:
+            self.limiter.give_back(granted - len(batch))
+        if not batch:
+            return 0
+
+        try:
+            errors = await run_in_threadpool(self.sender.send_batch, batch)
+        except Exception as e:
+            # Nothing in the batch was accepted (e.g. the SMS gateway rejected the request): retry all of it
+            errors = {message["message_id"]: str(e) for message in batch}
+
+        sent = [m["message_id"] for m in batch if m["message_id"] not in errors]
+        failed = {m["message_id"]: (m["attempts"], errors[m["message_id"]]) for m in batch if m["message_id"] in errors}
+        await run_in_threadpool(self.queue.complete, sent, failed)
+        self.sent += len(sent)
+        self.failed_attempts += len(failed)
+        if failed:
+            print(f"[WARNING] Reminder {self.channel} batch: {len(failed)} of {len(batch)} failed")
+        return len(batch)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if not await self.run_once():
+                    await asyncio.sleep(self.idle_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ERROR] Reminder {self.channel} worker: {e}")
+                await asyncio.sleep(self.idle_seconds)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "sender": type(self.sender).__name__,
+            "batch_size": self.batch_size,
+            "rate_per_min": round(self.limiter.rate * 60, 2),
+            "sent": self.sent,
+            "failed_attempts": self.failed_attempts,
+        }
@@ -0,0 +1,125 @@
+import math
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+REORDER_SORT_COLUMNS = (
+    "days_of_cover",
+    "on_hand",
+    "avg_daily_usage",
+    "reorder_qty",
+    "product_code",
+    "description",
+)
+
+
+def build_reorder_base(
+    usage_items: Iterable[dict],
+    on_hand: Dict[str, float],
+    descriptions: Optional[Dict[str, str]] = None,
+    drop_missing_on_hand: bool = False,
+) -> pd.DataFrame:
+    """Join 180-day average daily usage with on-hand per product.
+
+    Stocked products missing from the usage list get zero usage, so stock
+    that never sells is kept (it is what dead-stock detection needs). Selling
+    products missing from ``on_hand`` get zero on-hand, or are dropped with
+    ``drop_missing_on_hand`` when ``on_hand`` is known to be incomplete.
+    """
+    usage = pd.DataFrame(
+        [
+            {
+                "product_code": str(u.get("product_code") or ""),
+                "description": u.get("description") or u.get("product_name") or "",
+                "avg_daily_usage": u.get("avg_qty_180d"),
+            }
+            for u in usage_items
+            if u and u.get("product_code")
+        ],
+        columns=["product_code", "description", "avg_daily_usage"],
+    )
+    stock = pd.DataFrame({
+        "product_code": pd.Series(list(on_hand.keys()), dtype="object"),
+        "on_hand": pd.Series(list(on_hand.values()), dtype="float64"),
+    })
+
+    base = usage.drop_duplicates("product_code").merge(stock, on="product_code", how="outer")
+    if drop_missing_on_hand:
+        base = base.loc[base["on_hand"].notna()].copy()
+    base["avg_daily_usage"] = pd.to_numeric(base["avg_daily_usage"], errors="coerce").fillna(0.0)
+    base["on_hand"] = pd.to_numeric(base["on_hand"], errors="coerce").fillna(0.0)
+    base["description"] = base["description"].fillna("")
+    if descriptions:
+        missing = base["description"] == ""
+        base.loc[missing, "description"] = base.loc[missing, "product_code"].map(descriptions).fillna("")
+    return base.reset_index(drop=True)
+
+
+def compute_reorder_frame(
+    base: pd.DataFrame,
+    lead_time_days: float = 7,
+    safety_days: float = 7,
+    target_days: float = 30,
+    dead_stock_days: float = 180,
+) -> pd.DataFrame:
+    """Add days-of-cover, reorder point/quantity and dead-stock flags to a base frame.
+
+    - days_of_cover: on_hand / avg_daily_usage (inf when nothing sells, 0 when negative)
+    - reorder_point: usage over lead time plus safety stock
+    - reorder_qty: units needed to get back up to lead time + target_days of cover
+    - dead_stock: stock on hand that does not sell, or would last beyond dead_stock_days
+    """
+    df = base.copy()
+    usage = df["avg_daily_usage"].to_numpy(dtype="float64")
+    on_hand = df["on_hand"].to_numpy(dtype="float64")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(usage > 0, on_hand / usage, np.inf)
+    cover = np.where(on_hand <= 0, 0.0, cover)
+
+    reorder_point = usage * (lead_time_days + safety_days)
+    order_up_to = usage * (lead_time_days + target_days)
+    needs_reorder = (usage > 0) & (on_hand <= reorder_point)
+
+    df["days_of_cover"] = cover
+    df["reorder_point"] = np.round(reorder_point, 2)
+    df["needs_reorder"] = needs_reorder
+    df["reorder_qty"] = np.where(needs_reorder, np.ceil(np.clip(order_up_to - on_hand, 0, None)), 0.0)
+    df["dead_stock"] = (on_hand > 0) & (cover > dead_stock_days)
+    return df
+
+
+def page_reorder_frame(
+    df: pd.DataFrame,
+    sort: str = "days_of_cover",
+    descending: bool = False,
+    only: str = "all",
+    page: int = 1,
+    page_size: int = 100,
+) -> dict:
+    """Filter, sort and slice a reorder frame into a JSON-ready page"""
+    if only == "reorder":
+        df = df[df["needs_reorder"]]
+    elif only == "dead":
+        df = df[df["dead_stock"]]
+
+    df = df.sort_values([sort, "product_code"], ascending=[not descending, True], kind="stable")
+    start = (page - 1) * page_size
+    items = df.iloc[start:start + page_size].to_dict("records")
+    for item in items:
+        # JSON has no infinity; products with no usage have unbounded cover
+        if math.isinf(item["days_of_cover"]):
+            item["days_of_cover"] = None
+        else:
+            item["days_of_cover"] = round(item["days_of_cover"], 1)
+        item["needs_reorder"] = bool(item["needs_reorder"])
+        item["dead_stock"] = bool(item["dead_stock"])
+
+    return {
+        "total": int(len(df)),
+        "page": page,
+        "page_size": page_size,
+        "items": items,
+    }
@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+
+DateRange = Tuple[date, date]
+
+
+class _SalesEntry:
+    __slots__ = ("intervals", "points", "meta", "daily_key")
+
+    def __init__(self) -> None:
+        # Sorted, non-overlapping, non-adjacent [start, end] ranges already fetched
+        self.intervals: List[List[date]] = []
+        # Daily sales points keyed by business date
+        self.points: Dict[date, dict] = {}
+        # Non-daily fields from the latest upstream payload (product name, code, ...)
+        self.meta: dict = {}
+        # Key holding the daily list in the upstream payload, None if it was a bare list
+        self.daily_key: Optional[str] = None
+
+
+class ProductSalesCache:
+    """Interval-merging cache of daily sales points per (pharmacy, product).
+
+    Only closed days should be stored: the caller fetches the missing
+    sub-intervals from upstream, stores them, and assembles any window from
+    the cached segments. Entries are evicted least-recently-used once
+    ``max_products`` products are held. Products whose payload has no
+    per-day rows are remembered as pass-through, so they skip the cache.
+    """
+
+    def __init__(self, max_products: int = 2000) -> None:
+        self.max_products = max_products
+        self._entries: "OrderedDict[Tuple[int, str], _SalesEntry]" = OrderedDict()
+        self._passthrough: "OrderedDict[Tuple[int, str], None]" = OrderedDict()
+
+    def mark_passthrough(self, pharmacy_id: int, product_code: str) -> None:
+        key = (pharmacy_id, product_code)
+        self._entries.pop(key, None)
+        self._passthrough[key] = None
+        self._passthrough.move_to_end(key)
+        while len(self._passthrough) > self.max_products:
+            self._passthrough.popitem(last=False)
+
+    def is_passthrough(self, pharmacy_id: int, product_code: str) -> bool:
+        return (pharmacy_id, product_code) in self._passthrough
+
+    def _get(self, pharmacy_id: int, product_code: str, create: bool = False) -> Optional[_SalesEntry]:
+        key = (pharmacy_id, product_code)
+        entry = self._entries.get(key)
+        if entry is None and create:
+            entry = _SalesEntry()
+            self._entries[key] = entry
+            while len(self._entries) > self.max_products:
+                self._entries.popitem(last=False)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def missing_ranges(self, pharmacy_id: int, product_code: str, start: date, end: date) -> List[DateRange]:
+        """Return the sub-ranges of [start, end] that are not cached yet"""
+        entry = self._get(pharmacy_id, product_code)
+        if entry is None:
+            return [(start, end)]
+
+        missing = []
+        cursor = start
+        for iv_start, iv_end in entry.intervals:
+            if iv_end < cursor:
+                continue
+            if iv_start > end:
+                break
+            if iv_start > cursor:
+                missing.append((cursor, iv_start - timedelta(days=1)))
+            cursor = max(cursor, iv_end + timedelta(days=1))
+            if cursor > end:
+                break
+        if cursor <= end:
+            missing.append((cursor, end))
+        return missing
+
+    def store(
+        self, pharmacy_id: int, product_code: str, start: date, end: date, points: Dict[date, dict],
+        meta: Optional[dict] = None, daily_key: Optional[str] = None,
+    ) -> None:
+        """Record [start, end] as covered, with the daily points found in it"""
+        entry = self._get(pharmacy_id, product_code, create=True)
+        for day, point in points.items():
+            if start <= day <= end:
+                entry.points[day] = point
+        if meta:
+            entry.meta = meta
+        entry.daily_key = daily_key
+
+        # Insert and merge overlapping or adjacent intervals
+        intervals = sorted(entry.intervals + [[start, end]])
+        merged: List[List[date]] = []
+        for iv_start, iv_end in intervals:
+            if merged and iv_start <= merged[-1][1] + timedelta(days=1):
+                merged[-1][1] = max(merged[-1][1], iv_end)
+            else:
+                merged.append([iv_start, iv_end])
+        entry.intervals = merged
+
+    def assemble(self, pharmacy_id: int, product_code: str, start: date, end: date) -> Tuple[List[dict], dict, Optional[str]]:
+        """Return the cached daily points in [start, end] (sorted), the product meta and the daily key"""
+        entry = self._get(pharmacy_id, product_code)
+        if entry is None:
+            return [], {}, None
+        days = sorted(day for day in entry.points if start <= day <= end)
+        return [entry.points[day] for day in days], dict(entry.meta), entry.daily_key
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._passthrough.clear()
@@ -0,0 +1,355 @@
+"""
+Server-side sessions: the cookie carries only an opaque random id, the data
+lives in an in-process LRU backed by a SQLAlchemy table, so several workers
+can share sessions.
+
+Drop-in for Starlette's SessionMiddleware (``request.session`` works the
+same), but requests carry a ~45 byte cookie instead of the signed payload,
+and nothing is signed or serialized unless the session actually changed.
+Static paths skip the session entirely.
+
+Only worth enabling with a database every worker and instance can reach:
+app/main.py uses it when SESSION_STORE_URL names a non-SQLite database (or
+SESSION_BACKEND=server) and the signed-cookie SessionMiddleware otherwise.
+
+Configuration (environment):
+    SESSION_STORE_URL: SQLAlchemy URL of the session database (default sqlite:///data/sessions.db)
+    SESSION_CACHE_TTL: seconds a session stays in the in-process cache (default 60);
+        keeps a write in another worker visible within that time
+    SESSION_AUTH_CACHE_TTL: the same for sessions of a signed-in user (default 5),
+        so a logout in one worker reaches the others quickly
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import time
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from .cache import TTLCache
+
+# Session keys that identify the signed-in user; sessions holding them are cached briefly
+AUTH_KEYS = ("user_id", "username", "auth_token")
+
+
+def _tracked(value, on_change):
+    """Copy of a list/dict value (recursively) that calls on_change when mutated in place"""
+    if isinstance(value, dict):
+        return _TrackedDict(on_change, value)
+    if isinstance(value, list):
+        return _TrackedList(on_change, value)
+    return value
+
+
+class _TrackedDict(dict):
+    def __init__(self, on_change, value=()) -> None:
+        self._on_change = on_change
+        super().__init__((k, _tracked(v, on_change)) for k, v in dict(value).items())
+
+    def __setitem__(self, key, value) -> None:
+        self._on_change()
+        super().__setitem__(key, _tracked(value, self._on_change))
+
+    def __delitem__(self, key) -> None:
+        self._on_change()
+        super().__delitem__(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        if key in self:
+            self._on_change()
+        return super().pop(key, *default)
+
+    def popitem(self):
+        if self:
+            self._on_change()
+        return super().popitem()
+
+    def clear(self) -> None:
+        if self:
+            self._on_change()
+        super().clear()
+
+
+class _TrackedList(list):
+    def __init__(self, on_change, value=()) -> None:
+        self._on_change = on_change
+        super().__init__(_tracked(v, on_change) for v in value)
+
+    def __setitem__(self, index, value) -> None:
+        self._on_change()
+        if isinstance(index, slice):
+            value = [_tracked(v, self._on_change) for v in value]
+        else:
+            value = _tracked(value, self._on_change)
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index) -> None:
+        self._on_change()
+        super().__delitem__(index)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __imul__(self, count):
+        self._on_change()
+        return super().__imul__(count)
+
+    def append(self, value) -> None:
+        self._on_change()
+        super().append(_tracked(value, self._on_change))
+
+    def extend(self, values) -> None:
+        self._on_change()
+        super().extend(_tracked(v, self._on_change) for v in values)
+
+    def insert(self, index, value) -> None:
+        self._on_change()
+        super().insert(index, _tracked(value, self._on_change))
+
+    def pop(self, *args):
+        self._on_change()
+        return super().pop(*args)
+
+    def remove(self, value) -> None:
+        self._on_change()
+        super().remove(value)
+
+    def clear(self) -> None:
+        self._on_change()
+        super().clear()
+
+    def sort(self, *args, **kwargs) -> None:
+        self._on_change()
+        super().sort(*args, **kwargs)
+
+    def reverse(self) -> None:
+        self._on_change()
+        super().reverse()
+
+
+class SessionData(_TrackedDict):
+    """Session dict that can tell whether it was changed during the request
+
+    Writes set a dirty flag instead of comparing serialized copies. Nested
+    lists and dicts are copied into tracking wrappers when the session is
+    loaded, so changing them in place counts too. Writing a top-level key
+    with the value it already has is not a change.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.modified = False
+        super().__init__(self._changed, dict(*args, **kwargs))
+
+    def _changed(self) -> None:
+        self.modified = True
+
+    def __setitem__(self, key, value) -> None:
+        if key in self and self[key] == value:
+            return
+        super().__setitem__(key, value)
+
+
+def _storage_key(session_id: str) -> str:
+    # Only a hash of the id is stored, so a copy of the table cannot be replayed as cookies
+    return hashlib.sha256(session_id.encode()).hexdigest()
+
+
+class SessionStore:
+    """Sessions in a ``web_sessions`` table, fronted by TTL LRU caches
+
+    A session holding any of AUTH_KEYS is cached for ``auth_cache_ttl``
+    only, so a logout or account switch in another worker is seen within
+    a few seconds; other sessions are cached for ``cache_ttl``.
+    """
+
+    def __init__(
+        self, engine: Engine, max_age: int, cache_size: int = 4096, cache_ttl: float = 60, auth_cache_ttl: float = 5
+    ) -> None:
+        self.engine = engine
+        self.max_age = max_age
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._auth_cache = TTLCache(maxsize=cache_size, ttl=min(auth_cache_ttl, cache_ttl))
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @classmethod
+    def from_env(cls, max_age: int) -> "SessionStore":
+        url = os.getenv("SESSION_STORE_URL", "sqlite:///data/sessions.db")
+        if url.startswith("sqlite:///"):
+            directory = os.path.dirname(url[len("sqlite:///"):])
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            engine = create_engine(url, connect_args={"check_same_thread": False})
+        else:
+            engine = create_engine(url, pool_pre_ping=True)
+        return cls(
+            engine,
+            max_age,
+            cache_ttl=float(os.getenv("SESSION_CACHE_TTL", "60")),
+            auth_cache_ttl=float(os.getenv("SESSION_AUTH_CACHE_TTL", "5")),
+        )
+
+    def create_tables(self) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                """
+                CREATE TABLE IF NOT EXISTS web_sessions (
+                    session_key VARCHAR(64) PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    expires_at DOUBLE PRECISION NOT NULL
+                )
+                """
+            ))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_web_sessions_expires ON web_sessions (expires_at)"))
+
+    def purge_expired(self) -> int:
+        with self.engine.begin() as conn:
+            return conn.execute(text("DELETE FROM web_sessions WHERE expires_at <= :now"), {"now": time.time()}).rowcount
+
+    def _load_row(self, key: str) -> Optional[Tuple[dict, float]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT data, expires_at FROM web_sessions WHERE session_key = :key"), {"key": key}
+            ).first()
+        return (json.loads(row[0]), float(row[1])) if row else None
+
+    def _save_row(self, key: str, data: dict, expires_at: float) -> None:
+        params = {"key": key, "data": json.dumps(data), "expires_at": expires_at}
+        with self.engine.begin() as conn:
+            updated = conn.execute(
+                text("UPDATE web_sessions SET data = :data, expires_at = :expires_at WHERE session_key = :key"), params
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    text("INSERT INTO web_sessions (session_key, data, expires_at) VALUES (:key, :data, :expires_at)"), params
+                )
+
+    def _delete_row(self, key: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM web_sessions WHERE session_key = :key"), {"key": key})
+
+    def _remember(self, key: str, entry: Tuple[dict, float]) -> None:
+        if any(name in entry[0] for name in AUTH_KEYS):
+            self._cache.pop(key)
+            self._auth_cache.set(key, entry)
+        else:
+            self._auth_cache.pop(key)
+            self._cache.set(key, entry)
+
+    async def load(self, session_id: str) -> Optional[Tuple[dict, float]]:
+        """(data, expires_at) for a live session, or None"""
+        key = _storage_key(session_id)
+        entry = self._auth_cache.get(key) or self._cache.get(key)
+        if entry is None:
+            self.misses += 1
+            # Unknown ids are cached as already expired, so a stale cookie costs one query
+            entry = await run_in_threadpool(self._load_row, key) or ({}, 0.0)
+            self._remember(key, entry)
+        else:
+            self.hits += 1
+        data, expires_at = entry
+        if expires_at <= time.time():
+            return None
+        return dict(data), expires_at
+
+    async def save(self, session_id: str, data: dict) -> float:
+        key = _storage_key(session_id)
+        expires_at = time.time() + self.max_age
+        data = dict(data)
+        await run_in_threadpool(self._save_row, key, data, expires_at)
+        self._remember(key, (data, expires_at))
+        self.writes += 1
+        return expires_at
+
+    async def delete(self, session_id: str) -> None:
+        key = _storage_key(session_id)
+        self._cache.pop(key)
+        self._auth_cache.pop(key)
+        await run_in_threadpool(self._delete_row, key)
+
+    @property
+    def stats(self) -> dict:
+        return {"cached": len(self._cache) + len(self._auth_cache), "hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+
+class ServerSessionMiddleware:
+    """ASGI middleware putting a SessionData backed by a SessionStore in scope["session"]
+
+    The store is only written when the session changed, or to slide the
+    expiry once less than half of max_age is left. A cookie naming an
+    unknown or expired session is never reused; a fresh id is issued when
+    data is first written.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: SessionStore,
+        session_cookie: str = "session",
+        https_only: bool = False,
+        same_site: str = "lax",
+        skip_paths: Sequence[str] = (),
+    ) -> None:
+        self.app = app
+        self.store = store
+        self.session_cookie = session_cookie
+        self.skip_paths = tuple(skip_paths)
+        self.cookie_flags = f"path=/; httponly; samesite={same_site}" + ("; secure" if https_only else "")
+
+    def _cookie(self, value: str, max_age: int) -> str:
+        return f"{self.session_cookie}={value}; Max-Age={max_age}; {self.cookie_flags}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        if scope["path"].startswith(self.skip_paths):
+            scope["session"] = SessionData()
+            await self.app(scope, receive, send)
+            return
+
+        session_id = HTTPConnection(scope).cookies.get(self.session_cookie)
+        loaded = await self.store.load(session_id) if session_id else None
+        if loaded is None:
+            session_id = None
+            session, expires_at = SessionData(), None
+        else:
+            session, expires_at = SessionData(loaded[0]), loaded[1]
+        scope["session"] = session
+
+        async def send_wrapper(message):
+            nonlocal session_id
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                modified = session.modified
+                if modified and session:
+                    session_id = session_id or secrets.token_urlsafe(32)
+                    await self.store.save(session_id, session)
+                    headers.append("Set-Cookie", self._cookie(session_id, self.store.max_age))
+                elif modified and session_id:
+                    await self.store.delete(session_id)
+                    headers.append("Set-Cookie", self._cookie("null", 0))
+                elif session_id and expires_at - time.time() < self.store.max_age / 2:
+                    await self.store.save(session_id, session)
+                    headers.append("Set-Cookie", self._cookie(session_id, self.store.max_age))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,119 @@
+import os
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+
+class AlertSnapshot:
+    """One day's product alert list stored column-wise.
+
+    ``codes`` is sorted and unique so day-over-day diffs can use NumPy set
+    operations directly.
+    """
+
+    __slots__ = ("codes", "descriptions", "values")
+
+    def __init__(self, codes: np.ndarray, descriptions: np.ndarray, values: np.ndarray) -> None:
+        self.codes = codes
+        self.descriptions = descriptions
+        self.values = values
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, str, float]]) -> "AlertSnapshot":
+        seen = {}
+        for code, description, value in rows:
+            if code and code not in seen:
+                seen[code] = (description or "", float(value or 0))
+        codes = np.array(sorted(seen), dtype=np.str_)
+        descriptions = np.array([seen[c][0] for c in codes], dtype=np.str_)
+        values = np.array([seen[c][1] for c in codes], dtype=np.float64)
+        return cls(codes, descriptions, values)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class AlertSnapshotStore:
+    """Per-pharmacy daily snapshots of alert lists (negative SOH, low GP).
+
+    Each snapshot is a compressed .npz of three columns under
+    ``<directory>/<kind>/<pharmacy_id>/<date>.npz``, fronted by a small LRU.
+    """
+
+    def __init__(self, directory: str, memory_items: int = 256) -> None:
+        self.directory = directory
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[tuple, AlertSnapshot]" = OrderedDict()
+
+    def _path(self, kind: str, pharmacy_id: int, snapshot_date: str) -> str:
+        return os.path.join(self.directory, kind, str(pharmacy_id), f"{snapshot_date}.npz")
+
+    def _remember(self, key: tuple, snapshot: AlertSnapshot) -> None:
+        self._memory[key] = snapshot
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _write(path: str, snapshot: AlertSnapshot) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, codes=snapshot.codes, descriptions=snapshot.descriptions, values=snapshot.values)
+        os.replace(tmp_path, path)
+
+    async def save(self, kind: str, pharmacy_id: int, snapshot_date: str, snapshot: AlertSnapshot) -> None:
+        # Compressing and writing happen in a worker thread, off the event loop
+        await run_in_threadpool(self._write, self._path(kind, pharmacy_id, snapshot_date), snapshot)
+        self._remember((kind, pharmacy_id, snapshot_date), snapshot)
+
+    def load(self, kind: str, pharmacy_id: int, snapshot_date: str) -> Optional[AlertSnapshot]:
+        key = (kind, pharmacy_id, snapshot_date)
+        snapshot = self._memory.get(key)
+        if snapshot is not None:
+            self._memory.move_to_end(key)
+            return snapshot
+
+        path = self._path(kind, pharmacy_id, snapshot_date)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            snapshot = AlertSnapshot(data["codes"], data["descriptions"], data["values"])
+        self._remember(key, snapshot)
+        return snapshot
+
+
+def diff_snapshots(old: AlertSnapshot, new: AlertSnapshot) -> dict:
+    """Items added, resolved and worsened between two snapshots (lower value is worse)"""
+    added = ~np.isin(new.codes, old.codes, assume_unique=True)
+    resolved = ~np.isin(old.codes, new.codes, assume_unique=True)
+    _, old_idx, new_idx = np.intersect1d(old.codes, new.codes, assume_unique=True, return_indices=True)
+    change = new.values[new_idx] - old.values[old_idx]
+    worse = change < 0
+    old_idx, new_idx, change = old_idx[worse], new_idx[worse], change[worse]
+
+    # Biggest deterioration first
+    order = np.argsort(change, kind="stable")
+    old_idx, new_idx, change = old_idx[order], new_idx[order], change[order]
+
+    return {
+        "added": [
+            {"product_code": str(c), "description": str(d), "value": float(v)}
+            for c, d, v in zip(new.codes[added], new.descriptions[added], new.values[added])
+        ],
+        "resolved": [
+            {"product_code": str(c), "description": str(d), "value": float(v)}
+            for c, d, v in zip(old.codes[resolved], old.descriptions[resolved], old.values[resolved])
+        ],
+        "worsened": [
+            {
+                "product_code": str(new.codes[n]),
+                "description": str(new.descriptions[n]),
+                "previous": float(old.values[o]),
+                "value": float(new.values[n]),
+                "change": round(float(ch), 2),
+            }
+            for o, n, ch in zip(old_idx, new_idx, change)
+        ],
+    }
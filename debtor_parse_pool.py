@@ -0,0 +1,422 @@
+"""
+Debtor Parse Pool - Process-pool execution for debtor PDF parsing
+
+extract_debtors_strictest_names is CPU-bound pandas/PDF work. Running it
+inside an async request handler blocks the event loop for every other user,
+so uploads are parsed in a small pool of worker processes instead.
+
+Usage:
+    from debtor_parse_pool import DebtorParsePool, ParseQueueFull, ParseTimeout
+
+    pool = DebtorParsePool(max_workers=1, max_backlog=4, timeout=120)
+
+    # Inside an async handler
+    result = await pool.parse(upload.file, pharmacy_id=1)
+
+    # Or stream records page range by page range
+    async for step in pool.stream(upload.file, pharmacy_id=1):
+        ...
+
+    # On shutdown
+    pool.shutdown()
+
+Configuration (environment, used by DebtorParsePool.from_env):
+    DEBTOR_PARSE_WORKERS: worker processes (default 1)
+    DEBTOR_PARSE_MAX_BACKLOG: jobs allowed to wait for a worker (default 4)
+    DEBTOR_PARSE_TIMEOUT: seconds before a job's worker is killed and the job reported as timed out (default 120)
+    DEBTOR_STREAM_PAGES: pages parsed per step when streaming (default 5)
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+
+class ParseQueueFull(Exception):
+    """Raised when every worker is busy and the backlog is full"""
+
+
+class ParseTimeout(Exception):
+    """Raised when a parse job does not finish within the configured timeout"""
+
+
+def _parse_in_worker(pdf_path: str, pharmacy_id: int, lean: bool) -> Dict[str, Any]:
+    # Imported in the worker so the web process never loads the PDF stack
+    from debtor_pdf_parser import parse_debtor_pdf
+    return parse_debtor_pdf(pdf_path, pharmacy_id, lean=lean)
+
+
+# Worker-process state: open readers of the reports being streamed, by stream
+# token, so each worker parses a report's page tree once rather than per range
+_stream_readers: "OrderedDict[str, Tuple[BinaryIO, Any]]" = OrderedDict()
+STREAM_READERS_KEPT = 2
+
+
+def _stream_reader(token: str, pdf_path: str):
+    from pypdf import PdfReader
+
+    if token in _stream_readers:
+        _stream_readers.move_to_end(token)
+        return _stream_readers[token][1]
+    # An open handle, not the path: PdfReader would read a path into memory whole
+    handle = open(pdf_path, "rb")
+    _stream_readers[token] = (handle, PdfReader(handle))
+    while len(_stream_readers) > STREAM_READERS_KEPT:
+        _, (old_handle, _) = _stream_readers.popitem(last=False)
+        old_handle.close()
+    return _stream_readers[token][1]
+
+
+def _count_pages_in_worker(token: str, pdf_path: str) -> int:
+    return len(_stream_reader(token, pdf_path).pages)
+
+
+def _parse_page_range_in_worker(
+    token: str, pdf_path: Optional[str], start: int, count: int, pharmacy_id: int, carry: Optional[dict]
+) -> Tuple[list, Optional[dict]]:
+    # The range is cut from the report here, so only this range is ever in memory
+    from debtor_pdf_pages import reader_pages_to_pdf
+    from debtor_pdf_parser import parse_debtor_page_chunk
+    if pdf_path:
+        chunk_bytes = reader_pages_to_pdf(_stream_reader(token, pdf_path), start, count)
+    else:
+        entry = _stream_readers.pop(token, None)
+        if entry is not None:
+            entry[0].close()
+        chunk_bytes = None
+    return parse_debtor_page_chunk(chunk_bytes, pharmacy_id, carry)
+
+
+def _spool_pdf(pdf: Union[bytes, BinaryIO]) -> str:
+    with tempfile.NamedTemporaryFile(prefix="debtor-", suffix=".pdf", delete=False) as f:
+        if isinstance(pdf, (bytes, bytearray, memoryview)):
+            f.write(pdf)
+        else:
+            pdf.seek(0)
+            shutil.copyfileobj(pdf, f)
+    return f.name
+
+
+def _worker_source(pdf: Union[bytes, BinaryIO]) -> Tuple[str, Callable[[], None]]:
+    """
+    A path worker processes can open for ``pdf``, and the call that releases it.
+
+    A file with a descriptor (an UploadFile's SpooledTemporaryFile, which
+    fileno() moves to disk if it was still in memory) is shared through
+    /proc/<pid>/fd without copying. The descriptor is duplicated, so it stays
+    readable after the upload itself is closed, as it is once a streaming
+    response has started. Bytes, in-memory streams and systems without /proc
+    fall back to a temporary copy.
+    """
+    if not isinstance(pdf, (bytes, bytearray, memoryview)):
+        try:
+            pdf.flush()
+            fd = os.dup(pdf.fileno())
+        except (AttributeError, OSError):
+            fd = None
+        if fd is not None:
+            path = f"/proc/{os.getpid()}/fd/{fd}"
+            if os.path.exists(path):
+                return path, lambda: os.close(fd)
+            os.close(fd)
+    path = _spool_pdf(pdf)
+    return path, lambda: os.unlink(path)
+
+
+class _WorkerKilled(Exception):
+    """Set on a job whose worker was killed because the caller gave up on it"""
+
+
+def _worker_main(conn) -> None:
+    # Runs in a worker process: one job at a time until the pipe closes
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        fn, args = job
+        try:
+            outcome = (True, fn(*args))
+        except Exception as e:
+            outcome = (False, e)
+        try:
+            conn.send(outcome)
+        except Exception as e:
+            # The result or exception could not be pickled
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Worker:
+    """One worker process and the thread that feeds it jobs from the pool queue"""
+
+    def __init__(self, pool: "DebtorParsePool") -> None:
+        self.pool = pool
+        self.process = None
+        self.conn = None
+        self.future: Optional[Future] = None
+        self.killed = False
+        self.thread = threading.Thread(target=self._run, name="debtor-parse-worker", daemon=True)
+        self.thread.start()
+
+    def _start_process(self) -> None:
+        # spawn: forking a process that runs an event loop and DB pool is unsafe
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop_process(self) -> None:
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(5)
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def _run(self) -> None:
+        while True:
+            job = self.pool._jobs.get()
+            if job is None:
+                break
+            future, fn, args = job
+            with self.pool._lock:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.future = future
+            if self.process is None:
+                self._start_process()
+            try:
+                self.conn.send((fn, args))
+                ok, value = self.conn.recv()
+                crashed = False
+            except (EOFError, OSError):
+                ok, value, crashed = False, None, True
+            except Exception as e:
+                # fn or its arguments could not be pickled
+                ok, value, crashed = False, e, False
+            with self.pool._lock:
+                self.future = None
+                killed, self.killed = self.killed, False
+            if killed or crashed:
+                # The next job gets a fresh process
+                self.stop_process()
+                if killed:
+                    value = _WorkerKilled("Debtor parse worker was stopped")
+                else:
+                    value = RuntimeError("Debtor parse worker exited unexpectedly")
+            if ok and not killed:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        self.stop_process()
+
+
+class DebtorParsePool:
+    """
+    Worker processes for debtor parsing with a bounded job queue.
+
+    At most max_workers jobs run at once and max_backlog more may wait;
+    further submissions raise ParseQueueFull immediately. Each worker is a
+    long-lived process that runs one job at a time. A job that exceeds the
+    timeout raises ParseTimeout to the caller, and so does nothing else: a
+    job still waiting is cancelled, and one that is already running has its
+    own worker process killed and replaced. Jobs on other workers carry on.
+    The same happens when the awaiting task is cancelled.
+    """
+
+    def __init__(self, max_workers: int = 1, max_backlog: int = 4, timeout: float = 120, stream_pages: int = 5) -> None:
+        self.max_workers = max(1, max_workers)
+        self.max_backlog = max(0, max_backlog)
+        self.timeout = timeout
+        self.stream_pages = max(1, stream_pages)
+        self._jobs: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._workers: List[_Worker] = []
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self.recycled = 0
+
+    @classmethod
+    def from_env(cls) -> "DebtorParsePool":
+        return cls(
+            max_workers=int(os.getenv("DEBTOR_PARSE_WORKERS", "1")),
+            max_backlog=int(os.getenv("DEBTOR_PARSE_MAX_BACKLOG", "4")),
+            timeout=float(os.getenv("DEBTOR_PARSE_TIMEOUT", "120")),
+            stream_pages=int(os.getenv("DEBTOR_STREAM_PAGES", "5")),
+        )
+
+    def _abandon(self, future: Future) -> None:
+        """Drop a job nobody waits for: cancel it, or kill its worker if it is running"""
+        if future.cancel():
+            return
+        with self._lock:
+            for worker in self._workers:
+                if worker.future is future:
+                    worker.killed = True
+                    if worker.process is not None:
+                        worker.process.terminate()
+                    self.recycled += 1
+                    return
+
+    def _job_done(self, future: Future) -> None:
+        # Called from the worker thread that ran the job
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or isinstance(future.exception(), _WorkerKilled):
+                return
+            if future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_backlog:
+                self.rejected += 1
+                raise ParseQueueFull(f"Debtor parser is busy ({self._pending} jobs queued)")
+            self._pending += 1
+            if not self._workers:
+                self._workers = [_Worker(self) for _ in range(self.max_workers)]
+        future: Future = Future()
+        future.add_done_callback(self._job_done)
+        self._jobs.put((future, fn, args))
+        return future
+
+    def submit(self, fn, *args) -> Future:
+        """Submit any picklable callable, subject to the same backlog limit"""
+        return self._submit(fn, *args)
+
+    async def run(self, fn, *args, timeout: Optional[float] = None) -> Any:
+        """Run fn(*args) in a worker process and await its result"""
+        future = self._submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            self._abandon(future)
+            raise ParseTimeout(f"Debtor parsing took longer than {timeout or self.timeout:.0f}s")
+        except asyncio.CancelledError:
+            # e.g. the client disconnected mid-stream; free the worker for the next upload
+            self._abandon(future)
+            raise
+
+    async def parse(self, pdf: Union[bytes, BinaryIO], pharmacy_id: int, lean: bool = True, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Parse a debtor PDF in a worker process.
+
+        The worker opens the upload's own file (see _worker_source), so the
+        content is neither copied nor pickled across to it.
+
+        Args:
+            pdf: PDF file content as bytes, or a seekable binary file (e.g. UploadFile.file)
+            pharmacy_id: ID of the pharmacy this report belongs to
+            lean: Omit the DataFrame from the result (default True; it would be pickled back otherwise)
+            timeout: Per-job timeout in seconds (defaults to the pool timeout)
+
+        Returns:
+            Same dictionary as parse_debtor_pdf_from_bytes
+        """
+        pdf_path, release = await asyncio.to_thread(_worker_source, pdf)
+        try:
+            return await self.run(_parse_in_worker, pdf_path, pharmacy_id, lean, timeout=timeout)
+        finally:
+            release()
+
+    async def stream(self, pdf: Union[bytes, BinaryIO], pharmacy_id: int, pages_per_chunk: Optional[int] = None, timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Parse a debtor PDF in page ranges, yielding records as each range completes.
+
+        Workers open the upload's own file (see _worker_source); each range is
+        a separate job that cuts its own pages from it, with the PdfReader
+        kept open per worker for the rest of the report. Neither process holds
+        more than one range of extracted pages. The timeout applies per range
+        and other uploads can interleave with a long report. The account at
+        the end of a range is carried into the next job (see
+        parse_debtor_page_chunk).
+
+        Args:
+            pdf: PDF file content as bytes, or a seekable binary file (e.g. UploadFile.file)
+            pharmacy_id: ID of the pharmacy this report belongs to
+            pages_per_chunk: Pages per job (defaults to the pool's stream_pages)
+            timeout: Per-job timeout in seconds (defaults to the pool timeout)
+
+        Yields:
+            Same step dictionaries as iter_debtor_pdf
+        """
+        pages_per_chunk = pages_per_chunk or self.stream_pages
+        pdf_path, release = await asyncio.to_thread(_worker_source, pdf)
+        del pdf
+        token = uuid.uuid4().hex
+        try:
+            total_pages = await self.run(_count_pages_in_worker, token, pdf_path, timeout=timeout)
+
+            carry = None
+            total_accounts = 0
+            total_outstanding = 0.0
+            # A last step without pages flushes the carried account
+            for start in list(range(0, total_pages, pages_per_chunk)) + [None]:
+                debtors, carry = await self.run(
+                    _parse_page_range_in_worker,
+                    token, pdf_path if start is not None else None, start or 0, pages_per_chunk, pharmacy_id, carry,
+                    timeout=timeout,
+                )
+                total_accounts += len(debtors)
+                total_outstanding += sum(debtor["balance"] for debtor in debtors)
+                yield {
+                    "page": min(start + pages_per_chunk, total_pages) if start is not None else total_pages,
+                    "total_pages": total_pages,
+                    "debtors": debtors,
+                    "total_accounts": total_accounts,
+                    "total_outstanding": total_outstanding,
+                    "done": start is None,
+                }
+        finally:
+            release()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "max_backlog": self.max_backlog,
+            "stream_pages": self.stream_pages,
+            "pending": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "rejected": self.rejected,
+            "recycled": self.recycled,
+        }
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job[0].cancel()
+        for _ in workers:
+            self._jobs.put(None)
+        for worker in workers:
+            if wait:
+                worker.thread.join()
+            elif worker.process is not None:
+                worker.process.terminate()
@@ -0,0 +1,207 @@
+"""
+Debtor PDF Pages - Page-range splitting and stitching for parallel extraction
+
+Large debtor reports are split into page ranges that are extracted
+independently (see extract_debtors_parallel in debtor_pdf_parser) and the
+per-range DataFrames are stitched back together here.
+
+An account can straddle a page boundary in two ways:
+- Continuation: the account line is on one page and its remaining lines
+  (rest of the name, email, phone) on the next. The next range then starts
+  with a fragment row that has no acc_no.
+- Split row: the same acc_no is emitted at the end of one range and the start
+  of the next, each with part of the values.
+
+stitch_debtor_chunks folds both back into the owning account, so the result
+matches a single serial pass. DebtorChunkStitcher does the same incrementally
+for streaming, holding back only the last account of each range until the
+next range shows whether it continues.
+"""
+
+import io
+import os
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+
+# Version of the debtor parse output (extraction, stitching and record
+# conversion). Bump it whenever parsed results would change, so cached parses
+# keyed on it are not reused.
+PARSER_VERSION = "2"
+
+
+def _missing(value) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip() == ''
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def count_pdf_pages(pdf_source: Union[str, os.PathLike, BinaryIO]) -> int:
+    """Number of pages in a PDF path or stream"""
+    from pypdf import PdfReader
+
+    if hasattr(pdf_source, 'seek'):
+        pdf_source.seek(0)
+    return len(PdfReader(pdf_source).pages)
+
+
+def iter_pdf_pages(pdf_source: Union[str, os.PathLike, BinaryIO], pages_per_chunk: int) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Yield standalone sub-documents of consecutive pages, one at a time.
+
+    Args:
+        pdf_source: Path to the PDF file, or a seekable binary stream
+        pages_per_chunk: Number of pages in each sub-document
+
+    Yields:
+        (first_page_index, total_pages, pdf_bytes) in page order
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    if hasattr(pdf_source, 'seek'):
+        pdf_source.seek(0)
+    reader = PdfReader(pdf_source)
+    total_pages = len(reader.pages)
+    pages_per_chunk = max(1, pages_per_chunk)
+
+    for start in range(0, total_pages, pages_per_chunk):
+        writer = PdfWriter()
+        for index in range(start, min(start + pages_per_chunk, total_pages)):
+            writer.add_page(reader.pages[index])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        yield start, total_pages, buffer.getvalue()
+
+
+def extract_pdf_pages(pdf_source: Union[str, os.PathLike, BinaryIO], start: int, count: int) -> bytes:
+    """
+    A standalone sub-document of ``count`` pages from ``start`` (0-based).
+
+    Only the requested pages are copied, so a long report can be handed out
+    one range at a time without holding every range in memory.
+    """
+    from pypdf import PdfReader
+
+    if hasattr(pdf_source, 'seek'):
+        pdf_source.seek(0)
+    return reader_pages_to_pdf(PdfReader(pdf_source), start, count)
+
+
+def reader_pages_to_pdf(reader, start: int, count: int) -> bytes:
+    """Like extract_pdf_pages, from an open PdfReader that can be reused across ranges"""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for index in range(start, min(start + max(1, count), len(reader.pages))):
+        writer.add_page(reader.pages[index])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def split_pdf_pages(pdf_source: Union[str, os.PathLike, BinaryIO], pages_per_chunk: int) -> List[Tuple[int, bytes]]:
+    """
+    Split a PDF into standalone sub-documents of consecutive pages.
+
+    Args:
+        pdf_source: Path to the PDF file, or a seekable binary stream
+        pages_per_chunk: Number of pages in each sub-document
+
+    Returns:
+        List of (first_page_index, pdf_bytes) in page order
+    """
+    return [(start, chunk) for start, _, chunk in iter_pdf_pages(pdf_source, pages_per_chunk)]
+
+
+def _merge_into(target: dict, fragment: dict, append_name: bool) -> None:
+    """Fill target's missing values from fragment; optionally append a wrapped name"""
+    for column, value in fragment.items():
+        if column == 'acc_no' or _missing(value):
+            continue
+        if column == 'name' and append_name and not _missing(target.get('name')):
+            target['name'] = f"{str(target['name']).rstrip()} {str(value).strip()}"
+        elif _missing(target.get(column)):
+            target[column] = value
+
+
+class DebtorChunkStitcher:
+    """
+    Incremental form of stitch_debtor_chunks.
+
+    feed() returns the accounts that are final once a range has been seen;
+    the last account is held back because the next range may continue it.
+    The held-back row is exposed as ``carry`` (plain dict, picklable) so a
+    stream can be resumed in another process with DebtorChunkStitcher(carry).
+    """
+
+    def __init__(self, carry: Optional[dict] = None) -> None:
+        self.carry = carry
+
+    def feed(self, frame: Optional[pd.DataFrame]) -> List[dict]:
+        if frame is None or not len(frame.columns):
+            return []
+        records = frame.to_dict('records')
+        position = 0
+
+        if self.carry is not None:
+            # Leading rows without an account number continue the previous account
+            while position < len(records) and _missing(records[position].get('acc_no')):
+                _merge_into(self.carry, records[position], append_name=True)
+                position += 1
+
+            # The same account emitted on both sides of the boundary
+            if position < len(records) and records[position].get('acc_no') == self.carry.get('acc_no'):
+                _merge_into(self.carry, records[position], append_name=False)
+                position += 1
+
+        remaining = records[position:]
+        if not remaining:
+            return []
+
+        done = [self.carry] if self.carry is not None else []
+        done.extend(remaining[:-1])
+        self.carry = remaining[-1]
+        return done
+
+    def finish(self) -> List[dict]:
+        done = [self.carry] if self.carry is not None else []
+        self.carry = None
+        return done
+
+
+def stitch_debtor_chunks(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate per-page-range debtor DataFrames, repairing accounts that
+    straddle range boundaries.
+
+    Args:
+        frames: DataFrames from extract_debtors_strictest_names, in page order
+
+    Returns:
+        A single DataFrame with one row per account and a fresh RangeIndex
+    """
+    frames = [frame for frame in frames if frame is not None and len(frame.columns)]
+    if not frames:
+        return pd.DataFrame()
+
+    columns = list(dict.fromkeys(column for frame in frames for column in frame.columns))
+    stitcher = DebtorChunkStitcher()
+    rows: List[dict] = []
+    for frame in frames:
+        rows.extend(stitcher.feed(frame.reindex(columns=columns)))
+    rows.extend(stitcher.finish())
+
+    result = pd.DataFrame(rows, columns=columns)
+    # Keep the dtypes of the first chunk where concatenation widened them
+    for column, dtype in frames[0].dtypes.items():
+        try:
+            result[column] = result[column].astype(dtype)
+        except (TypeError, ValueError):
+            pass
+    return result
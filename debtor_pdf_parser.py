@@ -11,60 +11,225 @@ Usage:
     result = parse_debtor_pdf('debtor_report.pdf', pharmacy_id=1)
     
     # Result contains:
-    # - df: DataFrame with debtor data
+    # - df: DataFrame with debtor data (omitted with lean=True)
     # - total_accounts: int
     # - total_outstanding: float
     # - debtors: list of debtor dictionaries
+    
+    # Or stream it page range by page range
+    for step in iter_debtor_pdf('debtor_report.pdf', pharmacy_id=1):
+        print(step['page'], step['total_accounts'], len(step['debtors']))
 """
 
 from PDF_PARSER_COMPLETE import extract_debtors_strictest_names
+from debtor_pdf_pages import DebtorChunkStitcher, count_pdf_pages, iter_pdf_pages, split_pdf_pages, stitch_debtor_chunks
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, BinaryIO, Union, Iterator, Tuple
+import functools
+import inspect
+import io
+import math
+import multiprocessing
 import os
+import shutil
+import tempfile
+
+
+# Pages extracted per step when streaming a report
+STREAM_PAGES_PER_CHUNK = 5
+
+# Below this many pages per worker, process start-up outweighs the parallel gain
+PARALLEL_MIN_PAGES_PER_CHUNK = 10
+
+DEBTOR_AMOUNT_COLUMNS = ['current', 'd30', 'd60', 'd90', 'd120', 'd150', 'd180', 'balance']
+DEBTOR_TEXT_COLUMNS = ['email', 'phone']
+
+
+def _extract_chunk(chunk_bytes: bytes) -> pd.DataFrame:
+    # Runs in a worker process on one page range
+    return _extract_debtors(io.BytesIO(chunk_bytes))
 
 
-def parse_debtor_pdf(pdf_path: str, pharmacy_id: int) -> Dict[str, Any]:
+def extract_debtors_parallel(pdf_path: Union[str, os.PathLike, BinaryIO], workers: Optional[int] = None, pages_per_chunk: Optional[int] = None) -> pd.DataFrame:
+    """
+    Extract debtors by splitting the PDF into page ranges and processing them
+    in parallel worker processes.
+    
+    Accounts that straddle a range boundary are stitched back together, so
+    the result is the same DataFrame as a single serial pass. Small documents
+    (fewer than PARALLEL_MIN_PAGES_PER_CHUNK pages per worker) are processed
+    serially.
+    
+    Args:
+        pdf_path: Path to the PDF file, or a seekable binary file-like object
+        workers: Number of worker processes (defaults to the CPU count)
+        pages_per_chunk: Pages per range (defaults to an even split across workers)
+        
+    Returns:
+        pandas DataFrame with the same columns as extract_debtors_strictest_names
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    total_pages = count_pdf_pages(pdf_path)
+    if not pages_per_chunk:
+        pages_per_chunk = max(PARALLEL_MIN_PAGES_PER_CHUNK, math.ceil(total_pages / workers))
+
+    if workers < 2 or total_pages <= pages_per_chunk:
+        if hasattr(pdf_path, 'seek'):
+            pdf_path.seek(0)
+        return _extract_debtors(pdf_path)
+
+    chunks = split_pdf_pages(pdf_path, pages_per_chunk)
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=multiprocessing.get_context('spawn')) as executor:
+        frames = list(executor.map(_extract_chunk, [chunk for _, chunk in chunks]))
+
+    return stitch_debtor_chunks(frames)
+
+
+def debtors_to_records(df: pd.DataFrame, pharmacy_id: int) -> List[Dict[str, Any]]:
+    """
+    Convert a parsed debtor DataFrame to a list of debtor dictionaries.
+    
+    Works column-wise (fillna/astype) instead of per row, so large debtor
+    books are not dominated by Python per-row overhead. Missing columns are
+    filled with their defaults.
+    
+    Args:
+        df: DataFrame returned by extract_debtors_strictest_names
+        pharmacy_id: ID of the pharmacy this report belongs to
+        
+    Returns:
+        List of debtor dictionaries ready for database insertion
+    """
+    n = len(df)
+    columns = {'pharmacy_id': np.full(n, pharmacy_id, dtype=object)}
+
+    for col in ['acc_no', 'name']:
+        values = df[col] if col in df.columns else pd.Series('', index=df.index)
+        columns[col] = values.fillna('').astype(str).to_numpy(dtype=object)
+
+    for col in DEBTOR_AMOUNT_COLUMNS:
+        if col in df.columns:
+            columns[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0).to_numpy(dtype='float64')
+        else:
+            columns[col] = np.zeros(n, dtype='float64')
+
+    for col in DEBTOR_TEXT_COLUMNS:
+        if col in df.columns:
+            values = df[col]
+            columns[col] = values.astype(str).astype(object).where(values.notna(), None).to_numpy(dtype=object)
+        else:
+            columns[col] = np.full(n, None, dtype=object)
+
+    if 'is_medical_aid_control' in df.columns:
+        flags = df['is_medical_aid_control']
+        columns['is_medical_aid_control'] = flags.where(flags.notna(), False).astype(bool).to_numpy()
+    else:
+        columns['is_medical_aid_control'] = np.zeros(n, dtype=bool)
+
+    # tolist() yields native Python types; zip builds the records without per-row lookups
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*(columns[key].tolist() for key in keys))]
+
+
+def _as_pdf_stream(pdf_data: Union[bytes, bytearray, memoryview, BinaryIO]) -> BinaryIO:
+    """
+    Wrap PDF content in a seekable binary stream without writing it to disk.
+    
+    Accepts raw bytes/memoryview, any binary file-like object (e.g. a
+    SpooledTemporaryFile) or a Starlette/FastAPI UploadFile, whose underlying
+    spooled file is used directly rather than copied.
+    """
+    if isinstance(pdf_data, (bytes, bytearray, memoryview)):
+        return io.BytesIO(pdf_data)
+    stream = getattr(pdf_data, 'file', pdf_data)
+    if not hasattr(stream, 'read'):
+        raise TypeError(f"Expected PDF bytes or a binary file-like object, got {type(pdf_data).__name__}")
+    stream.seek(0)
+    return stream
+
+
+@functools.lru_cache(maxsize=None)
+def _extractor_reads_streams() -> bool:
+    """
+    Whether the installed extractor takes a binary stream, from its signature.
+    
+    Builds that annotate the PDF argument as a path (str/PathLike) or name it
+    ``*path`` only open files by name; anything else is handed the stream.
+    """
+    try:
+        params = list(inspect.signature(extract_debtors_strictest_names).parameters.values())
+    except (TypeError, ValueError):
+        return False
+    if not params:
+        return False
+    param = params[0]
+    if param.annotation is inspect.Parameter.empty:
+        return 'path' not in param.name.lower()
+    return param.annotation not in (str, os.PathLike, 'str')
+
+
+def _extract_debtors(pdf_source: Union[str, os.PathLike, BinaryIO]) -> pd.DataFrame:
+    """
+    Run extract_debtors_strictest_names on a path or an in-memory stream.
+    
+    Streams are passed straight through when the extractor takes them (see
+    _extractor_reads_streams); path-only builds get the stream spilled to a
+    temporary file.
+    """
+    if isinstance(pdf_source, (str, os.PathLike)) or _extractor_reads_streams():
+        return extract_debtors_strictest_names(pdf_source)
+
+    pdf_source.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+        shutil.copyfileobj(pdf_source, tmp_file)
+        tmp_path = tmp_file.name
+    try:
+        return extract_debtors_strictest_names(tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def parse_debtor_pdf(pdf_path: Union[str, os.PathLike, BinaryIO], pharmacy_id: int, lean: bool = False, parallel: bool = False, workers: Optional[int] = None) -> Dict[str, Any]:
     """
     Parse a debtor PDF report and return structured data.
     
     Args:
-        pdf_path: Path to the PDF file
+        pdf_path: Path to the PDF file, or a seekable binary file-like object
         pharmacy_id: ID of the pharmacy this report belongs to
+        lean: If True, drop the DataFrame and return only the totals and the
+              debtor list, so the data is not held in memory twice
         
     Returns:
         Dictionary containing:
-        - df: pandas DataFrame with parsed debtor data
+        - df: pandas DataFrame with parsed debtor data (omitted when lean=True)
         - total_accounts: Total number of accounts
         - total_outstanding: Total outstanding balance
         - debtors: List of debtor dictionaries ready for database insertion
     """
     # Parse PDF using the strictest names extraction
-    df = extract_debtors_strictest_names(pdf_path)
+    if parallel:
+        df = extract_debtors_parallel(pdf_path, workers=workers)
+    else:
+        df = _extract_debtors(pdf_path)
     
     # Calculate totals
     total_accounts = len(df)
     total_outstanding = float(df['balance'].sum()) if 'balance' in df.columns else 0.0
     
     # Convert DataFrame to list of dictionaries for API response
-    debtors = []
-    for _, row in df.iterrows():
-        debtor = {
-            'pharmacy_id': pharmacy_id,
-            'acc_no': str(row.get('acc_no', '')),
-            'name': str(row.get('name', '')),
-            'current': float(row.get('current', 0.0)),
-            'd30': float(row.get('d30', 0.0)),
-            'd60': float(row.get('d60', 0.0)),
-            'd90': float(row.get('d90', 0.0)),
-            'd120': float(row.get('d120', 0.0)),
-            'd150': float(row.get('d150', 0.0)),
-            'd180': float(row.get('d180', 0.0)),
-            'balance': float(row.get('balance', 0.0)),
-            'email': str(row.get('email', '')) if pd.notna(row.get('email')) else None,
-            'phone': str(row.get('phone', '')) if pd.notna(row.get('phone')) else None,
-            'is_medical_aid_control': bool(row.get('is_medical_aid_control', False)) if pd.notna(row.get('is_medical_aid_control')) else False,
+    debtors = debtors_to_records(df, pharmacy_id)
+    
+    if lean:
+        del df
+        return {
+            'total_accounts': total_accounts,
+            'total_outstanding': total_outstanding,
+            'debtors': debtors
         }
-        debtors.append(debtor)
     
     return {
         'df': df,
@@ -74,33 +239,106 @@ def parse_debtor_pdf(pdf_path: str, pharmacy_id: int) -> Dict[str, Any]:
     }
 
 
-def parse_debtor_pdf_from_bytes(pdf_bytes: bytes, pharmacy_id: int, filename: str = 'debtor_report.pdf') -> Dict[str, Any]:
+def parse_debtor_page_chunk(chunk_bytes: Optional[bytes], pharmacy_id: int, carry: Optional[dict] = None) -> Tuple[List[Dict[str, Any]], Optional[dict]]:
     """
-    Parse a debtor PDF from bytes (useful for API uploads).
+    Parse one page range of a debtor report as part of a stream.
+    
+    The last account of a range is carried over, because the next range may
+    continue it; pass the returned carry into the next call, and call once
+    more with chunk_bytes=None to flush it at the end of the document.
     
     Args:
-        pdf_bytes: PDF file content as bytes
+        chunk_bytes: A standalone PDF of consecutive pages (see iter_pdf_pages), or None to flush
         pharmacy_id: ID of the pharmacy this report belongs to
-        filename: Temporary filename for the PDF (optional)
+        carry: Carry returned by the previous call
         
     Returns:
-        Dictionary containing parsed debtor data (same format as parse_debtor_pdf)
+        Tuple of (completed debtor dictionaries, carry for the next call)
+    """
+    stitcher = DebtorChunkStitcher(carry)
+    if chunk_bytes is None:
+        rows = stitcher.finish()
+    else:
+        rows = stitcher.feed(_extract_chunk(chunk_bytes))
+    debtors = debtors_to_records(pd.DataFrame(rows), pharmacy_id) if rows else []
+    return debtors, stitcher.carry
+
+
+def iter_debtor_pdf(pdf_path: Union[str, os.PathLike, BinaryIO, bytes], pharmacy_id: int, pages_per_chunk: int = STREAM_PAGES_PER_CHUNK) -> Iterator[Dict[str, Any]]:
     """
-    import tempfile
+    Parse a debtor PDF page range by page range, yielding records as they are ready.
     
-    # Write bytes to temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        tmp_file.write(pdf_bytes)
-        tmp_path = tmp_file.name
+    Only the current page range and the records of one step are held in
+    memory, so memory stays flat regardless of report size.
     
-    try:
-        # Parse the PDF
-        result = parse_debtor_pdf(tmp_path, pharmacy_id)
-        return result
-    finally:
-        # Clean up temporary file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+    Args:
+        pdf_path: Path to the PDF file, PDF bytes, or a seekable binary file-like object
+        pharmacy_id: ID of the pharmacy this report belongs to
+        pages_per_chunk: Pages extracted per step
+        
+    Yields:
+        Dictionaries containing:
+        - page: Last page (1-based) processed so far
+        - total_pages: Number of pages in the document
+        - debtors: Debtor dictionaries completed in this step
+        - total_accounts: Running number of accounts
+        - total_outstanding: Running outstanding balance
+        - done: True on the final step
+    """
+    if isinstance(pdf_path, (bytes, bytearray, memoryview)):
+        pdf_path = _as_pdf_stream(pdf_path)
+
+    carry = None
+    total_pages = 0
+    total_accounts = 0
+    total_outstanding = 0.0
+
+    for start, total_pages, chunk in iter_pdf_pages(pdf_path, pages_per_chunk):
+        debtors, carry = parse_debtor_page_chunk(chunk, pharmacy_id, carry)
+        total_accounts += len(debtors)
+        total_outstanding += sum(debtor['balance'] for debtor in debtors)
+        yield {
+            'page': min(start + pages_per_chunk, total_pages),
+            'total_pages': total_pages,
+            'debtors': debtors,
+            'total_accounts': total_accounts,
+            'total_outstanding': total_outstanding,
+            'done': False,
+        }
+
+    debtors, _ = parse_debtor_page_chunk(None, pharmacy_id, carry)
+    total_accounts += len(debtors)
+    total_outstanding += sum(debtor['balance'] for debtor in debtors)
+    yield {
+        'page': total_pages,
+        'total_pages': total_pages,
+        'debtors': debtors,
+        'total_accounts': total_accounts,
+        'total_outstanding': total_outstanding,
+        'done': True,
+    }
+
+
+def parse_debtor_pdf_from_bytes(pdf_bytes: Union[bytes, bytearray, memoryview, BinaryIO], pharmacy_id: int, filename: str = 'debtor_report.pdf', lean: bool = False, parallel: bool = False, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Parse a debtor PDF from bytes (useful for API uploads).
+    
+    The content is parsed directly from memory: bytes/memoryview are wrapped
+    in a BytesIO, and a SpooledTemporaryFile or UploadFile is read in place
+    without copying it to a temporary file first.
+    
+    Args:
+        pdf_bytes: PDF content as bytes/memoryview, a binary file-like object or an UploadFile
+        pharmacy_id: ID of the pharmacy this report belongs to
+        filename: Original filename of the upload (optional, informational)
+        lean: If True, omit the DataFrame from the result (see parse_debtor_pdf)
+        parallel: If True, extract page ranges in parallel (see parse_debtor_pdf)
+        workers: Number of worker processes for parallel mode
+        
+    Returns:
+        Dictionary containing parsed debtor data (same format as parse_debtor_pdf)
+    """
+    return parse_debtor_pdf(_as_pdf_stream(pdf_bytes), pharmacy_id, lean=lean, parallel=parallel, workers=workers)
 
 
 # Example usage (for testing)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the debtor PDF parser, fully offline.
+
+For each corpus size a synthetic report is generated (see
+generate_debtor_pdf.py) and parsed in a fresh process, so peak RSS is per
+case. Reports pages/sec, accounts/sec, peak RSS, and the time split between
+extraction (extract_debtors_strictest_names) and row conversion
+(debtors_to_records). Parsed account count and outstanding total are checked
+against the generated ground truth.
+
+Usage:
+    python scripts/benchmark_debtor_parser.py
+    python scripts/benchmark_debtor_parser.py --accounts 500 5000 20000 --medical-aid 20
+    python scripts/benchmark_debtor_parser.py --pdf real_report.pdf --parallel 4
+    python scripts/benchmark_debtor_parser.py --json results.json
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_case(pdf_bytes: bytes, parallel: int, repeat: int) -> dict:
+    """Runs in a fresh process; returns the best of ``repeat`` timings"""
+    from debtor_pdf_pages import count_pdf_pages
+    from debtor_pdf_parser import _extract_debtors, debtors_to_records, extract_debtors_parallel
+
+    pages = count_pdf_pages(io.BytesIO(pdf_bytes))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if parallel > 1:
+            df = extract_debtors_parallel(io.BytesIO(pdf_bytes), workers=parallel)
+        else:
+            df = _extract_debtors(io.BytesIO(pdf_bytes))
+        extracted = time.perf_counter()
+        records = debtors_to_records(df, pharmacy_id=0)
+        converted = time.perf_counter()
+        timing = (extracted - start, converted - extracted)
+        if best is None or sum(timing) < sum(best):
+            best = timing
+
+    extract_s, convert_s = best
+    total_s = extract_s + convert_s
+    return {
+        "pages": pages,
+        "parsed_accounts": len(records),
+        "parsed_outstanding": round(sum(r["balance"] for r in records), 2),
+        "extract_s": round(extract_s, 4),
+        "convert_s": round(convert_s, 4),
+        "total_s": round(total_s, 4),
+        "pages_per_s": round(pages / total_s, 1) if total_s else None,
+        "accounts_per_s": round(len(records) / total_s, 1) if total_s else None,
+        "extract_pct": round(100 * extract_s / total_s, 1) if total_s else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, nargs="+", default=[200, 2000, 10000])
+    parser.add_argument("--medical-aid", type=int, default=5)
+    parser.add_argument("--no-split", action="store_true", help="Keep every account on a single page")
+    parser.add_argument("--pdf", help="Benchmark an existing PDF instead of the synthetic corpus")
+    parser.add_argument("--parallel", type=int, default=1, help="Worker processes for page-parallel extraction")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    from scripts.generate_debtor_pdf import generate_debtor_pdf
+
+    cases = []
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            cases.append((os.path.basename(args.pdf), f.read(), None))
+    else:
+        for count in args.accounts:
+            pdf_bytes, truth = generate_debtor_pdf(count, medical_aid=args.medical_aid, split_accounts=not args.no_split)
+            cases.append((f"synthetic-{count}", pdf_bytes, truth))
+
+    print(f"{'case':<18}{'pages':>7}{'accounts':>10}{'pages/s':>10}{'accts/s':>11}{'extract':>10}{'convert':>10}{'extract%':>10}{'peak RSS':>11}  check")
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for name, pdf_bytes, truth in cases:
+        with context.Pool(1) as pool:
+            result = pool.apply(_run_case, (pdf_bytes, args.parallel, args.repeat))
+        result["case"] = name
+        result["size_kb"] = round(len(pdf_bytes) / 1024, 1)
+
+        check = "-"
+        if truth is not None:
+            expected_total = round(sum(a["balance"] for a in truth), 2)
+            ok = result["parsed_accounts"] == len(truth) and abs(result["parsed_outstanding"] - expected_total) < 0.01
+            check = "ok" if ok else f"MISMATCH (expected {len(truth)} / {expected_total:,.2f})"
+            result["expected_accounts"] = len(truth)
+            result["expected_outstanding"] = expected_total
+        result["check"] = check
+        results.append(result)
+
+        print(
+            f"{name:<18}{result['pages']:>7}{result['parsed_accounts']:>10}{result['pages_per_s']:>10}"
+            f"{result['accounts_per_s']:>11}{result['extract_s']:>9.3f}s{result['convert_s']:>9.3f}s"
+            f"{result['extract_pct']:>9}%{result['peak_rss_mb']:>8} MB  {check}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"parallel": args.parallel, "repeat": args.repeat, "results": results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
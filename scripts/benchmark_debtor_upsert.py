@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark bulk debtor persistence against the configured Postgres database.
+
+Writes N synthetic debtors into a scratch copy of the debtor table (run
+alembic upgrade head first) with the COPY + ON CONFLICT
+path (app/debtor_store.py), runs it a second time to measure the update
+path, and optionally compares with row-by-row INSERTs. Reports rows/second.
+
+Usage:
+    python scripts/benchmark_debtor_upsert.py --rows 5000
+    python scripts/benchmark_debtor_upsert.py --rows 2000 --compare-row-by-row
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.db import engine, get_database_url
+from app.debtor_store import DEBTOR_COLUMNS, DEBTORS_TABLE, debtors_to_copy_buffer, upsert_debtors
+
+
+def make_debtors(count: int, pharmacy_id: int) -> list:
+    rng = random.Random(42)
+    debtors = []
+    for i in range(count):
+        amounts = [round(rng.uniform(0, 3000), 2) if rng.random() < 0.5 else 0.0 for _ in range(7)]
+        debtors.append({
+            "pharmacy_id": pharmacy_id,
+            "acc_no": f"BM{i:07d}",
+            "name": f"BENCHMARK DEBTOR {i}",
+            "current": amounts[0],
+            "d30": amounts[1],
+            "d60": amounts[2],
+            "d90": amounts[3],
+            "d120": amounts[4],
+            "d150": amounts[5],
+            "d180": amounts[6],
+            "balance": round(sum(amounts), 2),
+            "email": f"debtor{i}@example.com" if i % 2 else None,
+            "phone": f"082{i:07d}" if i % 3 else None,
+            "is_medical_aid_control": False,
+        })
+    return debtors
+
+
+def row_by_row(table: str, pharmacy_id: int, report_date: str, debtors: list) -> None:
+    columns = ", ".join(f'"{col}"' for col in DEBTOR_COLUMNS)
+    params = ", ".join(f":{col}" for col in DEBTOR_COLUMNS)
+    statement = text(
+        f"INSERT INTO {table} ({columns}) VALUES ({params}) "
+        f"ON CONFLICT (pharmacy_id, acc_no, report_date) DO UPDATE SET balance = EXCLUDED.balance"
+    )
+    with engine.begin() as conn:
+        for debtor in debtors:
+            conn.execute(statement, {**debtor, "pharmacy_id": pharmacy_id, "report_date": report_date})
+
+
+def timed(label: str, rows: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {rows:>8} rows  {elapsed:8.2f}s  {rows / elapsed:10.0f} rows/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--table", default=f"{DEBTORS_TABLE}_benchmark")
+    parser.add_argument("--pharmacy-id", type=int, default=0)
+    parser.add_argument("--report-date", default="2000-01-01")
+    parser.add_argument("--compare-row-by-row", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="Do not drop the scratch table afterwards")
+    args = parser.parse_args()
+
+    print(f"Connecting to: {get_database_url()}")
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {args.table} (LIKE {DEBTORS_TABLE} INCLUDING ALL)"))
+    debtors = make_debtors(args.rows, args.pharmacy_id)
+
+    try:
+        start = time.perf_counter()
+        buffer = debtors_to_copy_buffer(debtors, args.pharmacy_id, args.report_date)
+        print(f"{'serialise CSV':<28} {args.rows:>8} rows  {time.perf_counter() - start:8.2f}s")
+
+        timed("COPY upsert (insert)", args.rows,
+              lambda: upsert_debtors(engine, args.pharmacy_id, args.report_date, debtors, table=args.table, buffer=buffer))
+        timed("COPY upsert (update)", args.rows,
+              lambda: upsert_debtors(engine, args.pharmacy_id, args.report_date, debtors, table=args.table))
+
+        if args.compare_row_by_row:
+            timed("row-by-row INSERT", args.rows,
+                  lambda: row_by_row(args.table, args.pharmacy_id, "2000-01-02", debtors))
+    finally:
+        with engine.begin() as conn:
+            if args.keep:
+                conn.execute(text(f"DELETE FROM {args.table} WHERE pharmacy_id = :pid"), {"pid": args.pharmacy_id})
+            else:
+                conn.execute(text(f"DROP TABLE IF EXISTS {args.table}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic debtor age-analysis PDFs for benchmarking and tests.
+
+The PDF is written directly (text-only pages in Courier), so no PDF library
+or network access is needed. Each account is one line with its ageing
+buckets and balance, optionally followed by a contact line with email and
+phone. Medical-aid control accounts are mixed in, and with split_accounts an
+account's contact line is pushed onto the next page to exercise the page
+boundary handling.
+
+Usage:
+    python scripts/generate_debtor_pdf.py --accounts 2000 -o debtors_2000.pdf
+    python scripts/generate_debtor_pdf.py --pages 50 --medical-aid 10 -o debtors_50p.pdf
+
+    from scripts.generate_debtor_pdf import generate_debtor_pdf
+    pdf_bytes, accounts = generate_debtor_pdf(accounts=500)
+"""
+import argparse
+import random
+from typing import List, Optional, Tuple
+
+BUCKETS = ["current", "d30", "d60", "d90", "d120", "d150", "d180"]
+ROWS_PER_PAGE = 52
+
+FIRST_NAMES = ["JOHN", "MARY", "PIETER", "THANDI", "SIPHO", "ANNA", "JOHAN", "LERATO", "DAVID", "NOMSA"]
+SURNAMES = ["SMITH", "VAN DER MERWE", "NKOSI", "BOTHA", "DLAMINI", "PRETORIUS", "MOKOENA", "NAIDOO", "FOURIE", "KHUMALO"]
+MEDICAL_AIDS = ["DISCOVERY HEALTH", "BONITAS", "MOMENTUM HEALTH", "GEMS", "MEDSHIELD", "BESTMED"]
+
+
+def make_accounts(count: int, medical_aid: int = 0, seed: int = 42) -> List[dict]:
+    """Random debtor accounts; medical_aid of them are medical-aid control accounts"""
+    rng = random.Random(seed)
+    control_rows = set(rng.sample(range(count), min(medical_aid, count)))
+    accounts = []
+    for i in range(count):
+        is_control = i in control_rows
+        amounts = {
+            bucket: round(rng.uniform(0, 4000 if is_control else 1500), 2) if rng.random() < 0.45 else 0.0
+            for bucket in BUCKETS
+        }
+        if is_control:
+            name = f"{rng.choice(MEDICAL_AIDS)} MEDICAL AID CONTROL"
+        else:
+            name = f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)}"
+        accounts.append({
+            "acc_no": f"{i + 1:06d}",
+            "name": name,
+            **amounts,
+            "balance": round(sum(amounts.values()), 2),
+            "email": None if is_control or rng.random() < 0.4 else f"debtor{i + 1}@example.co.za",
+            "phone": None if is_control or rng.random() < 0.3 else f"08{rng.randint(10000000, 99999999)}",
+            "is_medical_aid_control": is_control,
+        })
+    return accounts
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _account_line(account: dict) -> str:
+    amounts = "".join(f"{account[b]:>11.2f}" for b in BUCKETS)
+    return f"{account['acc_no']:<8}{account['name'][:30]:<31}{amounts}{account['balance']:>12.2f}"
+
+
+def _contact_line(account: dict) -> Optional[str]:
+    parts = []
+    if account["email"]:
+        parts.append(f"Email: {account['email']}")
+    if account["phone"]:
+        parts.append(f"Tel: {account['phone']}")
+    return f"{'':<8}{'   '.join(parts)}" if parts else None
+
+
+def _layout(accounts: List[dict], split_accounts: bool, rows_per_page: int) -> List[List[str]]:
+    """Lines per page, headings repeated on every page"""
+    heading = [
+        "DEBTORS AGE ANALYSIS",
+        f"{'ACC NO':<8}{'NAME':<31}" + "".join(f"{h:>11}" for h in ["CURRENT", "30 DAYS", "60 DAYS", "90 DAYS", "120 DAYS", "150 DAYS", "180+ DAYS"]) + f"{'BALANCE':>12}",
+        "",
+    ]
+    body_rows = rows_per_page - len(heading)
+    pages, lines = [], []
+    for account in accounts:
+        contact = _contact_line(account)
+        needed = 2 if contact else 1
+        if len(lines) + needed > body_rows and not (split_accounts and contact and len(lines) + 1 <= body_rows):
+            pages.append(heading + lines)
+            lines = []
+        lines.append(_account_line(account))
+        if contact:
+            if len(lines) >= body_rows:
+                # Split account: the contact line continues on the next page
+                pages.append(heading + lines)
+                lines = []
+            lines.append(contact)
+    total = sum(a["balance"] for a in accounts)
+    lines += ["", f"{'':<8}{'TOTAL ACCOUNTS: ' + str(len(accounts)):<31}{'':>77}{total:>12.2f}"]
+    pages.append(heading + lines)
+    return pages
+
+
+def write_pdf(pages: List[List[str]], font_size: float = 6.5) -> bytes:
+    """Minimal landscape A4 PDF with one text stream per page"""
+    width, height, margin, leading = 842, 595, 24, font_size * 1.6
+    objects: List[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    catalog = add(b"")  # filled once the page tree exists
+    page_tree = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+
+    page_ids = []
+    for lines in pages:
+        text = [f"BT /F1 {font_size} Tf {leading:.2f} TL {margin} {height - margin} Td"]
+        text += [f"({_escape(line)}) '" for line in lines]
+        text.append("ET")
+        stream = "\n".join(text).encode("latin-1", "replace")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (page_tree, width, height, font, content)
+        ))
+
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % page_tree
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[page_tree - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def generate_debtor_pdf(
+    accounts: Optional[int] = None,
+    pages: Optional[int] = None,
+    medical_aid: int = 0,
+    split_accounts: bool = True,
+    seed: int = 42,
+    rows_per_page: int = ROWS_PER_PAGE,
+) -> Tuple[bytes, List[dict]]:
+    """
+    Build a synthetic debtor report.
+
+    Args:
+        accounts: Number of accounts (default: enough to fill ``pages``, else 500)
+        pages: Approximate number of pages, used when accounts is not given
+        medical_aid: Number of medical-aid control accounts among them
+        split_accounts: Let an account's contact line continue on the next page
+        seed: Random seed, so a corpus is reproducible
+        rows_per_page: Text lines per page including the headings
+
+    Returns:
+        Tuple of (pdf_bytes, accounts) where accounts is the ground truth
+    """
+    if accounts is None:
+        # About 1.9 lines per account once contact lines are included
+        accounts = int((pages or 0) * (rows_per_page - 3) / 1.9) or 500
+    truth = make_accounts(accounts, medical_aid=medical_aid, seed=seed)
+    return write_pdf(_layout(truth, split_accounts, rows_per_page)), truth
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int)
+    parser.add_argument("--pages", type=int)
+    parser.add_argument("--medical-aid", type=int, default=0)
+    parser.add_argument("--no-split", action="store_true", help="Keep every account on a single page")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", default="debtor_report_synthetic.pdf")
+    args = parser.parse_args()
+
+    pdf_bytes, truth = generate_debtor_pdf(args.accounts, args.pages, args.medical_aid, not args.no_split, args.seed)
+    with open(args.output, "wb") as f:
+        f.write(pdf_bytes)
+    total = sum(a["balance"] for a in truth)
+    print(f"Wrote {args.output}: {len(truth)} accounts, R {total:,.2f} outstanding, {len(pdf_bytes) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
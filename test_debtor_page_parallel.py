@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Parity test for page-parallel debtor extraction.
+
+Builds random debtor reports, cuts them into per-page-range DataFrames the way
+the extractor sees them at range boundaries (clean cut, continuation lines,
+split rows) and checks that stitching the ranges gives exactly the serial
+result. A small generated multi-page PDF is then parsed serially, in
+parallel, streamed and through the parse pool, and the outputs compared.
+Run with: python -m pytest test_debtor_page_parallel.py
+"""
+
+import asyncio
+import io
+import random
+import sys
+
+import numpy as np
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from debtor_pdf_pages import stitch_debtor_chunks
+
+AMOUNT_COLUMNS = ['current', 'd30', 'd60', 'd90', 'd120', 'd150', 'd180', 'balance']
+COLUMNS = ['acc_no', 'name'] + AMOUNT_COLUMNS + ['email', 'phone']
+
+
+def _random_accounts(rng: random.Random, count: int) -> list:
+    accounts = []
+    for index in range(count):
+        amounts = [round(rng.uniform(0, 5000), 2) if rng.random() < 0.6 else 0.0 for _ in AMOUNT_COLUMNS[:-1]]
+        words = rng.randint(1, 4)
+        accounts.append({
+            'acc_no': f"{rng.choice('ABCDEFGH')}{index:05d}",
+            'name': ' '.join(rng.choice(['SMITH', 'VAN DER MERWE', 'J', 'NKOSI', 'PTY', 'LTD', 'MRS']) for _ in range(words)),
+            **dict(zip(AMOUNT_COLUMNS, amounts + [round(sum(amounts), 2)])),
+            'email': f"user{index}@example.com" if rng.random() < 0.5 else None,
+            'phone': f"08{rng.randint(10000000, 99999999)}" if rng.random() < 0.5 else None,
+        })
+    return accounts
+
+
+def _frame(rows: list) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def _chunk(accounts: list, rng: random.Random) -> list:
+    """Cut accounts into range frames with a random boundary case at each cut"""
+    frames, current = [], []
+    for position, account in enumerate(accounts):
+        is_last = position == len(accounts) - 1
+        if is_last or rng.random() > 0.15:
+            current.append(dict(account))
+            continue
+
+        boundary = rng.choice(['clean', 'continuation', 'split_row'])
+        if boundary == 'clean':
+            current.append(dict(account))
+            frames.append(_frame(current))
+            current = []
+        elif boundary == 'continuation' and ' ' in account['name']:
+            # Account line on this page; rest of name, email and phone on the next
+            head, tail = account['name'].split(' ', 1)
+            current.append({**account, 'name': head, 'email': None, 'phone': None})
+            frames.append(_frame(current))
+            current = [{'acc_no': None, 'name': tail, 'email': account['email'], 'phone': account['phone']}]
+        else:
+            # Same account on both sides: amounts before the break, contact details after
+            current.append({**account, 'email': None, 'phone': None})
+            frames.append(_frame(current))
+            current = [{'acc_no': account['acc_no'], 'name': account['name'], 'email': account['email'], 'phone': account['phone']}]
+    frames.append(_frame(current))
+    return frames
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_stitched_chunks_match_serial(seed):
+    rng = random.Random(seed)
+    accounts = _random_accounts(rng, rng.randint(1, 400))
+    serial = _frame(accounts)
+
+    stitched = stitch_debtor_chunks(_chunk(accounts, rng))
+
+    pd.testing.assert_frame_equal(stitched, serial, check_dtype=False)
+    assert np.isclose(stitched['balance'].sum(), serial['balance'].sum())
+
+
+def test_single_chunk_is_unchanged():
+    accounts = _random_accounts(random.Random(1), 25)
+    serial = _frame(accounts)
+    pd.testing.assert_frame_equal(stitch_debtor_chunks([serial]), serial)
+
+
+def test_empty_chunks_are_ignored():
+    accounts = _random_accounts(random.Random(2), 10)
+    serial = _frame(accounts)
+    stitched = stitch_debtor_chunks([serial.iloc[:4], pd.DataFrame(columns=COLUMNS), serial.iloc[4:]])
+    pd.testing.assert_frame_equal(stitched, serial, check_dtype=False)
+
+
+def test_synthetic_report_pages_split_and_rejoin():
+    pytest.importorskip("pypdf")
+    from debtor_pdf_pages import count_pdf_pages, split_pdf_pages
+    from scripts.generate_debtor_pdf import generate_debtor_pdf
+
+    pdf_bytes, truth = generate_debtor_pdf(accounts=600, medical_aid=3)
+    pages = count_pdf_pages(io.BytesIO(pdf_bytes))
+    chunks = split_pdf_pages(io.BytesIO(pdf_bytes), 7)
+
+    assert len(truth) == 600 and sum(a['is_medical_aid_control'] for a in truth) == 3
+    assert [start for start, _ in chunks] == list(range(0, pages, 7))
+    assert sum(count_pdf_pages(io.BytesIO(chunk)) for _, chunk in chunks) == pages
+
+
+def test_extracted_page_ranges_cover_the_report():
+    pytest.importorskip("pypdf")
+    from debtor_pdf_pages import count_pdf_pages, extract_pdf_pages
+    from scripts.generate_debtor_pdf import generate_debtor_pdf
+
+    pdf_bytes, _ = generate_debtor_pdf(accounts=600, medical_aid=3)
+    pages = count_pdf_pages(io.BytesIO(pdf_bytes))
+    counts = [count_pdf_pages(io.BytesIO(extract_pdf_pages(io.BytesIO(pdf_bytes), start, 7))) for start in range(0, pages, 7)]
+
+    assert sum(counts) == pages
+    assert all(count == 7 for count in counts[:-1])
+
+
+# Stand-in for PDF_PARSER_COMPLETE when it is not installed: reads the text
+# layout written by scripts/generate_debtor_pdf.py. Like the real extractor,
+# contact lines before the first account of a document come out as a row
+# without an acc_no.
+LINE_EXTRACTOR = """
+import re
+
+import pandas as pd
+from pypdf import PdfReader
+
+BUCKETS = ['current', 'd30', 'd60', 'd90', 'd120', 'd150', 'd180', 'balance']
+ACCOUNT = re.compile(r'^(\\d{6})  (.{30}) ?((?:\\s+-?\\d+\\.\\d{2}){8})$')
+
+
+def extract_debtors_strictest_names(pdf_source):
+    rows = []
+    for page in PdfReader(pdf_source).pages:
+        for line in page.extract_text().splitlines():
+            match = ACCOUNT.match(line)
+            if match:
+                name = match.group(2).strip()
+                rows.append({
+                    'acc_no': match.group(1), 'name': name,
+                    **dict(zip(BUCKETS, map(float, match.group(3).split()))),
+                    'email': None, 'phone': None,
+                    'is_medical_aid_control': 'MEDICAL AID' in name,
+                })
+            elif line.startswith('        ') and ('Email:' in line or 'Tel:' in line):
+                if not rows:
+                    rows.append({'acc_no': None, 'name': None, 'email': None, 'phone': None})
+                email = re.search(r'Email: (\\S+)', line)
+                phone = re.search(r'Tel: (\\S+)', line)
+                rows[-1]['email'] = email.group(1) if email else None
+                rows[-1]['phone'] = phone.group(1) if phone else None
+    return pd.DataFrame(rows, columns=['acc_no', 'name'] + BUCKETS + ['email', 'phone', 'is_medical_aid_control'])
+"""
+
+
+@pytest.fixture
+def parser_module(tmp_path, monkeypatch):
+    """debtor_pdf_parser backed by the installed extractor, or by LINE_EXTRACTOR"""
+    pytest.importorskip("pypdf")
+    # A stand-in imported by an earlier test lives in that test's tmp_path
+    monkeypatch.delitem(sys.modules, "PDF_PARSER_COMPLETE", raising=False)
+    monkeypatch.delitem(sys.modules, "debtor_pdf_parser", raising=False)
+    try:
+        import PDF_PARSER_COMPLETE  # noqa: F401
+        stand_in = False
+    except ImportError:
+        (tmp_path / "PDF_PARSER_COMPLETE.py").write_text(LINE_EXTRACTOR)
+        # sys.path is handed to spawned workers, so they import the same module
+        monkeypatch.syspath_prepend(str(tmp_path))
+        stand_in = True
+    import debtor_pdf_parser
+    return debtor_pdf_parser, stand_in
+
+
+def _small_report():
+    from scripts.generate_debtor_pdf import generate_debtor_pdf
+
+    # 5 pages of 20 lines, with contact lines pushed onto the next page
+    return generate_debtor_pdf(accounts=45, medical_aid=2, rows_per_page=20)
+
+
+def test_parallel_extraction_matches_serial_on_synthetic_report(parser_module):
+    parser, stand_in = parser_module
+    pdf_bytes, truth = _small_report()
+
+    serial = parser._extract_debtors(io.BytesIO(pdf_bytes))
+    parallel = parser.extract_debtors_parallel(io.BytesIO(pdf_bytes), workers=2, pages_per_chunk=1)
+
+    pd.testing.assert_frame_equal(parallel.reset_index(drop=True), serial.reset_index(drop=True), check_dtype=False)
+    if stand_in:
+        assert serial['acc_no'].tolist() == [a['acc_no'] for a in truth]
+        assert serial['phone'].fillna('').tolist() == [a['phone'] or '' for a in truth]
+
+
+def test_streamed_records_match_serial_parse(parser_module):
+    parser, _ = parser_module
+    pdf_bytes, _ = _small_report()
+
+    serial = parser.parse_debtor_pdf(io.BytesIO(pdf_bytes), pharmacy_id=1, lean=True)
+    steps = list(parser.iter_debtor_pdf(io.BytesIO(pdf_bytes), pharmacy_id=1, pages_per_chunk=1))
+
+    assert [d for step in steps for d in step['debtors']] == serial['debtors']
+    assert steps[-1]['done'] and steps[-1]['total_accounts'] == serial['total_accounts']
+
+
+def test_parse_pool_stream_matches_serial_parse(parser_module):
+    from debtor_parse_pool import DebtorParsePool
+
+    parser, _ = parser_module
+    pdf_bytes, _ = _small_report()
+    serial = parser.parse_debtor_pdf(io.BytesIO(pdf_bytes), pharmacy_id=1, lean=True)
+
+    async def stream():
+        pool = DebtorParsePool(max_workers=2, stream_pages=2, timeout=60)
+        try:
+            parsed = await pool.parse(io.BytesIO(pdf_bytes), pharmacy_id=1)
+            steps = [step async for step in pool.stream(io.BytesIO(pdf_bytes), pharmacy_id=1)]
+        finally:
+            pool.shutdown(wait=True)
+        return parsed, steps
+
+    parsed, steps = asyncio.run(stream())
+
+    assert parsed['debtors'] == serial['debtors']
+    assert [d for step in steps for d in step['debtors']] == serial['debtors']
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests for the server-side session middleware (app/sessions.py).
+
+Runs a small Starlette app behind ServerSessionMiddleware with a SQLite
+store and checks when the store is written, how the expiry slides, and how
+deleted and unknown sessions are handled. Run with: python -m pytest test_sessions.py
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from sqlalchemy import create_engine
+
+from app import sessions
+from app.sessions import ServerSessionMiddleware, SessionData, SessionStore
+
+MAX_AGE = 3600
+
+
+async def read(request):
+    return JSONResponse(dict(request.session))
+
+
+async def login(request):
+    request.session["user"] = request.query_params.get("user", "bob")
+    request.session["pharmacies"] = []
+    return JSONResponse({})
+
+
+async def add_pharmacy(request):
+    # In-place change of a nested value, no top-level write
+    request.session["pharmacies"].append(int(request.query_params["pid"]))
+    return JSONResponse({})
+
+
+async def logout(request):
+    request.session.clear()
+    return JSONResponse({})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(sessions.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def store(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sessions.db'}", connect_args={"check_same_thread": False})
+    store = SessionStore(engine, MAX_AGE, cache_ttl=0.001)
+    store.create_tables()
+    return store
+
+
+@pytest.fixture
+def client(store):
+    app = Starlette(routes=[
+        Route("/read", read),
+        Route("/login", login),
+        Route("/add", add_pharmacy),
+        Route("/logout", logout),
+    ])
+    app.add_middleware(ServerSessionMiddleware, store=store)
+    return TestClient(app)
+
+
+def test_session_data_notices_nested_changes():
+    session = SessionData({"user": "bob", "pharmacies": [1]})
+    assert not session.modified
+    session["user"] = "bob"
+    assert not session.modified
+    session["pharmacies"].append(2)
+    assert session.modified
+
+    session = SessionData({"user": "bob"})
+    session.pop("missing", None)
+    assert not session.modified
+    session.pop("user")
+    assert session.modified
+
+
+def test_store_is_written_only_when_the_session_changes(client, store, clock):
+    assert "set-cookie" not in client.get("/read").headers
+    assert store.writes == 0
+
+    response = client.get("/login")
+    assert "set-cookie" in response.headers
+    assert store.writes == 1
+
+    for _ in range(3):
+        assert "set-cookie" not in client.get("/read").headers
+    assert store.writes == 1
+    assert client.get("/read").json() == {"user": "bob", "pharmacies": []}
+
+
+def test_nested_change_is_saved(client, store, clock):
+    client.get("/login")
+    client.get("/add", params={"pid": 7})
+    assert store.writes == 2
+    assert client.get("/read").json()["pharmacies"] == [7]
+
+
+def test_expiry_slides_once_half_of_max_age_is_left(client, store, clock):
+    client.get("/login")
+    clock[0] += MAX_AGE / 2 - 10
+    assert "set-cookie" not in client.get("/read").headers
+    assert store.writes == 1
+
+    clock[0] += 20
+    assert "Max-Age=3600" in client.get("/read").headers["set-cookie"]
+    assert store.writes == 2
+
+    # Still alive well past the original expiry, since it was extended
+    clock[0] += MAX_AGE - 10
+    assert client.get("/read").json()["user"] == "bob"
+
+
+def test_session_expires_without_requests(client, store, clock):
+    client.get("/login")
+    clock[0] += MAX_AGE + 1
+    assert client.get("/read").json() == {}
+
+
+def test_clearing_the_session_deletes_it(client, store, clock):
+    client.get("/login")
+    session_id = client.cookies["session"]
+
+    response = client.get("/logout")
+    assert "Max-Age=0" in response.headers["set-cookie"]
+    assert store._load_row(sessions._storage_key(session_id)) is None
+
+
+def test_unknown_session_id_is_not_reused(client, store, clock):
+    client.cookies.set("session", "made-up-id")
+    assert client.get("/read").json() == {}
+    assert store.writes == 0
+
+    response = client.get("/login", params={"user": "al"})
+    assert not response.headers["set-cookie"].startswith("session=made-up-id;")
+    assert store._load_row(sessions._storage_key("made-up-id")) is None
+
+
+def test_logout_in_another_worker_is_seen_after_the_auth_cache_ttl(store, clock):
+    async def sign_in(request):
+        request.session["user_id"] = 7
+        return JSONResponse({})
+
+    def worker(worker_store):
+        app = Starlette(routes=[Route("/read", read), Route("/sign-in", sign_in), Route("/logout", logout)])
+        app.add_middleware(ServerSessionMiddleware, store=worker_store)
+        return TestClient(app)
+
+    # Anonymous sessions would stay cached for a minute in the other worker
+    other_store = SessionStore(store.engine, MAX_AGE, cache_ttl=60, auth_cache_ttl=0.001)
+    first, second = worker(store), worker(other_store)
+    first.get("/sign-in")
+    second.cookies.set("session", first.cookies["session"])
+    assert second.get("/read").json() == {"user_id": 7}
+
+    first.get("/logout")
+    time.sleep(0.01)
+    assert second.get("/read").json() == {}
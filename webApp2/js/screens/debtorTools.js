@@ -8,6 +8,8 @@ class DebtorToolsScreen {
         this.minBalance = 100;
         this.selectedAgeingBuckets = ['current', 'd30', 'd60', 'd90', 'd120', 'd150', 'd180'];
         this.allDebtors = [];
+        this.totalDebtors = 0;
+        this.pageSize = 500;
         this.sortColumn = null;
         this.sortOrder = 'asc';
     }
@@ -44,9 +46,9 @@ class DebtorToolsScreen {
 
     async loadStatistics(pharmacyId) {
         try {
-            // Debtor API endpoints use external API with JWT Bearer token (not API key)
-            const baseUrl = 'https://pharmacy-api-webservice.onrender.com';
-            const url = `${baseUrl}/pharmacies/${pharmacyId}/debtors/statistics`;
+            // Served by our backend from the debtor index once it has checked this user's
+            // access to the pharmacy (session, or the JWT Bearer token sent below)
+            const url = `${window.api.getLocalBackendUrl()}/api/pharmacies/${pharmacyId}/debtors/statistics`;
             
             // Get JWT token from Auth (not API key)
             let jwtToken = null;
@@ -336,6 +338,15 @@ class DebtorToolsScreen {
                                 </svg>
                                 Send SMS
                             </button>
+                            <button class="debtor-action-btn" id="debtor-upload-btn">
+                                <svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
+                                    <path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v-4"></path>
+                                    <polyline points="17 8 12 3 7 8"></polyline>
+                                    <line x1="12" y1="3" x2="12" y2="15"></line>
+                                </svg>
+                                Upload Report
+                            </button>
+                            <input type="file" id="debtor-upload-input" accept="application/pdf,.pdf" style="display: none;" />
                         </div>
                     </div>
                 </div>
@@ -417,14 +428,25 @@ class DebtorToolsScreen {
         const sendSmsBtn = document.getElementById('debtor-send-sms-btn');
         
         if (sendEmailBtn) {
-            sendEmailBtn.addEventListener('click', () => {
-                this.showComingSoonModal('Send Emails', 'Email functionality is coming soon.');
-            });
+            sendEmailBtn.addEventListener('click', () => this.sendReminders(pharmacyId, 'email'));
         }
         
         if (sendSmsBtn) {
-            sendSmsBtn.addEventListener('click', () => {
-                this.showComingSoonModal('Send SMS', 'SMS functionality is coming soon.');
+            sendSmsBtn.addEventListener('click', () => this.sendReminders(pharmacyId, 'sms'));
+        }
+
+        // Upload a debtor PDF: parsed records are shown page range by page range
+        const uploadBtn = document.getElementById('debtor-upload-btn');
+        const uploadInput = document.getElementById('debtor-upload-input');
+
+        if (uploadBtn && uploadInput) {
+            uploadBtn.addEventListener('click', () => uploadInput.click());
+            uploadInput.addEventListener('change', () => {
+                const file = uploadInput.files && uploadInput.files[0];
+                uploadInput.value = '';
+                if (file) {
+                    this.uploadReport(pharmacyId, file);
+                }
             });
         }
 
@@ -454,6 +476,174 @@ class DebtorToolsScreen {
         });
     }
 
+    async uploadReport(pharmacyId, file) {
+        const buckets = ['current', 'd30', 'd60', 'd90', 'd120', 'd150', 'd180'];
+        const preview = { total_accounts: 0, total_outstanding: 0 };
+        buckets.forEach(key => { preview[key] = 0; });
+
+        this.allDebtors = [];
+        this.totalDebtors = 0;
+        this.setUploadStatus(`Reading ${file.name}...`);
+        this.renderDebtorsTableBody();
+
+        try {
+            await window.api.streamDebtorReport(pharmacyId, file, (step) => {
+                this.allDebtors.push(...step.debtors);
+                this.totalDebtors = this.allDebtors.length;
+                step.debtors.forEach(debtor => {
+                    buckets.forEach(key => { preview[key] += Number(debtor[key]) || 0; });
+                });
+                preview.total_accounts = step.total_accounts;
+                preview.total_outstanding = step.total_outstanding;
+
+                this.setUploadStatus(step.total_pages
+                    ? `Parsing ${file.name}: page ${step.page} of ${step.total_pages}, ${step.total_accounts} accounts`
+                    : `${file.name}: ${step.total_accounts} accounts (parsed before)`);
+                this.renderPreviewCards(preview);
+                this.renderDebtorsTableBody();
+            });
+        } catch (error) {
+            console.error('Error parsing debtor report:', error);
+            this.setUploadStatus(`Could not parse ${file.name}: ${error.message}`);
+            return;
+        }
+
+        this.setUploadStatus(`Preview of ${file.name} (${preview.total_accounts} accounts), not saved yet`, () => this.saveReport(pharmacyId, file));
+    }
+
+    async saveReport(pharmacyId, file) {
+        this.setUploadStatus(`Saving ${file.name}...`);
+        try {
+            await window.api.saveDebtorReport(pharmacyId, file);
+        } catch (error) {
+            console.error('Error saving debtor report:', error);
+            this.setUploadStatus(`Could not save ${file.name}: ${error.message}`, () => this.saveReport(pharmacyId, file));
+            return;
+        }
+        // Statistics and search now come from the saved report
+        await this.load();
+    }
+
+    // Status line above the debtors table, with an optional Save button
+    setUploadStatus(message, onSave = null) {
+        const status = document.getElementById('debtor-upload-status');
+        if (!status) return;
+
+        status.style.display = message ? 'flex' : 'none';
+        status.innerHTML = `<span>${this.escapeHtml(message || '')}</span>`;
+        if (onSave) {
+            const saveBtn = document.createElement('button');
+            saveBtn.type = 'button';
+            saveBtn.className = 'debtor-upload-save-btn';
+            saveBtn.textContent = 'Save Report';
+            saveBtn.addEventListener('click', onSave);
+            status.appendChild(saveBtn);
+        }
+    }
+
+    renderPreviewCards(stats) {
+        const topCards = document.querySelector('.debtor-top-cards');
+        const ageingWrapper = document.querySelector('.debtor-ageing-wrapper');
+        if (topCards) {
+            topCards.innerHTML = `
+                ${this.renderTopCard('Outstanding Balance', stats.total_outstanding, 'currency')}
+                ${this.renderTopCard('Number of Accounts', stats.total_accounts, 'number')}
+                ${this.renderTopCard('Current Balance', stats.current, 'currency')}
+            `;
+        }
+        if (ageingWrapper) {
+            ageingWrapper.innerHTML = this.renderAgeingBucketsCard(stats);
+        }
+    }
+
+    // Queue reminders for the ticked rows (or every row shown) and follow the job
+    async sendReminders(pharmacyId, channel) {
+        const label = channel === 'email' ? 'Send Emails' : 'Send SMS';
+        const ticked = Array.from(document.querySelectorAll('.debtor-row-checkbox:checked'))
+            .map(cb => this.allDebtors[Number(cb.dataset.debtorIndex)])
+            .filter(Boolean);
+        const accounts = ticked.length > 0 ? ticked : this.allDebtors;
+        if (accounts.length === 0) {
+            this.showComingSoonModal(label, 'There are no debtors to send reminders to.');
+            return;
+        }
+
+        const templateVariables = this.promptTemplateVariables(pharmacyId, channel);
+        if (!templateVariables) return;
+
+        const what = channel === 'email' ? 'emails' : 'SMS messages';
+        if (!window.confirm(`Send reminder ${what} to ${accounts.length} account(s)?`)) return;
+
+        let job;
+        try {
+            job = await window.api.queueDebtorReminders(pharmacyId, channel, accounts, templateVariables);
+        } catch (error) {
+            console.error('Error queueing reminders:', error);
+            this.setUploadStatus(`Could not queue reminders: ${error.message}`);
+            return;
+        }
+
+        const skipped = job.skipped && job.skipped.length ? `, ${job.skipped.length} skipped (no ${channel === 'email' ? 'email address' : 'phone number'})` : '';
+        this.setUploadStatus(`Queued ${job.queued} ${what}${skipped}`);
+        if (job.queued > 0) {
+            this.followReminderJob(job.job_id, what, skipped);
+        }
+    }
+
+    // Ask for the variables the reminder templates need, remembering them per pharmacy
+    promptTemplateVariables(pharmacyId, channel) {
+        const names = channel === 'email'
+            ? ['pharmacy_name', 'bank_name', 'account_number', 'pharmacy_email', 'pharmacy_phone']
+            : ['pharmacy_name', 'bank_name', 'account_number'];
+        const storageKey = `debtor_reminder_variables_${pharmacyId}`;
+        let saved = {};
+        try {
+            saved = JSON.parse(localStorage.getItem(storageKey) || '{}');
+        } catch (e) {
+            saved = {};
+        }
+        if (!saved.pharmacy_name) {
+            const pharmacy = window.pharmacyPicker?.getSelectedPharmacy();
+            saved.pharmacy_name = (pharmacy && pharmacy.name) || '';
+        }
+
+        const variables = {};
+        for (const name of names) {
+            const value = window.prompt(`Reminder ${name.replace(/_/g, ' ')}:`, saved[name] || '');
+            if (value === null) return null;
+            if (!value.trim()) {
+                this.setUploadStatus(`Reminders not sent: ${name.replace(/_/g, ' ')} is required`);
+                return null;
+            }
+            variables[name] = value.trim();
+        }
+
+        localStorage.setItem(storageKey, JSON.stringify({ ...saved, ...variables }));
+        return variables;
+    }
+
+    // Poll the reminder job until every message is sent, failed or cancelled
+    async followReminderJob(jobId, what, skipped) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 3000));
+            let progress;
+            try {
+                progress = await window.api.getReminderJob(jobId);
+            } catch (error) {
+                console.error('Error loading reminder progress:', error);
+                this.setUploadStatus(`Reminders queued; progress unavailable: ${error.message}`);
+                return;
+            }
+
+            const failed = progress.failed ? `, ${progress.failed} failed` : '';
+            if (progress.done) {
+                this.setUploadStatus(`${progress.cancelled ? 'Cancelled' : 'Finished'}: ${progress.sent} of ${progress.total} ${what} sent${failed}${skipped}`);
+                return;
+            }
+            this.setUploadStatus(`Sending ${what}: ${progress.sent} of ${progress.total} sent${failed} (${progress.percent}%)`);
+        }
+    }
+
     showComingSoonModal(title, message) {
         const modalOverlay = document.getElementById('coming-soon-modal-overlay');
         const modalTitle = document.getElementById('coming-soon-modal-title');
@@ -547,6 +737,7 @@ class DebtorToolsScreen {
                     </span>
                     DEBTORS
                 </h3>
+                <div class="debtor-upload-status" id="debtor-upload-status" style="display: none;"></div>
                 <div class="debtor-table-container">
                     <table class="debtor-table">
                         <thead>
@@ -593,28 +784,27 @@ class DebtorToolsScreen {
                 return;
             }
 
-            const baseUrl = 'https://pharmacy-api-webservice.onrender.com';
+            // Filtering, sorting and paging happen server-side against the debtor index,
+            // so only the matching page is downloaded
             const params = new URLSearchParams({
-                per_page: '1000',
+                page_size: String(this.pageSize),
                 page: '1',
-                exclude_medical_aid: 'true'
+                exclude_medical_aid: 'true',
+                min_balance: String(this.minBalance || 0),
+                buckets: this.selectedAgeingBuckets.join(',')
             });
 
             // Add search query if present
             if (this.searchQuery && this.searchQuery.trim().length > 0) {
-                params.append('search', this.searchQuery.trim());
+                params.append('q', this.searchQuery.trim());
             }
 
-            // Note: We do NOT use the API's ageing_buckets filter as it doesn't work reliably
-            // Instead, we fetch all debtors and filter client-side
-
-            // Add sorting if set (API sorting still works)
             if (this.sortColumn) {
-                params.append('sort_by', this.sortColumn);
-                params.append('sort_order', this.sortOrder);
+                params.append('sort', this.sortColumn);
+                params.append('order', this.sortOrder);
             }
 
-            const url = `${baseUrl}/pharmacies/${pharmacyId}/debtors?${params.toString()}`;
+            const url = `${window.api.getLocalBackendUrl()}/api/pharmacies/${pharmacyId}/debtors/search?${params.toString()}`;
             console.log('Fetching debtors from:', url);
 
             const response = await window.fetch(url, {
@@ -629,41 +819,9 @@ class DebtorToolsScreen {
             }
 
             const data = await response.json();
-            let debtors = data.debtors || [];
-            
-            // Client-side filtering by ageing buckets
-            const allBuckets = ['current', 'd30', 'd60', 'd90', 'd120', 'd150', 'd180'];
-            const allSelected = allBuckets.every(b => this.selectedAgeingBuckets.includes(b));
-            
-            if (this.selectedAgeingBuckets.length === 0) {
-                // No buckets selected - show nothing
-                console.log('No ageing buckets selected - showing no results');
-                this.allDebtors = [];
-            } else if (!allSelected) {
-                // Filter debtors: show only those with balance > 0 in at least one selected bucket
-                console.log('Client-side filtering by buckets:', this.selectedAgeingBuckets);
-                debtors = debtors.filter(debtor => {
-                    return this.selectedAgeingBuckets.some(bucket => {
-                        const value = parseFloat(debtor[bucket]) || 0;
-                        return value > 0;
-                    });
-                });
-                console.log(`Filtered to ${debtors.length} debtors`);
-                this.allDebtors = debtors;
-            } else {
-                // All buckets selected - show all debtors
-                console.log('All buckets selected - showing all', debtors.length, 'debtors');
-                this.allDebtors = debtors;
-            }
-            
-            // Client-side filtering by minimum balance (in case API doesn't filter properly)
-            if (this.minBalance > 0) {
-                this.allDebtors = this.allDebtors.filter(debtor => {
-                    const balance = parseFloat(debtor.balance) || 0;
-                    return balance >= this.minBalance;
-                });
-                console.log(`After min balance filter: ${this.allDebtors.length} debtors`);
-            }
+            this.allDebtors = data.debtors || [];
+            this.totalDebtors = data.total || this.allDebtors.length;
+            console.log(`Showing ${this.allDebtors.length} of ${this.totalDebtors} matching debtors`);
             
             this.renderDebtorsTableBody();
             this.setupTableHandlers();
@@ -694,7 +852,7 @@ class DebtorToolsScreen {
             }).format(numValue);
         };
 
-        const rowsHtml = this.allDebtors.map(debtor => {
+        const rowsHtml = this.allDebtors.map((debtor, index) => {
             const accountNo = debtor.acc_no || debtor.account_number || 'N/A';
             const name = debtor.name || 'Unknown';
             const email = debtor.email || '';
@@ -703,7 +861,7 @@ class DebtorToolsScreen {
             return `
                 <tr>
                     <td class="debtor-table-checkbox">
-                        <input type="checkbox" class="debtor-row-checkbox" data-debtor-id="${debtor.id || debtor.debtor_id}" />
+                        <input type="checkbox" class="debtor-row-checkbox" data-debtor-index="${index}" />
                     </td>
                     <td>${this.escapeHtml(accountNo)}</td>
                     <td>${this.escapeHtml(name)}</td>
@@ -721,7 +879,11 @@ class DebtorToolsScreen {
             `;
         }).join('');
 
-        tableBody.innerHTML = rowsHtml;
+        const moreHtml = this.totalDebtors > this.allDebtors.length
+            ? `<tr><td colspan="13" style="text-align: center; padding: 16px;">Showing ${this.allDebtors.length} of ${this.totalDebtors} debtors - refine the filters to narrow the list</td></tr>`
+            : '';
+
+        tableBody.innerHTML = rowsHtml + moreHtml;
     }
 
     setupTableHandlers() {
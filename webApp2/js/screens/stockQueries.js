@@ -1190,17 +1190,28 @@ class StockQueriesScreen {
             ));
 
             if (missingCodes.length > 0) {
-                const perProductResults = await Promise.allSettled(
-                    missingCodes.map(code => 
-                        window.api.getProductUsage(pharmacy.id, code).catch(() => null)
-                    )
-                );
-                
-                perProductResults.forEach((res, idx) => {
-                    if (res.status === 'fulfilled' && res.value && typeof res.value.avg_qty_180d === 'number') {
-                        usageMap[missingCodes[idx]] = res.value.avg_qty_180d;
-                    }
-                });
+                try {
+                    // Single batched call to our backend instead of one request per product
+                    const batch = await window.api.getProductUsageBatch(pharmacy.id, missingCodes);
+                    Object.entries(batch.usage || {}).forEach(([code, u]) => {
+                        if (u && typeof u.avg_qty_180d === 'number') {
+                            usageMap[code] = u.avg_qty_180d;
+                        }
+                    });
+                } catch (e) {
+                    console.warn('Usage batch failed, falling back to per-product requests:', e);
+                    const perProductResults = await Promise.allSettled(
+                        missingCodes.map(code => 
+                            window.api.getProductUsage(pharmacy.id, code).catch(() => null)
+                        )
+                    );
+                    
+                    perProductResults.forEach((res, idx) => {
+                        if (res.status === 'fulfilled' && res.value && typeof res.value.avg_qty_180d === 'number') {
+                            usageMap[missingCodes[idx]] = res.value.avg_qty_180d;
+                        }
+                    });
+                }
             }
 
             // Step 4: Fetch monthly sales data for current month
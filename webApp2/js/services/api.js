@@ -182,6 +182,145 @@ if (window.api && typeof window.api.getDays === 'function') {
                 return this.request(`/pharmacies/${pharmacyId}/usage/product/${encodeURIComponent(code)}`);
             }
 
+            // Get usage for many products in one call
+            // Local API: POST /api/pharmacies/{pid}/usage/products:batch  body: { codes: [...] }
+            // Returns { usage: { code: {...} }, errors: { code: "..." } }
+            async getProductUsageBatch(pharmacyId, codes) {
+                const url = `${this.getLocalBackendUrl()}/api/pharmacies/${pharmacyId}/usage/products:batch`;
+                const response = await window.fetch(url, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        ...this.getAuthHeaders()
+                    },
+                    body: JSON.stringify({ codes })
+                });
+
+                if (!response.ok) {
+                    throw new Error(`API Error: ${response.status} ${response.statusText}`);
+                }
+
+                return await response.json();
+            }
+
+            // Upload a debtor PDF and receive parsed debtors page range by page range
+            // Local backend: POST /api/pharmacies/{pid}/debtors/parse/stream (NDJSON)
+            // onStep is called with {page, total_pages, debtors, total_accounts, total_outstanding, done}
+            async streamDebtorReport(pharmacyId, file, onStep) {
+                const url = `${this.getLocalBackendUrl()}/api/pharmacies/${pharmacyId}/debtors/parse/stream`;
+                const formData = new FormData();
+                formData.append('file', file);
+
+                const response = await window.fetch(url, {
+                    method: 'POST',
+                    headers: this.getAuthHeaders(),
+                    body: formData
+                });
+
+                if (!response.ok) {
+                    throw new Error(`API Error: ${response.status} ${response.statusText}`);
+                }
+
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                let last = null;
+
+                while (true) {
+                    const { value, done } = await reader.read();
+                    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                    const lines = buffer.split('\n');
+                    buffer = done ? '' : lines.pop();
+                    for (const line of lines) {
+                        if (!line.trim()) continue;
+                        last = JSON.parse(line);
+                        if (last.error) {
+                            throw new Error(last.error);
+                        }
+                        onStep(last);
+                    }
+                    if (done) break;
+                }
+
+                return last;
+            }
+
+            // Save a debtor PDF (parsed again from the parse cache after a streamed preview)
+            // Local backend: POST /api/pharmacies/{pid}/debtors/parse?save=true
+            async saveDebtorReport(pharmacyId, file, reportDate = null) {
+                const params = new URLSearchParams({ save: 'true' });
+                if (reportDate) {
+                    params.append('report_date', reportDate);
+                }
+                const url = `${this.getLocalBackendUrl()}/api/pharmacies/${pharmacyId}/debtors/parse?${params.toString()}`;
+                const formData = new FormData();
+                formData.append('file', file);
+
+                const response = await window.fetch(url, {
+                    method: 'POST',
+                    headers: this.getAuthHeaders(),
+                    body: formData
+                });
+
+                if (!response.ok) {
+                    throw new Error(`API Error: ${response.status} ${response.statusText}`);
+                }
+
+                return await response.json();
+            }
+
+            // Queue email/SMS reminders for debtor accounts; returns { job_id, queued, skipped }
+            async queueDebtorReminders(pharmacyId, channel, accounts, templateVariables) {
+                const url = `${this.getLocalBackendUrl()}/api/pharmacies/${pharmacyId}/debtors/reminders`;
+                const response = await window.fetch(url, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        ...this.getAuthHeaders()
+                    },
+                    body: JSON.stringify({ channel, accounts, template_variables: templateVariables })
+                });
+
+                if (!response.ok) {
+                    let detail = `${response.status} ${response.statusText}`;
+                    try {
+                        const errorData = await response.json();
+                        detail = errorData.detail || detail;
+                    } catch (e) {
+                        // Keep the status text
+                    }
+                    throw new Error(detail);
+                }
+
+                return await response.json();
+            }
+
+            // Progress of a reminder job: sent / failed / remaining and done
+            async getReminderJob(jobId) {
+                const url = `${this.getLocalBackendUrl()}/api/reminders/jobs/${encodeURIComponent(jobId)}`;
+                const response = await window.fetch(url, {
+                    headers: this.getAuthHeaders()
+                });
+
+                if (!response.ok) {
+                    throw new Error(`API Error: ${response.status} ${response.statusText}`);
+                }
+
+                return await response.json();
+            }
+
+            // Base URL of our own backend (LOCAL_BACKEND_URL from auth.js)
+            // Empty string means same-origin (valid for production)
+            getLocalBackendUrl() {
+                let backendUrl = '';
+                if (typeof window !== 'undefined' && typeof window.LOCAL_BACKEND_URL === 'string') {
+                    backendUrl = window.LOCAL_BACKEND_URL;
+                } else if (typeof LOCAL_BACKEND_URL !== 'undefined' && typeof LOCAL_BACKEND_URL === 'string') {
+                    backendUrl = LOCAL_BACKEND_URL;
+                }
+                return backendUrl.replace(/\/$/, '');
+            }
+
             // Get negative stock
             // External API: GET /pharmacies/{pid}/stock-activity/negative-soh?date=YYYY-MM-DD&limit=200
             async getNegativeStock(pharmacyId, date, limit = 200) {